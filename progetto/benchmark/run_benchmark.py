@@ -0,0 +1,294 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import threading
+import subprocess
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utilities import LOG_LEVELS, SETTINGS
+import instrumentation
+from benchmark import synthetic_dataset
+
+# Benchmark of the ingestion and analysis pipeline on synthetic datasets:
+# the stages of main.getPipelineStages (without plots, scraping and Eligius taint analysis,
+# the pools are synthetic) are executed one after the other, so every stage is timed alone,
+# and for every stage are recorded seconds, rows processed, throughput and peak RSS of the stage
+# (sampled by a thread while the stage runs, the high-water mark of the process only grows
+# and would be the peak of the previous stages). Every scale runs in a fresh process.
+# The results are written as json in benchmark/results to compare runs over time.
+#
+# usage (by the progetto directory) :
+#   python -m benchmark.run_benchmark --scale 1M
+#   python -m benchmark.run_benchmark --scale 10M --repeat 3 --compare benchmark/results/<previous>.json
+
+BENCHMARK_PATH = os.path.dirname(os.path.abspath(__file__))
+BENCHMARK_DATA_PATH = os.path.join(BENCHMARK_PATH, "data")
+BENCHMARK_RESULTS_PATH = os.path.join(BENCHMARK_PATH, "results")
+SKIPPED_STAGES = ('scrape pools', 'eligius taint analysis')
+CSV_SPECS = {'inputs': 'INPUTS_CSV_SPEC', 'outputs': 'OUTPUTS_CSV_SPEC', 'transactions': 'TRANSACTIONS_CSV_SPEC', 'map': 'MAP_CSV_SPEC'}
+RSS_SAMPLE_INTERVAL = 0.01 # seconds between two RSS samples of a stage
+
+
+def get_rss_mb():
+    """Current resident set size of the process (MB), None if not available"""
+    try:
+        with open('/proc/self/statm', 'r') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024**2
+    except (OSError, ValueError, IndexError):
+        return None
+
+class RssSampler:
+    """Peak RSS of a section of code, sampled by a thread (with RssSampler() as sampler: ... sampler.peak_mb)"""
+
+    def __init__(self, interval = RSS_SAMPLE_INTERVAL):
+        """
+        @param [optional] interval : seconds between two samples
+        """
+        self.interval = interval
+        self.start_mb = None
+        self.peak_mb = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._sample_loop, daemon=True)
+
+    def _sample(self):
+        rss_mb = get_rss_mb()
+        if rss_mb is not None and (self.peak_mb is None or rss_mb > self.peak_mb):
+            self.peak_mb = rss_mb
+
+    def _sample_loop(self):
+        while not self.stopped.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self.start_mb = get_rss_mb()
+        self.peak_mb = self.start_mb
+        if self.start_mb is not None: # no /proc (ex. Windows, macOS) -> no samples
+            self.thread.start()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if self.thread.is_alive():
+            self.stopped.set()
+            self.thread.join()
+            self._sample()
+        return False
+
+def get_rows(values):
+    """Rows of the dataframes (arrays, indexes) of a list of values"""
+    return int(sum(len(value) for value in values if hasattr(value, '__len__') and not isinstance(value, (str, dict))))
+
+def count_lines(filePath):
+    """Number of lines of a file"""
+    with open(filePath, 'rb') as file:
+        return sum(1 for _ in file)
+
+def prepare_dataset(scale, seed):
+    """Generate the synthetic dataset of a scale / seed if it is not already on disk
+    @param scale : scale of the dataset (ex. '1M')
+    @param seed : seed of the generator
+    @return dataset directory
+    """
+    datasetDir = os.path.join(BENCHMARK_DATA_PATH, f"{scale}-seed{seed}")
+    paths = synthetic_dataset.get_dataset_paths(datasetDir)
+    if not all(os.path.exists(path) for path in paths.values()):
+        synthetic_dataset.generate_dataset(datasetDir, scale, seed)
+    return datasetDir
+
+def get_benchmark_stages(main, miningPoolAddressesDF):
+    """Stages of the pipeline to benchmark, in an order in which the inputs of every stage are already produced
+    @param main : main module (with the csv specs pointing to the synthetic dataset)
+    @param miningPoolAddressesDF : synthetic mining pool addresses
+    @return list of Stage
+    """
+    stages = [stage for stage in main.getPipelineStages() if not stage.mainThread and stage.name not in SKIPPED_STAGES]
+    available = {'miningPoolAddressesDF'}
+    ordered = []
+    while stages:
+        ready = [stage for stage in stages if all(name in available for name in stage.inputs)]
+        if not ready:
+            raise ValueError(f"stages with missing inputs : {[stage.name for stage in stages]}")
+        for stage in ready:
+            ordered.append(stage)
+            available.update(stage.outputs)
+            stages.remove(stage)
+    return ordered
+
+def run_pipeline(main, datasetDir, miningPoolAddressesDF, warm):
+    """Run the benchmarked stages once
+    @param main : main module
+    @param datasetDir : directory of the synthetic dataset
+    @param miningPoolAddressesDF : synthetic mining pool addresses
+    @param warm : if False the cache of the dataset is deleted before the run (cold run)
+    @return list of dictionaries (one for every stage) with name, seconds, rows, rows_per_second, rss_mb (at the end of the stage),
+            stage_peak_rss_mb, stage_growth_mb (stage peak - RSS at the start of the stage), process_peak_rss_mb (high-water mark)
+    """
+    cacheDir = os.path.join(datasetDir, "cache")
+    if not warm and os.path.exists(cacheDir):
+        shutil.rmtree(cacheDir)
+    main.DATASET_CACHE_PATH = cacheDir
+    main.RESULTS_STORE = main.incremental.IncrementalResultsStore(os.path.join(cacheDir, "results"))
+    main.INGESTION_WATERMARKS.clear()
+
+    values = {'miningPoolAddressesDF': miningPoolAddressesDF}
+    measures = []
+    for stage in get_benchmark_stages(main, miningPoolAddressesDF):
+        with RssSampler() as sampler:
+            startT = time.perf_counter()
+            values.update(stage.execute(values))
+            seconds = time.perf_counter() - startT
+        # rows processed : rows of the input dataframes (of the outputs for the readers)
+        rows = get_rows([values[name] for name in stage.inputs]) or get_rows([values[name] for name in stage.outputs])
+        measures.append({
+            'stage': stage.name,
+            'seconds': seconds,
+            'rows': rows,
+            'rows_per_second': rows / seconds if seconds > 0 else None,
+            'rss_mb': get_rss_mb(),
+            'stage_peak_rss_mb': sampler.peak_mb,
+            'stage_growth_mb': sampler.peak_mb - sampler.start_mb if sampler.peak_mb is not None else None,
+            'process_peak_rss_mb': instrumentation.get_peak_rss_mb(),
+        })
+    return measures
+
+def max_measure(values):
+    """Max of the not None values (None if there are no values)"""
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+def merge_repeats(runs):
+    """Merge the measures of repeated runs (best time of every stage)
+    @param runs : list of runs (list of stage measures)
+    @return list of stage measures with the best seconds, the seconds of every run and the max memory of the runs
+    """
+    merged = []
+    for stage_runs in zip(*runs):
+        best = dict(min(stage_runs, key=lambda measure: measure['seconds']))
+        best['runs_seconds'] = [measure['seconds'] for measure in stage_runs]
+        for key in ('stage_peak_rss_mb', 'stage_growth_mb', 'process_peak_rss_mb'):
+            best[key] = max_measure(measure[key] for measure in stage_runs)
+        merged.append(best)
+    return merged
+
+def get_environment():
+    """Versions and settings of the benchmarked environment"""
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'settings': SETTINGS,
+    }
+
+def format_mb(value, width):
+    return f"{value:>{width}.1f}" if value is not None else f"{'-':>{width}}"
+
+def print_results(results, previous = None):
+    """Print the table of the stage measures (and the speedup against previous results)
+    @param results : benchmark results
+    @param [optional] previous : results of a previous run to compare with
+    @no return
+    """
+    previous_seconds = {measure['stage']: measure['seconds'] for measure in previous['stages']} if previous else {}
+    print(f"\nbenchmark {results['scale']} (seed {results['seed']}, {'warm' if results['warm'] else 'cold'} cache) :")
+    print(f"{'stage':<24}{'seconds':>10}{'rows':>12}{'rows/s':>14}{'stage peak MB':>15}{'growth MB':>11}" + (f"{'speedup':>10}" if previous else ""))
+    for measure in results['stages']:
+        rows_per_second = f"{measure['rows_per_second']:.0f}" if measure['rows_per_second'] else "-"
+        line = (f"{measure['stage']:<24}{measure['seconds']:>10.3f}{measure['rows']:>12}{rows_per_second:>14}"
+                f"{format_mb(measure['stage_peak_rss_mb'], 15)}{format_mb(measure['stage_growth_mb'], 11)}")
+        if previous:
+            speedup = previous_seconds.get(measure['stage'])
+            line += f"{speedup / measure['seconds']:>9.2f}x" if speedup and measure['seconds'] > 0 else f"{'-':>10}"
+        print(line)
+    print(f"{'total':<24}{results['total_seconds']:>10.3f}{'':>26}{format_mb(results['stage_peak_rss_mb'], 15)}")
+    print(f"process high-water mark (RSS) : {format_mb(results['process_peak_rss_mb'], 0).strip()} MB")
+
+def run_benchmark(scale = '1M', seed = 0, repeat = 1, warm = False):
+    """Benchmark the pipeline on a synthetic dataset
+    @param [optional] scale : rows of the dataset ('1M', '10M', '100M' or a number), default = '1M'
+    @param [optional] seed : seed of the generator, default = 0
+    @param [optional] repeat : number of runs (best time of every stage is kept), default = 1
+    @param [optional] warm : if True the caches of previous runs are reused, default = False (cold runs)
+    @return dictionary with the results
+    """
+    datasetDir = prepare_dataset(scale, seed)
+    for level in LOG_LEVELS:
+        LOG_LEVELS[level] = False
+    instrumentation.TRACER.traceDir = None # the measures are written in the results, not in a trace file
+    import main
+    for name, specName in CSV_SPECS.items():
+        getattr(main, specName)['path'] = os.path.join(datasetDir, f"{name}.csv")
+    miningPoolAddressesDF = synthetic_dataset.generate_pools(getattr(main, CSV_SPECS['map'])['path'], seed)
+
+    runs = [run_pipeline(main, datasetDir, miningPoolAddressesDF, warm) for _ in range(repeat)]
+    stages = merge_repeats(runs)
+    return {
+        'scale': scale,
+        'seed': seed,
+        'repeat': repeat,
+        'warm': warm,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'dataset_rows': {name: count_lines(os.path.join(datasetDir, f"{name}.csv")) for name in CSV_SPECS},
+        'environment': get_environment(),
+        'stages': stages,
+        'total_seconds': sum(measure['seconds'] for measure in stages),
+        'stage_peak_rss_mb': max_measure(measure['stage_peak_rss_mb'] for measure in stages),
+        'process_peak_rss_mb': instrumentation.get_peak_rss_mb(),
+        'counters': instrumentation.TRACER.summary()['counters'],
+    }
+
+def save_results(results, resultsDir = BENCHMARK_RESULTS_PATH):
+    """Write the results as json (one file for every run)
+    @param results : benchmark results
+    @param [optional] resultsDir : directory of the results
+    @return path of the json file
+    """
+    os.makedirs(resultsDir, exist_ok=True)
+    path = os.path.join(resultsDir, f"{results['scale']}-seed{results['seed']}-{results['date'].replace(':', '')}.json")
+    with open(path, "w") as results_file:
+        json.dump(results, results_file, indent=2, default=str)
+    return path
+
+def run_in_fresh_process(scale, args):
+    """Run the benchmark of a scale in a new python process
+    (the memory of a scale, ex. the high-water mark of the process, is not carried over to the next one)
+    @param scale : scale of the dataset
+    @param args : parsed command line arguments
+    @no return
+    """
+    command = [sys.executable, os.path.abspath(__file__), '--scale', scale, '--seed', str(args.seed), '--repeat', str(args.repeat)]
+    if args.warm:
+        command.append('--warm')
+    if args.compare is not None:
+        command += ['--compare', args.compare]
+    subprocess.run(command, check=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark of the ingestion and analysis pipeline on synthetic datasets")
+    parser.add_argument('--scale', nargs='+', default=['1M'], help="rows of the datasets (ex. 1M 10M 100M)")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the synthetic datasets")
+    parser.add_argument('--repeat', type=int, default=1, help="runs of every benchmark (best time of every stage is kept)")
+    parser.add_argument('--warm', action='store_true', help="reuse the caches (columnar cache, indexes, metrics cube) of previous runs")
+    parser.add_argument('--compare', default=None, help="json results of a previous run to compare with")
+    args = parser.parse_args()
+
+    if len(args.scale) > 1:
+        for scale in args.scale:
+            run_in_fresh_process(scale, args)
+        sys.exit(0)
+
+    previous = None
+    if args.compare is not None:
+        with open(args.compare, "r") as previous_file:
+            previous = json.load(previous_file)
+    results = run_benchmark(args.scale[0], args.seed, args.repeat, args.warm)
+    print_results(results, previous)
+    print(f"\nresults written in {save_results(results)}")
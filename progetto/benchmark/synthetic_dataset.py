@@ -0,0 +1,150 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+
+# Seeded synthetic dataset with the same layouts of the csv files read by main.py:
+# •transactions.csv : timestamp, blockId, txId, isCoinbase, fee
+# •inputs.csv : txId, prevTxId, prevTxpos
+# •outputs.csv : txId, position, addressId, amount, scriptType
+# •map.csv : hash, addressId
+# Blocks contain a coinbase transaction (first of the block) mined by a small set of miner
+# addresses and some regular transactions; the files are written block chunk by block chunk,
+# so also the largest scales are generated in bounded memory.
+
+GENESIS_TIMESTAMP = 1231006505
+BLOCK_INTERVAL_SECONDS = 600
+TRANSACTIONS_PER_BLOCK = 12 # mean of the regular transactions of a block
+MINER_ADDRESSES = 1000 # addressIds [0, MINER_ADDRESSES) receive the coinbase outputs
+ADDRESSES_PER_TRANSACTION = 0.5
+COINBASE_REWARD = 5_000_000_000
+BLOCKS_PER_CHUNK = 20_000
+SCRIPT_TYPES = np.array([0, 1, 2, 3, 4, 5], dtype='int8')
+SCRIPT_TYPE_WEIGHTS = np.array([0.02, 0.25, 0.65, 0.05, 0.02, 0.01])
+POOL_NAMES = ['Eligius', 'DeepBit', 'BitMinter', 'BTCGuild']
+SCALE_SUFFIXES = {'k': 1_000, 'M': 1_000_000, 'G': 1_000_000_000}
+
+
+def parse_scale(scale):
+    """Convert a scale ('1M', '10M', '500k' or a number) to a number of rows
+    @param scale : scale string or int
+    @return number of rows (inputs + outputs + transactions)
+    """
+    if isinstance(scale, int):
+        return scale
+    scale = str(scale).strip()
+    if scale[-1] in SCALE_SUFFIXES:
+        return int(float(scale[:-1]) * SCALE_SUFFIXES[scale[-1]])
+    return int(scale)
+
+def get_dataset_paths(datasetDir):
+    """Return the paths of the csv files of a dataset directory
+    @param datasetDir : directory of the dataset
+    @return dictionary name -> csv path (inputs, outputs, transactions, map)
+    """
+    return {name: os.path.join(datasetDir, f"{name}.csv") for name in ['inputs', 'outputs', 'transactions', 'map']}
+
+def _generate_blocks(rng, firstBlockId, firstTxId, blocksQuantity):
+    """Generate the rows of a chunk of consecutive blocks
+    @return transactions, inputs, outputs dataframes of the chunk
+    """
+    # transazioni : coinbase (prima del blocco) + transazioni regolari
+    tx_per_block = 1 + rng.poisson(TRANSACTIONS_PER_BLOCK, blocksQuantity)
+    tx_quantity = int(tx_per_block.sum())
+    block_ids = np.repeat(np.arange(firstBlockId, firstBlockId + blocksQuantity, dtype='int64'), tx_per_block)
+    block_timestamps = GENESIS_TIMESTAMP + np.arange(firstBlockId, firstBlockId + blocksQuantity) * BLOCK_INTERVAL_SECONDS \
+        + rng.integers(-BLOCK_INTERVAL_SECONDS // 2, BLOCK_INTERVAL_SECONDS // 2, blocksQuantity)
+    txIds = np.arange(firstTxId, firstTxId + tx_quantity, dtype='int64')
+    block_starts = np.concatenate(([0], np.cumsum(tx_per_block)[:-1]))
+    is_coinbase = np.zeros(tx_quantity, dtype='int8')
+    is_coinbase[block_starts] = 1
+    fees = np.where(is_coinbase == 1, 0, rng.integers(0, 50_000, tx_quantity))
+    transactions = pd.DataFrame({
+        'timestamp': np.repeat(block_timestamps, tx_per_block),
+        'blockId': block_ids,
+        'txId': txIds,
+        'isCoinbase': is_coinbase,
+        'fee': fees,
+    })
+
+    # output : la coinbase ha un solo output verso un miner, le altre 1 + poisson(1)
+    outputs_per_tx = np.where(is_coinbase == 1, 1, 1 + rng.poisson(1.0, tx_quantity))
+    output_txIds = np.repeat(txIds, outputs_per_tx)
+    output_is_coinbase = np.repeat(is_coinbase, outputs_per_tx) == 1
+    output_starts = np.concatenate(([0], np.cumsum(outputs_per_tx)[:-1]))
+    positions = np.arange(len(output_txIds)) - np.repeat(output_starts, outputs_per_tx)
+    addresses_quantity = max(MINER_ADDRESSES + 1, int((firstTxId + tx_quantity) * ADDRESSES_PER_TRANSACTION))
+    miner_addresses = np.minimum(rng.zipf(1.5, len(output_txIds)) - 1, MINER_ADDRESSES - 1)
+    regular_addresses = rng.integers(MINER_ADDRESSES, addresses_quantity, len(output_txIds))
+    outputs = pd.DataFrame({
+        'txId': output_txIds,
+        'position': positions,
+        'addressId': np.where(output_is_coinbase, miner_addresses, regular_addresses),
+        'amount': np.where(output_is_coinbase, COINBASE_REWARD, rng.integers(10_000, 10_000_000_000, len(output_txIds))),
+        'scriptType': rng.choice(SCRIPT_TYPES, len(output_txIds), p=SCRIPT_TYPE_WEIGHTS),
+    })
+
+    # input : solo le transazioni regolari, ognuno spende un output di una transazione precedente
+    regular_txIds = txIds[is_coinbase == 0]
+    inputs_per_tx = 1 + rng.poisson(0.8, len(regular_txIds))
+    input_txIds = np.repeat(regular_txIds, inputs_per_tx)
+    inputs = pd.DataFrame({
+        'txId': input_txIds,
+        'prevTxId': (rng.random(len(input_txIds)) * input_txIds).astype('int64'),
+        'prevTxpos': rng.integers(0, 2, len(input_txIds)),
+    })
+    return transactions, inputs, outputs
+
+def generate_dataset(datasetDir, scale, seed = 0):
+    """Write a synthetic dataset (inputs, outputs, transactions and map csv files)
+    @param datasetDir : directory of the dataset (created if missing)
+    @param scale : rows of inputs + outputs + transactions ('1M', '10M', '100M' or a number)
+    @param [optional] seed : seed of the random generator, default = 0
+    @return dictionary with the paths of the csv files and the rows of every file
+    """
+    startT = time.time()
+    rows_target = parse_scale(scale)
+    rng = np.random.default_rng(seed)
+    os.makedirs(datasetDir, exist_ok=True)
+    paths = get_dataset_paths(datasetDir)
+    for path in paths.values():
+        if os.path.exists(path):
+            os.remove(path)
+
+    rows = {'inputs': 0, 'outputs': 0, 'transactions': 0, 'map': 0}
+    next_block, next_tx, max_address = 0, 0, 0
+    while rows['inputs'] + rows['outputs'] + rows['transactions'] < rows_target:
+        # dimensione del chunk adattata alle righe ancora da generare (~ 4.7 righe per transazione)
+        remaining_tx = (rows_target - rows['inputs'] - rows['outputs'] - rows['transactions']) / 4.7
+        blocks = int(min(BLOCKS_PER_CHUNK, max(1, remaining_tx // (TRANSACTIONS_PER_BLOCK + 1))))
+        transactions, inputs, outputs = _generate_blocks(rng, next_block, next_tx, blocks)
+        for name, df in (('transactions', transactions), ('inputs', inputs), ('outputs', outputs)):
+            df.to_csv(paths[name], mode='a', header=False, index=False)
+            rows[name] += len(df)
+        next_block += blocks
+        next_tx += len(transactions)
+        max_address = max(max_address, int(outputs['addressId'].max()))
+
+    # map : un hash (stringa) per ogni addressId
+    for start in range(0, max_address + 1, BLOCKS_PER_CHUNK * 10):
+        addressIds = np.arange(start, min(start + BLOCKS_PER_CHUNK * 10, max_address + 1))
+        digests = rng.integers(0, 2**63, len(addressIds))
+        hashes = [f"1{digest:016x}{addressId:x}" for digest, addressId in zip(digests, addressIds)]
+        pd.DataFrame({'hash': hashes, 'addressId': addressIds}).to_csv(paths['map'], mode='a', header=False, index=False)
+        rows['map'] += len(addressIds)
+
+    print(f"synthetic dataset ({rows}) written in {datasetDir} in {time.time()-startT} seconds")
+    return {'paths': paths, 'rows': rows}
+
+def generate_pools(mapPath, seed = 0):
+    """Synthetic mining pool addresses (same format of scraper.getPools):
+    a part of the miner addresses is assigned to the pools
+    @param mapPath : path of the map csv of the dataset
+    @param [optional] seed : seed of the random generator, default = 0
+    @return dataframe with txHash and pool columns
+    """
+    rng = np.random.default_rng(seed)
+    miners = pd.read_csv(mapPath, header=None, names=['txHash', 'addressId'], nrows=MINER_ADDRESSES)
+    pools = miners.loc[rng.random(len(miners)) < 0.3, ['txHash']].reset_index(drop=True)
+    pools['pool'] = rng.choice(POOL_NAMES, len(pools))
+    return pools
@@ -0,0 +1,367 @@
+import numpy as np
+import pandas as pd
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from utilities import SETTINGS
+import instrumentation
+from instrumentation import log
+from utilities import month_id, month_id_to_label, bi_month_id, bi_month_id_to_label
+from utilities import day_id, day_id_to_label, week_id, week_id_to_label, quarter_id, quarter_id_to_label, year_id, year_id_to_label
+from dataset_analysis.shared_columns import SharedColumns, attach_columns
+from dataset_analysis.parallel_reader import PROCESS_CONTEXT
+
+pd.set_option("mode.copy_on_write", True)
+SCRIPT_SIZE_MAP = {
+    1: 153,  # 'P2PK'
+    2: 180,  # 'P2KH'
+    3: 291   # 'P2SH'
+}
+
+SCRIPT_TYPE_MAP = {
+    0 : 'Unknown',
+    1: 'P2PK',   
+    2: 'P2KH',   
+    3: 'P2SH',   
+    4 : 'RETURN',
+    5 : 'EMPTY',
+    6 : 'P2WPKH',
+    7 : 'P2WSH',
+}
+
+
+MAX_THREAD_QUANTITY = SETTINGS['MAX_THREAD_QUANTITY']
+MAX_PROCESS_QUANTITY = SETTINGS['MAX_PROCESS_QUANTITY'] or os.cpu_count() or 1
+ANALYSIS_BACKENDS = ('thread', 'process')
+ANALYSIS_BACKEND = SETTINGS['ANALYSIS_BACKEND']
+RANGES_PER_WORKER = 2 # more txId ranges than workers to balance the load between them
+MIN_ROWS_PER_RANGE = 1_000_000 # smaller inputs are processed in a single range (no pool)
+
+DEFAULT_SCRIPT_SIZE = 153
+SCRIPT_TYPES_QUANTITY = 256 # scriptType is int8 -> 256 possible codes
+
+def get_script_size_array():
+    """Return the size of every script type code as array (SCRIPT_SIZE_MAP, DEFAULT_SCRIPT_SIZE for the others)
+    @no params
+    @return numpy array (float64) indexed by script type code
+    """
+    script_sizes = np.full(SCRIPT_TYPES_QUANTITY, DEFAULT_SCRIPT_SIZE, dtype='float64')
+    for script_type, size in SCRIPT_SIZE_MAP.items():
+        script_sizes[script_type] = size
+    return script_sizes
+
+def build_bucket_data(labels, fees, congestion, script_type_counts, bucketColumn = 'month'):
+    """Build the dataframe of time buckets by the per-bucket aggregated arrays
+    
+    @params : labels : labels of the buckets (consecutive buckets)
+    @params : fees : fees of every bucket
+    @params : congestion : network congestion of every bucket
+    @params : script_type_counts : 2D array (bucket, script type code) with the outputs quantity
+    @params : [optional] bucketColumn : name of the labels column, default = 'month'
+    @return dataframe of buckets in which every bucket has network congestion, fees and script type counts
+    """
+    results = []
+    for i, label in enumerate(labels):
+        bucket_data = {
+            'P2PK': 0,
+            'P2KH': 0,
+            'P2SH': 0,
+            'fees': fees[i],
+            'networkCongestion': congestion[i],
+            bucketColumn: label
+        }
+        for script_type in np.flatnonzero(script_type_counts[i]):
+            bucket_data[f'{SCRIPT_TYPE_MAP.get(int(script_type))}'] = script_type_counts[i, script_type]
+        results.append(bucket_data)
+
+    result_df = pd.DataFrame(results)
+    if len(result_df) > 0:
+        result_df = result_df.loc[:, ~result_df.columns.str.match('None')]
+    return result_df
+
+def build_month_data(month_ids, fees, congestion, script_type_counts):
+    """Build the dataframe of months by the per-month aggregated arrays
+    
+    @params : month_ids : month ids of the rows (consecutive months)
+    @params : fees : fees of every month
+    @params : congestion : network congestion of every month
+    @params : script_type_counts : 2D array (month, script type code) with the outputs quantity
+    @return dataframe of months in which every month has network congestion, fees and script type counts
+    """
+    return build_bucket_data(month_id_to_label(month_ids), fees, congestion, script_type_counts)
+
+def get_network_congestion(inputs, outputs, script_bytes):
+    """Network congestion by its components: 40 bytes for every input, 9 bytes for every output 
+    and the script size of every transaction (transactions with both inputs and outputs only)
+    
+    @params : inputs : quantity of inputs
+    @params : outputs : quantity of outputs
+    @params : script_bytes : sum of the script sizes
+    @return network congestion (float64)
+    """
+    return (40 * np.asarray(inputs, dtype='int64') + 9 * np.asarray(outputs, dtype='int64') + np.asarray(script_bytes, dtype='int64')).astype('float64')
+
+def aggregate_tx_range(bucket_of_tx, input_txIds, output_txIds, output_script_types, start, end, buckets_quantity):
+    """Aggregate the size components and the script type counts of the transactions with txId in [start, end)
+    
+    @params : bucket_of_tx : lookup array txId -> bucket index (-1 = transaction not analyzed)
+    @params : input_txIds : txIds of the inputs (sorted)
+    @params : output_txIds : txIds of the outputs (sorted, stable : first output of a transaction first)
+    @params : output_script_types : script type codes of the outputs (aligned to output_txIds)
+    @params : start : first txId of the range
+    @params : end : last txId (excluded) of the range
+    @params : buckets_quantity : number of buckets
+    @return for every bucket : inputs, outputs and script sizes of the transactions with both inputs and outputs,
+            2D array (bucket, script type code) with the outputs quantity
+    """
+    local_buckets = bucket_of_tx[start:end]
+    
+    # inputs / outputs of the range (rows are sorted by txId)
+    input_start, input_end = np.searchsorted(input_txIds, [start, end])
+    output_start, output_end = np.searchsorted(output_txIds, [start, end])
+    range_input_txIds = input_txIds[input_start:input_end] - start
+    range_output_txIds = output_txIds[output_start:output_end] - start
+    range_script_types = output_script_types[output_start:output_end].astype('int16') % SCRIPT_TYPES_QUANTITY
+    
+    # only inputs / outputs of the analyzed transactions
+    range_input_txIds = range_input_txIds[local_buckets[range_input_txIds] >= 0]
+    output_analyzed = local_buckets[range_output_txIds] >= 0
+    range_output_txIds = range_output_txIds[output_analyzed]
+    range_script_types = range_script_types[output_analyzed]
+    
+    # quantity of inputs / outputs and script type of the first output for every transaction
+    n_inputs_per_tx = np.bincount(range_input_txIds, minlength=end - start)
+    n_outputs_per_tx = np.bincount(range_output_txIds, minlength=end - start)
+    unique_output_txIds, first_positions = np.unique(range_output_txIds, return_index=True)
+    first_script_type_per_tx = np.zeros(end - start, dtype='int16')
+    first_script_type_per_tx[unique_output_txIds] = range_script_types[first_positions]
+    
+    # size components of the transactions with both inputs and outputs, summed for every bucket
+    sized_txIds = np.flatnonzero((n_inputs_per_tx > 0) & (n_outputs_per_tx > 0))
+    sized_buckets = local_buckets[sized_txIds]
+    inputs = np.bincount(sized_buckets, weights=n_inputs_per_tx[sized_txIds], minlength=buckets_quantity).astype('int64')
+    outputs = np.bincount(sized_buckets, weights=n_outputs_per_tx[sized_txIds], minlength=buckets_quantity).astype('int64')
+    script_bytes = np.bincount(sized_buckets, weights=get_script_size_array()[first_script_type_per_tx[sized_txIds]], minlength=buckets_quantity).astype('int64')
+    
+    # outputs quantity for every (bucket, script type)
+    keys = local_buckets[range_output_txIds].astype('int64') * SCRIPT_TYPES_QUANTITY + range_script_types
+    script_type_counts = np.bincount(keys, minlength=buckets_quantity * SCRIPT_TYPES_QUANTITY).reshape(buckets_quantity, SCRIPT_TYPES_QUANTITY)
+    
+    return inputs, outputs, script_bytes, script_type_counts
+
+# colonne condivise con i processi del pool (impostate dall'initializer di ogni processo)
+_worker_columns = None
+_worker_blocks = None
+
+def _attach_worker_columns(specs):
+    global _worker_columns, _worker_blocks
+    _worker_columns, _worker_blocks = attach_columns(specs)
+
+def _aggregate_tx_range_task(args):
+    start, end, buckets_quantity = args
+    return aggregate_tx_range(_worker_columns['bucket_of_tx'], _worker_columns['input_txIds'], _worker_columns['output_txIds'],
+                              _worker_columns['output_script_types'], start, end, buckets_quantity)
+
+def _sorted_by_txId(txIds, *others):
+    """Return the columns sorted by txId (stable), without copies if they are already sorted"""
+    if len(txIds) == 0 or np.all(txIds[1:] >= txIds[:-1]):
+        return (txIds,) + others
+    order = np.argsort(txIds, kind='stable')
+    return (txIds[order],) + tuple(column[order] for column in others)
+
+def aggregate_transactions(inputsDF, outputsDF, transactionDF, tx_bucket_ids, backend = ANALYSIS_BACKEND):
+    """Aggregate fees, size components and script type counts of the transactions for every time bucket 
+    (all the buckets between the first and the last one, also the empty ones):
+    •tag every transaction with its bucket (txId -> bucket lookup array)
+    •split the txIds in ranges (txIds grow with time -> every range is a group of consecutive buckets)
+    •for each range aggregate the size components and the script type counts of every bucket
+     (bincount on integer keys) by a pool of threads or processes, then sum the partial results
+    
+    @params : inputsDF : inputs dataframe 
+    @params : outputsDF : outputs dataframe 
+    @params : transactionDF : transactions dataframe
+    @params : tx_bucket_ids : integer bucket id of every transaction (ex. month ids)
+    @params : [optional] backend : 'thread' or 'process' (columns published once in shared memory), default = ANALYSIS_BACKEND
+    @return dictionary with first_bucket (id of the first bucket) and the per-bucket arrays 
+            fees, inputs, outputs, script_bytes, congestion, script_type_counts (2D array bucket, script type code)
+    """
+    if backend not in ANALYSIS_BACKENDS:
+        raise ValueError(f"unknown analysis backend {backend}, valid backends : {ANALYSIS_BACKENDS}")
+    
+    tx_bucket_ids = np.asarray(tx_bucket_ids, dtype='int64')
+    if len(tx_bucket_ids) == 0:
+        return {
+            'first_bucket': 0,
+            'fees': np.zeros(0, dtype='int64'),
+            'inputs': np.zeros(0, dtype='int64'),
+            'outputs': np.zeros(0, dtype='int64'),
+            'script_bytes': np.zeros(0, dtype='int64'),
+            'congestion': np.zeros(0, dtype='float64'),
+            'script_type_counts': np.zeros((0, SCRIPT_TYPES_QUANTITY), dtype='int64')
+        }
+    
+    # buckets are indexed starting from the first one (include also the buckets without transactions)
+    first_bucket = int(tx_bucket_ids.min())
+    buckets_quantity = int(tx_bucket_ids.max()) - first_bucket + 1
+    tx_buckets = (tx_bucket_ids - first_bucket).astype('int32')
+    
+    # lookup array txId -> bucket (-1 = transaction not in transactionDF)
+    txIds = transactionDF['txId'].to_numpy()
+    lookup_size = int(txIds.max()) + 1
+    bucket_of_tx = np.full(lookup_size, -1, dtype='int32')
+    bucket_of_tx[txIds] = tx_buckets
+    
+    # fees of every bucket 
+    fees = np.bincount(tx_buckets, weights=transactionDF['fee'].to_numpy(), minlength=buckets_quantity).astype('int64')
+    
+    # rows of inputs / outputs sorted by txId (already sorted in the dataset)
+    input_txIds, = _sorted_by_txId(inputsDF['txId'].to_numpy())
+    output_txIds, output_script_types = _sorted_by_txId(outputsDF['txId'].to_numpy(), outputsDF['scriptType'].to_numpy())
+    
+    workers = MAX_THREAD_QUANTITY if backend == 'thread' else MAX_PROCESS_QUANTITY
+    ranges_quantity = max(1, min(workers * RANGES_PER_WORKER, (len(input_txIds) + len(output_txIds)) // MIN_ROWS_PER_RANGE))
+    boundaries = np.linspace(0, lookup_size, ranges_quantity + 1).astype('int64')
+    tasks = [(int(boundaries[i]), int(boundaries[i+1]), buckets_quantity) for i in range(ranges_quantity) if boundaries[i] < boundaries[i+1]]
+    
+    if len(tasks) == 1:
+        partials = [aggregate_tx_range(bucket_of_tx, input_txIds, output_txIds, output_script_types, *tasks[0])]
+    elif backend == 'thread':
+        with ThreadPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            partials = list(executor.map(lambda task: aggregate_tx_range(bucket_of_tx, input_txIds, output_txIds, output_script_types, *task), tasks))
+    else:
+        columns = {
+            'bucket_of_tx': bucket_of_tx,
+            'input_txIds': input_txIds,
+            'output_txIds': output_txIds,
+            'output_script_types': output_script_types
+        }
+        with SharedColumns(columns) as shared:
+            # worker processes started by the fork server (not forked by the threads of the stage scheduler)
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=PROCESS_CONTEXT, 
+                                     initializer=_attach_worker_columns, initargs=(shared.specs,)) as executor:
+                partials = list(executor.map(_aggregate_tx_range_task, tasks))
+    
+    inputs, outputs, script_bytes, script_type_counts = (sum(partial[i] for partial in partials) for i in range(4))
+    
+    log('debug', "aggregated {} buckets in {} txId ranges ({} backend)", buckets_quantity, len(tasks), backend)
+    
+    return {
+        'first_bucket': first_bucket,
+        'fees': fees,
+        'inputs': inputs,
+        'outputs': outputs,
+        'script_bytes': script_bytes,
+        'congestion': get_network_congestion(inputs, outputs, script_bytes),
+        'script_type_counts': script_type_counts
+    }
+
+def processTransactions(inputsDF, outputsDF, transactionDF, backend = ANALYSIS_BACKEND):
+    """Process transactions using inputs, outputs and transaction dataframe in a single grouped pass:
+    •tag every transaction with its month id
+    •for each month calculate the network congestion, the fees and the script type counts (see aggregate_transactions)
+    
+    @params : inputsDF : inputs dataframe 
+    @params : outputsDF : outputs dataframe 
+    @params : transactionDF : transactions dataframe (with Unix timestamp column)
+    @params : [optional] backend : 'thread' or 'process' (columns published once in shared memory), default = ANALYSIS_BACKEND
+    @return dataframe of months in which every month has network congestion and fees
+    """
+    with instrumentation.span(f"transactions processed ({backend} backend)", rows=len(transactionDF)):
+        tx_month_ids = month_id(transactionDF['timestamp'])
+        aggregated = aggregate_transactions(inputsDF, outputsDF, transactionDF, tx_month_ids, backend)
+        months_quantity = len(aggregated['fees'])
+        log(('processing', 'all infos', 'debug'), "found {} months\n------------------------", months_quantity)
+        
+        first_month = aggregated['first_bucket']
+        result_df = build_month_data(range(first_month, first_month + months_quantity), aggregated['fees'], aggregated['congestion'], aggregated['script_type_counts'])
+    instrumentation.count('transactions processed', len(transactionDF))
+    
+    return result_df
+
+TIME_BUCKETS = {
+    'day': (day_id, day_id_to_label),
+    'week': (week_id, week_id_to_label),
+    'month': (month_id, month_id_to_label),
+    'bi_month': (bi_month_id, bi_month_id_to_label),
+    'quarter': (quarter_id, quarter_id_to_label),
+    'year': (year_id, year_id_to_label),
+}
+BLOCKS_BUCKET_COLUMN = 'blocks_bucket'
+
+def get_bucket_codes(df, bucket):
+    """Return the integer bucket code of every row of a dataframe and the function to convert the codes to labels
+    
+    @params : df : dataframe (with Unix timestamp and blockId columns)
+    @params : bucket : 'day', 'week', 'month', 'bi_month', 'quarter', 'year' or an integer N (buckets of N blocks)
+    @return numpy array of bucket codes, function codes -> labels, name of the bucket column
+    """
+    if isinstance(bucket, (int, np.integer)) and not isinstance(bucket, bool):
+        if bucket <= 0:
+            raise ValueError(f"blocks bucket must be a positive number of blocks, got {bucket}")
+        # etichetta = primo blockId del gruppo di N blocchi
+        return np.asarray(df['blockId'], dtype='int64') // bucket, lambda codes: np.asarray(codes, dtype='int64') * bucket, BLOCKS_BUCKET_COLUMN
+    if bucket not in TIME_BUCKETS:
+        raise ValueError(f"unknown bucket {bucket}, valid buckets : {list(TIME_BUCKETS)} or a number of blocks")
+    code_function, label_function = TIME_BUCKETS[bucket]
+    return code_function(df['timestamp']), label_function, bucket
+
+def aggregate_pool_statistics(df, bucket = None):
+    """Calculate the number of minted blocks (distinct blockId) and the total rewards for each pool 
+    and time bucket of a dataframe in a single vectorized pass over integer codes (pool, bucket, blockId).
+    
+    @params : df : dataframe (of Coinbase transactions associated to a pool, with Unix timestamp column) 
+    @params : [optional] bucket : bucket spec (see get_bucket_codes), None = no buckets (global statistics)
+    @return dataframe with minted blocks and dataframe with total rewards for each pool (and bucket)
+    """
+    pool_codes, pools = pd.factorize(df['pool'], sort=True)
+    blockIds = np.asarray(df['blockId'], dtype='int64')
+    amounts = np.asarray(df['amount'], dtype='int64')
+    if bucket is None:
+        bucket_codes, label_function, bucket_column = np.zeros(len(df), dtype='int64'), None, None
+    else:
+        bucket_codes, label_function, bucket_column = get_bucket_codes(df, bucket)
+        bucket_codes = np.asarray(bucket_codes, dtype='int64')
+    
+    # righe senza pool escluse (come nel groupby)
+    valid = pool_codes >= 0
+    pool_codes, bucket_codes, blockIds, amounts = pool_codes[valid], bucket_codes[valid], blockIds[valid], amounts[valid]
+    
+    # ordinamento per (pool, bucket, blockId) : ogni gruppo è un intervallo contiguo
+    order = np.lexsort((blockIds, bucket_codes, pool_codes))
+    pool_codes, bucket_codes, blockIds, amounts = pool_codes[order], bucket_codes[order], blockIds[order], amounts[order]
+    
+    new_group = np.ones(len(order), dtype='bool')
+    new_group[1:] = (pool_codes[1:] != pool_codes[:-1]) | (bucket_codes[1:] != bucket_codes[:-1])
+    new_block = new_group.copy()
+    new_block[1:] |= blockIds[1:] != blockIds[:-1]
+    group_starts = np.flatnonzero(new_group)
+    group_of_row = np.cumsum(new_group) - 1
+    
+    blocks_mined = np.bincount(group_of_row[new_block], minlength=len(group_starts)).astype('int64')
+    total_rewards = np.add.reduceat(amounts, group_starts) if len(group_starts) > 0 else np.zeros(0, dtype='int64')
+    
+    keys = {'pool': pools.take(pool_codes[group_starts])}
+    if bucket_column is not None:
+        keys[bucket_column] = label_function(bucket_codes[group_starts])
+    blocks_mined_df = pd.DataFrame({**keys, 'blocks_mined': blocks_mined})
+    total_rewards_df = pd.DataFrame({**keys, 'total_rewards': total_rewards})
+    
+    return blocks_mined_df, total_rewards_df
+
+def calculate_pool_statistics(df):
+    """Calculate the number of minted blocks and the total rewards for each pool of a dataframe. 
+    
+    @params : df : dataframe (of Coinbase transactions associated to a pool) 
+
+    @return dataframe with minted blocks and dataframe with total rewards for each pool
+    """
+    return aggregate_pool_statistics(df)
+
+def calculate_bi_monthly_statistics(df):
+    """Calculate the number of minted blocks and the total rewards 
+    for every time period of 2 months for each pool of a dataframe. 
+    
+    @params : df : dataframe (of Coinbase transactions associated to a pool, with Unix timestamp column) 
+
+    @return dataframe with minted blocks for every two months and dataframe with total rewards for every two months for each pool
+    """
+    return aggregate_pool_statistics(df, 'bi_month')
@@ -0,0 +1,123 @@
+import os
+import mmap
+import numpy as np
+import instrumentation
+from instrumentation import log
+from utilities import SETTINGS, calculate_chunk_size
+
+CHUNK_MEMORY_BUDGET_MB = SETTINGS['CHUNK_MEMORY_BUDGET_MB']
+ROW_COUNT_MODE = SETTINGS['ROW_COUNT_MODE']
+
+SCAN_BLOCK_SIZE = 64 * 1024 * 1024
+SAMPLES_QUANTITY = 32
+SAMPLE_SIZE = 256 * 1024
+CATEGORY_BYTES_PER_ROW = 8 # code + share of the categories (estimate)
+
+
+def count_rows(filePath):
+    """Count the rows of a file scanning the newlines of the memory-mapped file by blocks
+    @param filePath : path of the file
+    @return number of rows
+    """
+    size = os.path.getsize(filePath)
+    if size == 0:
+        return 0
+
+    rows = 0
+    with open(filePath, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for start in range(0, size, SCAN_BLOCK_SIZE):
+                rows += mm[start:start+SCAN_BLOCK_SIZE].count(b"\n")
+            if mm[size-1:size] != b"\n":
+                rows += 1 # last row without newline
+    return rows
+
+def sample_bytes_per_line(filePath, samples = SAMPLES_QUANTITY, sampleSize = SAMPLE_SIZE):
+    """Estimate the average length (in bytes) of a line reading samples at evenly spaced byte offsets
+    @param filePath : path of the file
+    @param [optional] samples : number of samples
+    @param [optional] sampleSize : size (in bytes) of every sample
+    @return average bytes per line (None if the file is empty)
+    """
+    size = os.path.getsize(filePath)
+    if size == 0:
+        return None
+
+    read_bytes = 0
+    newlines = 0
+    with open(filePath, "rb") as f:
+        if size <= samples * sampleSize:
+            data = f.read()
+            read_bytes, newlines = len(data), data.count(b"\n")
+        else:
+            for offset in np.linspace(0, size - sampleSize, samples).astype('int64'):
+                f.seek(int(offset))
+                data = f.read(sampleSize)
+                read_bytes += len(data)
+                newlines += data.count(b"\n")
+
+    return read_bytes / max(newlines, 1)
+
+def estimate_rows(filePath):
+    """Estimate the rows of a file by the average line length of sampled byte offsets
+    @param filePath : path of the file
+    @return estimated number of rows
+    """
+    bytes_per_line = sample_bytes_per_line(filePath)
+    if bytes_per_line is None:
+        return 0
+    return int(round(os.path.getsize(filePath) / bytes_per_line))
+
+def get_typed_bytes_per_row(schema, columns):
+    """Return the bytes used by a parsed row, using the data types of the schema
+    @param schema : schema of data types
+    @param columns : column's names
+    @return bytes per row
+    """
+    total = 0
+    for column in columns:
+        dtype = schema.get(column)
+        if dtype == 'category':
+            total += CATEGORY_BYTES_PER_ROW
+        elif dtype is None:
+            total += 8 # object pointer
+        else:
+            total += np.dtype(dtype).itemsize
+    return total
+
+def plan_chunks(filePath, schema, columns, memoryBudgetMB = CHUNK_MEMORY_BUDGET_MB, rowCountMode = ROW_COUNT_MODE):
+    """Plan the chunked read of a csv file: count (or estimate) the rows and choose the chunk size
+    so that one chunk (csv text + typed columns) fits in the memory budget.
+
+    @param filePath : path of the csv file
+    @param schema : schema of data types
+    @param columns : column's names
+    @param [optional] memoryBudgetMB : memory budget (MB) of a single chunk (default = CHUNK_MEMORY_BUDGET_MB)
+    @param [optional] rowCountMode : 'exact' (newline scan) or 'estimate' (sampled byte offsets) (default = ROW_COUNT_MODE)
+    @return dictionary with the plan : rows, chunkSize, chunks, bytesPerRow, rowCountMode
+    """
+    if rowCountMode not in ('exact', 'estimate'):
+        raise ValueError("ROW_COUNT_MODE must be 'exact' or 'estimate'")
+
+    with instrumentation.span(f"chunk plan for {os.path.basename(filePath)}", rowCountMode=rowCountMode):
+        rows = count_rows(filePath) if rowCountMode == 'exact' else estimate_rows(filePath)
+        text_bytes_per_row = sample_bytes_per_line(filePath) or 0
+    bytes_per_row = get_typed_bytes_per_row(schema, columns) + text_bytes_per_row
+    budget_rows = max(1, int(memoryBudgetMB * 1024 * 1024 // bytes_per_row))
+
+    if rows > 0:
+        chunks, chunk_size = calculate_chunk_size(rows, min(budget_rows, rows))
+    else:
+        chunks, chunk_size = 0, budget_rows
+
+    plan = {
+        'rows': rows,
+        'chunkSize': chunk_size,
+        'chunks': chunks,
+        'bytesPerRow': round(bytes_per_row, 1),
+        'rowCountMode': rowCountMode,
+    }
+
+    log(('processing', 'all infos', 'debug'), "chunk plan for {} : {} rows ({}), {} chunks of {} rows, {} bytes per row, budget {} MB",
+        os.path.basename(filePath), rows, rowCountMode, chunks, chunk_size, plan['bytesPerRow'], memoryBudgetMB)
+    return plan
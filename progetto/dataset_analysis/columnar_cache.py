@@ -0,0 +1,243 @@
+import os
+import json
+import hashlib
+import shutil
+import numpy as np
+import pandas as pd
+import instrumentation
+from instrumentation import log
+
+CACHE_VERSION = 1
+META_FILE_NAME = "meta.json"
+FINGERPRINT_BYTES = 4096
+
+
+def get_source_signature(filePath, schema, columns):
+    """Build the signature of a CSV file used to validate its columnar cache
+    (the cache is valid only if file size, modification time and reader schema are unchanged)
+
+    @param filePath : path of the source CSV file
+    @param schema : schema of data types used by the reader
+    @param columns : column's names read by the reader
+    @return dictionary with the signature of the source file
+    """
+    stat = os.stat(filePath)
+    return {
+        'version': CACHE_VERSION,
+        'source': os.path.abspath(filePath),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'schema': {column: str(schema.get(column)) for column in columns},
+        'columns': list(columns),
+    }
+
+def get_cache_dir(cacheRoot, filePath):
+    """Return the directory that contains the columnar cache of a CSV file
+    @param cacheRoot : root directory of the columnar caches
+    @param filePath : path of the source CSV file
+    @return cache directory path
+    """
+    name = os.path.splitext(os.path.basename(filePath))[0]
+    return os.path.join(cacheRoot, name)
+
+def get_fingerprint(filePath, endByte):
+    """Fingerprint of the content of a file up to endByte (first and last bytes before endByte),
+    used to check that rows were only appended after a watermark
+    @param filePath : path of the file
+    @param endByte : end (excluded) of the fingerprinted content
+    @return hex digest
+    """
+    digest = hashlib.sha1()
+    with open(filePath, "rb") as f:
+        digest.update(f.read(min(FINGERPRINT_BYTES, endByte)))
+        f.seek(max(0, endByte - FINGERPRINT_BYTES))
+        digest.update(f.read(endByte - f.tell()))
+    return digest.hexdigest()
+
+def _segment_path(cacheDir, column, segment):
+    """Path of a segment of a column (segment 0 = rows of the first read, then one segment for every append)"""
+    if segment == 0:
+        return os.path.join(cacheDir, f"{column}.npy")
+    return os.path.join(cacheDir, f"{column}.{segment}.npy")
+
+def _write_meta(cacheDir, meta):
+    """Write the meta file by a temporary file + rename (the meta file is the commit point of the cache)"""
+    meta_path = os.path.join(cacheDir, META_FILE_NAME)
+    with open(meta_path + ".tmp", "w") as meta_file:
+        json.dump(meta, meta_file)
+    os.replace(meta_path + ".tmp", meta_path)
+
+def _read_meta(cacheDir):
+    meta_path = os.path.join(cacheDir, META_FILE_NAME)
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, "r") as meta_file:
+            return json.load(meta_file)
+    except (OSError, ValueError):
+        return None
+
+def load_columns(cacheRoot, filePath, schema, columns, validateSignature = True):
+    """Load a dataframe from the columnar cache of a CSV file if the cache is still valid.
+    Numeric columns are memory-mapped (.npy files), category columns are rebuilt from codes and categories.
+    The segments of the appended rows (see append_columns) are concatenated after the first one.
+
+    @param cacheRoot : root directory of the columnar caches
+    @param filePath : path of the source CSV file
+    @param schema : schema of data types used by the reader
+    @param columns : column's names read by the reader
+    @param [optional] validateSignature : if False the cache is loaded also if the source file changed 
+        (used to extend the cache with appended rows, see get_append_watermark)
+    @return cached dataframe or None if the cache is missing / invalidated
+    """
+    cacheDir = get_cache_dir(cacheRoot, filePath)
+    meta = _read_meta(cacheDir)
+    if meta is None:
+        return None
+
+    if validateSignature and meta.get('signature') != get_source_signature(filePath, schema, columns):
+        log(('debug', 'all infos'), "columnar cache of {} is stale -> rebuild it", os.path.basename(filePath))
+        return None
+
+    with instrumentation.span(f"load {os.path.basename(filePath)} from columnar cache", rows=meta['rows']):
+        segments = range(len(meta.get('segments', [meta['rows']])))
+        data = {}
+        for column in columns:
+            parts = [np.load(_segment_path(cacheDir, column, segment), mmap_mode='r') for segment in segments]
+            values = parts[0] if len(parts) == 1 else np.concatenate(parts)
+            if meta['kinds'][column] == 'category':
+                codes = values
+                categories = np.load(os.path.join(cacheDir, f"{column}.categories.npy"))
+                categories = pd.Index(categories.astype(str))
+                data[column] = pd.Categorical.from_codes(codes, categories=categories)
+            else:
+                data[column] = values
+
+        df = pd.DataFrame(data, copy=False)
+    return df
+
+def get_append_watermark(cacheRoot, filePath, schema, columns):
+    """Return the watermark (byte offset and rows) of the cache if the source file changed 
+    only by appending new rows after it (same reader schema, same content up to the watermark)
+
+    @param cacheRoot : root directory of the columnar caches
+    @param filePath : path of the source CSV file
+    @param schema : schema of data types used by the reader
+    @param columns : column's names read by the reader
+    @return dictionary with bytes and rows of the watermark, or None if the file must be read again from the start
+    """
+    meta = _read_meta(get_cache_dir(cacheRoot, filePath))
+    if meta is None or 'watermark' not in meta:
+        return None
+
+    signature = get_source_signature(filePath, schema, columns)
+    cached_signature = meta.get('signature', {})
+    for key in ('version', 'source', 'schema', 'columns'):
+        if cached_signature.get(key) != signature[key]:
+            return None
+
+    watermark = meta['watermark']
+    if signature['size'] <= watermark['bytes']:
+        return None
+    if get_fingerprint(filePath, watermark['bytes']) != watermark['fingerprint']:
+        return None
+    return {'bytes': watermark['bytes'], 'rows': watermark['rows']}
+
+def store_columns(cacheRoot, filePath, schema, columns, df):
+    """Write the columns of a dataframe (read by a CSV file) as typed columnar cache.
+    The meta file is written as last operation, so an interrupted write leaves an invalid (ignored) cache.
+
+    @param cacheRoot : root directory of the columnar caches
+    @param filePath : path of the source CSV file
+    @param schema : schema of data types used by the reader
+    @param columns : column's names read by the reader
+    @param df : dataframe to store
+    @no return
+    """
+    cacheDir = get_cache_dir(cacheRoot, filePath)
+    if os.path.exists(cacheDir):
+        shutil.rmtree(cacheDir)
+    os.makedirs(cacheDir)
+
+    kinds = {}
+    for column in columns:
+        column_path = os.path.join(cacheDir, f"{column}.npy")
+        values = df[column]
+        if not pd.api.types.is_numeric_dtype(values.dtype):
+            # chunks with different categories are concatenated as object -> store them as category
+            values = values.astype('category')
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            kinds[column] = 'category'
+            np.save(column_path, values.cat.codes.to_numpy())
+            categories = values.cat.categories.to_numpy().astype(bytes)
+            np.save(os.path.join(cacheDir, f"{column}.categories.npy"), categories)
+        else:
+            kinds[column] = 'numeric'
+            np.save(column_path, values.to_numpy())
+
+    signature = get_source_signature(filePath, schema, columns)
+    meta = {
+        'signature': signature,
+        'kinds': kinds,
+        'rows': len(df),
+        'segments': [len(df)],
+        # rows of the file already in the cache : appended rows are read starting from here
+        'watermark': {
+            'bytes': signature['size'],
+            'rows': len(df),
+            'fingerprint': get_fingerprint(filePath, signature['size']),
+        },
+    }
+    _write_meta(cacheDir, meta)
+
+    log(('debug', 'all infos'), "stored columnar cache of {} ({} rows)", os.path.basename(filePath), len(df))
+
+def append_columns(cacheRoot, filePath, schema, columns, df):
+    """Add the rows appended to a CSV file (after the watermark) to its columnar cache as a new segment
+    of every column: the cached columns are not rewritten, only the categories of the category
+    columns (existing codes unchanged, new values at the end) and the meta file (rows, watermark, signature).
+    The meta file is replaced as last operation, so an interrupted append leaves the previous cache valid.
+
+    @param cacheRoot : root directory of the columnar caches
+    @param filePath : path of the source CSV file
+    @param schema : schema of data types used by the reader
+    @param columns : column's names read by the reader
+    @param df : dataframe of the appended rows
+    @no return
+    """
+    cacheDir = get_cache_dir(cacheRoot, filePath)
+    meta = _read_meta(cacheDir)
+    segments = meta.get('segments', [meta['rows']])
+    segment = len(segments)
+
+    for column in columns:
+        values = df[column]
+        if meta['kinds'][column] == 'category':
+            categories_path = os.path.join(cacheDir, f"{column}.categories.npy")
+            categories = pd.Index(np.load(categories_path).astype(str))
+            # valori mancanti = codice -1 (come nel primo segmento), non la categoria 'nan'
+            present = values.notna().to_numpy()
+            strings = values.to_numpy()[present].astype(str)
+            new_categories = pd.Index(pd.unique(strings)).difference(categories)
+            if len(new_categories) > 0:
+                categories = categories.append(new_categories)
+                np.save(categories_path, categories.to_numpy().astype(bytes))
+            codes = np.full(len(values), -1, dtype='int32')
+            codes[present] = categories.get_indexer(strings)
+            np.save(_segment_path(cacheDir, column, segment), codes)
+        else:
+            dtype = np.load(_segment_path(cacheDir, column, 0), mmap_mode='r').dtype
+            np.save(_segment_path(cacheDir, column, segment), values.to_numpy().astype(dtype, copy=False))
+
+    signature = get_source_signature(filePath, schema, columns)
+    meta['signature'] = signature
+    meta['rows'] += len(df)
+    meta['segments'] = segments + [len(df)]
+    meta['watermark'] = {
+        'bytes': signature['size'],
+        'rows': meta['rows'],
+        'fingerprint': get_fingerprint(filePath, signature['size']),
+    }
+    _write_meta(cacheDir, meta)
+
+    log(('debug', 'all infos'), "appended {} rows to the columnar cache of {} (segment {})", len(df), os.path.basename(filePath), segment)
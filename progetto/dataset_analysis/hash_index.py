@@ -0,0 +1,155 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import instrumentation
+from instrumentation import log
+
+# Compact index hash (string) -> addressId:
+# every hash is converted to a fixed-width 64 bit digest, digests are kept in a sorted
+# numpy array aligned with the addressIds, so a lookup is a vectorized binary search
+# instead of a merge on a string column.
+
+MISSING_ADDRESS_ID = -1
+MISSING_DIGEST = np.uint64(0) # digest of the missing hashes (NaN), never in the index and never found
+INDEX_META_FILE_NAME = "meta.json"
+
+
+def hash_strings(values):
+    """Return the 64 bit digests of strings (vectorized)
+    @param values : array / Series / Categorical of strings
+    @return numpy array (uint64) of digests (MISSING_DIGEST for the missing values)
+    """
+    if isinstance(values, pd.Series):
+        values = values.array
+    if isinstance(values, pd.Categorical):
+        # hash only the categories, then expand them by the codes (code -1 = missing value)
+        category_digests = hash_strings(values.categories.to_numpy())
+        codes = np.asarray(values.codes)
+        digests = np.full(len(codes), MISSING_DIGEST, dtype='uint64')
+        valid = codes >= 0
+        digests[valid] = category_digests[codes[valid]]
+        return digests
+    values = np.asarray(values, dtype=object)
+    digests = pd.util.hash_array(values, categorize=False)
+    digests[pd.isna(values)] = MISSING_DIGEST
+    return digests
+
+class AddressHashIndex:
+    """Sorted array of hash digests mapping every hash of the map csv to its addressId"""
+
+    def __init__(self, digests, addressIds):
+        """
+        @param digests : sorted numpy array (uint64) of hash digests
+        @param addressIds : numpy array (int32) of addressIds aligned to digests
+        """
+        self.digests = digests
+        self.addressIds = addressIds
+        self.sortedAddressIds = np.sort(addressIds)
+
+    @classmethod
+    def from_hashes(cls, hashes, addressIds):
+        """Build the index by hashes and addressIds
+        @param hashes : array / Series / Categorical of hashes (strings)
+        @param addressIds : array / Series of addressIds
+        @return AddressHashIndex
+        """
+        digests = hash_strings(hashes)
+        addressIds = np.asarray(addressIds, dtype='int32')
+        # righe senza hash escluse (non devono corrispondere a nessun indirizzo)
+        present = digests != MISSING_DIGEST
+        digests, addressIds = digests[present], addressIds[present]
+        order = np.argsort(digests, kind='stable')
+        digests = digests[order]
+        addressIds = addressIds[order]
+
+        duplicated = digests[1:] == digests[:-1]
+        if duplicated.any():
+            # same hash repeated (or digest collision) -> keep the first addressId
+            keep = np.concatenate(([True], ~duplicated))
+            log('debug', "hash index : {} duplicated digests ignored", int(duplicated.sum()))
+            digests = digests[keep]
+            addressIds = addressIds[keep]
+        return cls(digests, addressIds)
+
+    @classmethod
+    def from_map_dataframe(cls, mapDF):
+        """Build the index by the map dataframe (txHash, addressId columns)
+        @param mapDF : map dataframe
+        @return AddressHashIndex
+        """
+        return cls.from_hashes(mapDF['txHash'], mapDF['addressId'])
+
+    def __len__(self):
+        return len(self.digests)
+
+    def lookup(self, hashes):
+        """Vectorized lookup of the addressIds of hashes
+        @param hashes : array / Series / Categorical of hashes (strings)
+        @return numpy array (int32) of addressIds (MISSING_ADDRESS_ID for hashes not in the index)
+        """
+        digests = hash_strings(hashes)
+        if len(self.digests) == 0:
+            return np.full(len(digests), MISSING_ADDRESS_ID, dtype='int32')
+        positions = np.searchsorted(self.digests, digests)
+        positions = np.minimum(positions, len(self.digests) - 1)
+        found = (self.digests[positions] == digests) & (digests != MISSING_DIGEST)
+        return np.where(found, self.addressIds[positions], MISSING_ADDRESS_ID).astype('int32')
+
+    def contains_address_ids(self, addressIds):
+        """Vectorized check of the addressIds that have a hash in the index
+        @param addressIds : array / Series of addressIds
+        @return boolean numpy array
+        """
+        addressIds = np.asarray(addressIds)
+        if len(self.sortedAddressIds) == 0:
+            return np.zeros(len(addressIds), dtype='bool')
+        positions = np.searchsorted(self.sortedAddressIds, addressIds)
+        positions = np.minimum(positions, len(self.sortedAddressIds) - 1)
+        return self.sortedAddressIds[positions] == addressIds
+
+    def resolve_pools(self, miningPoolAddressesDF):
+        """Add the addressId column to the mining pool addresses dataframe (by scraper.getPools)
+        @param miningPoolAddressesDF : dataframe with txHash and pool columns
+        @return dataframe with txHash, pool and addressId columns (only addresses found in the index)
+        """
+        resolved = miningPoolAddressesDF.copy()
+        resolved['addressId'] = self.lookup(resolved['txHash'])
+        return resolved.loc[resolved['addressId'] != MISSING_ADDRESS_ID]
+
+    def save(self, indexDir, signature):
+        """Persist the index (.npy files) with the signature of its source file
+        @param indexDir : directory of the index
+        @param signature : signature of the source file (see columnar_cache.get_source_signature)
+        @no return
+        """
+        os.makedirs(indexDir, exist_ok=True)
+        meta_path = os.path.join(indexDir, INDEX_META_FILE_NAME)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        np.save(os.path.join(indexDir, "digests.npy"), self.digests)
+        np.save(os.path.join(indexDir, "addressIds.npy"), self.addressIds)
+        with open(meta_path, "w") as meta_file:
+            json.dump({'signature': signature, 'size': len(self)}, meta_file)
+
+    @classmethod
+    def load(cls, indexDir, signature):
+        """Load a persisted index if it was built by the same source file
+        @param indexDir : directory of the index
+        @param signature : current signature of the source file
+        @return AddressHashIndex or None if missing / stale
+        """
+        meta_path = os.path.join(indexDir, INDEX_META_FILE_NAME)
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, "r") as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+        if meta.get('signature') != signature:
+            return None
+
+        with instrumentation.span('load address hash index'):
+            index = cls(np.load(os.path.join(indexDir, "digests.npy")), np.load(os.path.join(indexDir, "addressIds.npy")))
+        return index
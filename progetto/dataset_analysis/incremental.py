@@ -0,0 +1,153 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import instrumentation
+from instrumentation import log
+from utilities import month_id, month_id_to_label, bi_month_id, bi_month_id_to_label
+from dataset_analysis import analizer
+
+pd.set_option("mode.copy_on_write", True)
+
+# Incremental recompute of the analysis results:
+# results of the previous run are persisted with the rows of the csv files they were
+# calculated from; when new rows are appended to the csv files only the months /
+# bi-month periods touched by the new rows are calculated again and merged into them.
+
+RESULTS_META_FILE_NAME = "meta.json"
+
+
+class IncrementalResultsStore:
+    """Persisted results (dataframes) tagged with the rows of the source csv files"""
+
+    def __init__(self, rootDir):
+        """
+        @param rootDir : directory where the results are persisted
+        """
+        self.rootDir = rootDir
+
+    def _paths(self, name):
+        return os.path.join(self.rootDir, f"{name}.pkl"), os.path.join(self.rootDir, f"{name}.{RESULTS_META_FILE_NAME}")
+
+    def load(self, name, sourceRows, fingerprint = None):
+        """Load a result if it was calculated exactly by sourceRows rows of the csv files
+        @param name : name of the result
+        @param sourceRows : dictionary csv file -> rows used by the previous run
+        @param [optional] fingerprint : other data the result depends on (ex. mining pools addresses)
+        @return dataframe or None if missing / not valid
+        """
+        result_path, meta_path = self._paths(name)
+        if not os.path.exists(result_path) or not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, "r") as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+        if meta.get('sourceRows') != sourceRows or meta.get('fingerprint') != fingerprint:
+            return None
+        return pd.read_pickle(result_path)
+
+    def save(self, name, result, sourceRows, fingerprint = None):
+        """Persist a result with the rows of the csv files used to calculate it
+        @param name : name of the result
+        @param result : dataframe
+        @param sourceRows : dictionary csv file -> rows used to calculate the result
+        @param [optional] fingerprint : other data the result depends on
+        @no return
+        """
+        os.makedirs(self.rootDir, exist_ok=True)
+        result_path, meta_path = self._paths(name)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        result.to_pickle(result_path)
+        with open(meta_path, "w") as meta_file:
+            json.dump({'sourceRows': sourceRows, 'fingerprint': fingerprint}, meta_file)
+
+def dataframe_fingerprint(df):
+    """Content fingerprint of a (small) dataframe, ex. the mining pools addresses
+    @param df : dataframe
+    @return string fingerprint
+    """
+    return str(int(pd.util.hash_pandas_object(df, index=False).sum() % (2**63)))
+
+def touched_month_ids(transactionDF, newTransactionsMask, newTxIds):
+    """Find the months touched by new rows: months of new transactions and months
+    of the transactions that have new inputs / outputs
+    @param transactionDF : transactions dataframe (with Unix timestamp column)
+    @param newTransactionsMask : boolean mask of the new rows of transactionDF
+    @param newTxIds : txIds of the new inputs / outputs rows
+    @return sorted numpy array of month ids
+    """
+    tx_month_ids = month_id(transactionDF['timestamp'])
+    touched = tx_month_ids[newTransactionsMask]
+    touched_by_rows = tx_month_ids[transactionDF['txId'].isin(newTxIds).to_numpy()]
+    return np.unique(np.concatenate((touched, touched_by_rows)))
+
+def _merge_results(previous, recalculated, keyColumn, replacedKeys):
+    """Replace the rows of previous results that have a key in replacedKeys with the recalculated ones"""
+    kept = previous.loc[~previous[keyColumn].isin(replacedKeys)]
+    recalculated = recalculated.loc[recalculated[keyColumn].isin(replacedKeys)]
+    if len(recalculated) == 0:
+        # nothing to add : keep the dtypes of the previous results
+        return kept.reset_index(drop=True)
+    merged = pd.concat([kept, recalculated], ignore_index=True)
+    columns = list(previous.columns) + [column for column in recalculated.columns if column not in previous.columns]
+    return merged[columns]
+
+def incrementalProcessTransactions(inputsDF, outputsDF, transactionDF, touchedMonthIds, previous):
+    """Calculate the monthly results (see analizer.processTransactions) only for the touched months
+    and merge them into the previous results
+
+    @params : inputsDF : inputs dataframe
+    @params : outputsDF : outputs dataframe
+    @params : transactionDF : (not coinbase) transactions dataframe (with Unix timestamp column)
+    @params : touchedMonthIds : month ids touched by new rows
+    @params : previous : monthly results of the previous run (None -> all the months are calculated)
+    @return dataframe of months in which every month has network congestion and fees
+    """
+    if previous is None or len(previous) == 0:
+        return analizer.processTransactions(inputsDF, outputsDF, transactionDF)
+
+    tx_month_ids = month_id(transactionDF['timestamp'])
+    if len(tx_month_ids) > 0:
+        # months added after the last previous month are all recalculated (also the empty ones)
+        last_previous_month = max(pd.Period(label, freq='M').ordinal for label in previous['month'])
+        new_months = np.arange(last_previous_month + 1, int(tx_month_ids.max()) + 1)
+        touchedMonthIds = np.union1d(touchedMonthIds, new_months)
+    if len(touchedMonthIds) == 0:
+        return previous
+
+    log(('processing', 'debug'), "recalculating {} touched months", len(touchedMonthIds))
+    with instrumentation.span('recalculate touched months', ('time', 'processing'), months=len(touchedMonthIds)):
+        touchedTransactions = transactionDF.loc[np.isin(tx_month_ids, touchedMonthIds)]
+        recalculated = analizer.processTransactions(inputsDF, outputsDF, touchedTransactions)
+        result = _merge_results(previous, recalculated, 'month', month_id_to_label(touchedMonthIds))
+        result = result.sort_values('month', ignore_index=True)
+    return result
+
+def incrementalBiMonthlyStatistics(coinbaseDF, touchedBiMonthIds, previous):
+    """Calculate the bi-monthly pool statistics (see analizer.calculate_bi_monthly_statistics) only for the
+    touched bi-month periods and merge them into the previous results; global statistics are the sum of
+    the bi-monthly ones (every block belongs to a single period)
+
+    @params : coinbaseDF : dataframe of Coinbase transactions associated to a pool (with Unix timestamp column)
+    @params : touchedBiMonthIds : bi-month ids touched by new rows
+    @params : previous : tuple (bi-monthly blocks mined, bi-monthly total rewards) of the previous run or None
+    @return global blocks mined, global total rewards, bi-monthly blocks mined, bi-monthly total rewards dataframes
+    """
+    if previous is None:
+        blocks_mined, total_rewards = analizer.calculate_bi_monthly_statistics(coinbaseDF)
+    else:
+        previous_blocks, previous_rewards = previous
+        touchedCoinbase = coinbaseDF.loc[np.isin(bi_month_id(coinbaseDF['timestamp']), touchedBiMonthIds)]
+        new_blocks, new_rewards = analizer.calculate_bi_monthly_statistics(touchedCoinbase)
+        touched_labels = bi_month_id_to_label(touchedBiMonthIds)
+        blocks_mined = _merge_results(previous_blocks, new_blocks, 'bi_month', touched_labels)
+        total_rewards = _merge_results(previous_rewards, new_rewards, 'bi_month', touched_labels)
+        blocks_mined = blocks_mined.sort_values(['pool', 'bi_month'], ignore_index=True)
+        total_rewards = total_rewards.sort_values(['pool', 'bi_month'], ignore_index=True)
+
+    global_blocks_mined = blocks_mined.groupby('pool')['blocks_mined'].sum().reset_index(name='blocks_mined')
+    global_total_rewards = total_rewards.groupby('pool')['total_rewards'].sum().reset_index(name='total_rewards')
+    return global_blocks_mined, global_total_rewards, blocks_mined, total_rewards
@@ -0,0 +1,223 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import instrumentation
+from utilities import SECONDS_PER_DAY
+from utilities import day_id
+from dataset_analysis import analizer
+
+pd.set_option("mode.copy_on_write", True)
+
+# Pre-aggregated daily metrics cube:
+# fees, size components of the network congestion, script type counts and blocks / rewards
+# of every pool are aggregated once for every day; every coarser resolution (week, month,
+# quarter, year, ...) is a rollup (sum of consecutive days) of the cube, so new charts and
+# resolutions never touch the raw csv files. Every block belongs to a single day, so also
+# the blocks mined (distinct blockId) are additive over days.
+
+CUBE_META_FILE_NAME = "meta.json"
+CUBE_ARRAYS = ['fees', 'inputs', 'outputs', 'script_bytes', 'script_types', 'script_type_counts', 'pools', 'pool_blocks', 'pool_rewards']
+
+
+def _rollup_codes(first_day, days_quantity, bucket):
+    """Return the bucket code of every day of a consecutive range of days
+    @param first_day : day id of the first day
+    @param days_quantity : number of days
+    @param bucket : time bucket name (see analizer.TIME_BUCKETS)
+    @return numpy array of bucket codes (not decreasing), function codes -> labels
+    """
+    if bucket not in analizer.TIME_BUCKETS:
+        raise ValueError(f"unknown bucket {bucket}, valid buckets for the cube : {list(analizer.TIME_BUCKETS)}")
+    code_function, label_function = analizer.TIME_BUCKETS[bucket]
+    day_ids = np.arange(first_day, first_day + days_quantity, dtype='int64')
+    return np.asarray(code_function(day_ids * SECONDS_PER_DAY), dtype='int64'), label_function
+
+def _sum_by_codes(values, codes):
+    """Sum the rows of values with the same (consecutive) code
+    @param values : 1D / 2D numpy array (one row for every day)
+    @param codes : not decreasing bucket codes of the days
+    @return unique codes, summed values (one row for every code)
+    """
+    if len(codes) == 0:
+        return codes[:0], values[:0]
+    starts = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1])))
+    return codes[starts], np.add.reduceat(values, starts, axis=0)
+
+def _pool_arrays(coinbaseAssociatedDF):
+    """Blocks mined and total rewards of every (day, pool) of the coinbase transactions associated to a pool
+    @param coinbaseAssociatedDF : coinbase associated dataframe (with Unix timestamp column) or None (no pools)
+    @return first day id, pools names (sorted), 2D array (day, pool) of the blocks mined, 2D array (day, pool) of the rewards
+    """
+    if coinbaseAssociatedDF is None or len(coinbaseAssociatedDF) == 0:
+        return 0, np.zeros(0, dtype='U1'), np.zeros((0, 0), dtype='int64'), np.zeros((0, 0), dtype='int64')
+    daily_blocks, daily_rewards = analizer.aggregate_pool_statistics(coinbaseAssociatedDF, 'day')
+    pools = np.sort(np.array(daily_blocks['pool'].unique().tolist(), dtype=str)) if len(daily_blocks) > 0 else np.zeros(0, dtype='U1')
+    pool_day_ids = day_id(coinbaseAssociatedDF['timestamp'])
+    pool_first_day = int(pool_day_ids.min())
+    pool_days_quantity = int(pool_day_ids.max()) - pool_first_day + 1
+    pool_blocks = np.zeros((pool_days_quantity, len(pools)), dtype='int64')
+    pool_rewards = np.zeros((pool_days_quantity, len(pools)), dtype='int64')
+    if len(daily_blocks) > 0:
+        rows = np.asarray(daily_blocks['day'].tolist(), dtype='datetime64[D]').astype('int64') - pool_first_day
+        columns = np.searchsorted(pools, np.array(daily_blocks['pool'].tolist(), dtype=str))
+        pool_blocks[rows, columns] = daily_blocks['blocks_mined'].to_numpy()
+        pool_rewards[rows, columns] = daily_rewards['total_rewards'].to_numpy()
+    return pool_first_day, pools, pool_blocks, pool_rewards
+
+
+class MetricsCube:
+    """Daily metrics of the transactions (fees, size components, script types) and of the mining pools (blocks, rewards)"""
+
+    def __init__(self, first_day, fees, inputs, outputs, script_bytes, script_types, script_type_counts,
+                 pool_first_day, pools, pool_blocks, pool_rewards):
+        """
+        @param first_day : day id of the first day of the transactions metrics
+        @param fees : fees of every day
+        @param inputs : inputs of every day (transactions with both inputs and outputs)
+        @param outputs : outputs of every day (transactions with both inputs and outputs)
+        @param script_bytes : script sizes of every day (transactions with both inputs and outputs)
+        @param script_types : script type codes with at least one output
+        @param script_type_counts : 2D array (day, script type of script_types) with the outputs quantity
+        @param pool_first_day : day id of the first day of the pools metrics
+        @param pools : names of the pools (sorted)
+        @param pool_blocks : 2D array (day, pool) with the blocks mined
+        @param pool_rewards : 2D array (day, pool) with the total rewards
+        """
+        self.first_day = int(first_day)
+        self.fees = fees
+        self.inputs = inputs
+        self.outputs = outputs
+        self.script_bytes = script_bytes
+        self.script_types = script_types
+        self.script_type_counts = script_type_counts
+        self.pool_first_day = int(pool_first_day)
+        self.pools = pools
+        self.pool_blocks = pool_blocks
+        self.pool_rewards = pool_rewards
+
+    @classmethod
+    def build(cls, inputsDF, outputsDF, transactionDF, coinbaseAssociatedDF = None, backend = analizer.ANALYSIS_BACKEND):
+        """Build the cube in a single pass over the dataframes
+        @param inputsDF : inputs dataframe
+        @param outputsDF : outputs dataframe
+        @param transactionDF : (not coinbase) transactions dataframe (with Unix timestamp column)
+        @param [optional] coinbaseAssociatedDF : coinbase transactions associated to a pool (with Unix timestamp column),
+                                                 None = cube without pools (see with_pools)
+        @param [optional] backend : backend of analizer.aggregate_transactions
+        @return MetricsCube
+        """
+        with instrumentation.span('build metrics cube') as span:
+            aggregated = analizer.aggregate_transactions(inputsDF, outputsDF, transactionDF, day_id(transactionDF['timestamp']), backend)
+            script_types = np.flatnonzero(aggregated['script_type_counts'].sum(axis=0))
+            cube = cls(aggregated['first_bucket'], aggregated['fees'], aggregated['inputs'], aggregated['outputs'], aggregated['script_bytes'],
+                       script_types, aggregated['script_type_counts'][:, script_types], *_pool_arrays(coinbaseAssociatedDF))
+            span.set(days=len(cube.fees), pools=len(cube.pools))
+        return cube
+
+    def with_pools(self, coinbaseAssociatedDF):
+        """Cube with the same transactions metrics and the pools metrics of the coinbase transactions
+        (the transactions metrics do not depend on the pools attribution, so they are built / cached before it)
+        @param coinbaseAssociatedDF : coinbase transactions associated to a pool (with Unix timestamp column)
+        @return MetricsCube
+        """
+        return MetricsCube(self.first_day, self.fees, self.inputs, self.outputs, self.script_bytes,
+                           self.script_types, self.script_type_counts, *_pool_arrays(coinbaseAssociatedDF))
+
+    def between(self, startDay = None, endDay = None):
+        """Cube restricted to a range of days (views of the arrays, no copies)
+        @param [optional] startDay : first day id of the range (None = from the first day)
+        @param [optional] endDay : last day id (excluded) of the range (None = up to the last day)
+        @return MetricsCube
+        """
+        def day_slice(first_day, days_quantity):
+            start = 0 if startDay is None else min(max(startDay - first_day, 0), days_quantity)
+            end = days_quantity if endDay is None else min(max(endDay - first_day, start), days_quantity)
+            return slice(start, end), first_day + start
+
+        days, first_day = day_slice(self.first_day, len(self.fees))
+        pool_days, pool_first_day = day_slice(self.pool_first_day, len(self.pool_blocks))
+        return MetricsCube(first_day, self.fees[days], self.inputs[days], self.outputs[days], self.script_bytes[days],
+                           self.script_types, self.script_type_counts[days], pool_first_day, self.pools,
+                           self.pool_blocks[pool_days], self.pool_rewards[pool_days])
+
+    def rollup(self, bucket = 'month'):
+        """Transactions metrics rolled up to a time bucket (same format of analizer.processTransactions)
+        @param [optional] bucket : 'day', 'week', 'month', 'bi_month', 'quarter' or 'year', default = 'month'
+        @return dataframe of buckets in which every bucket has network congestion, fees and script type counts
+        """
+        codes, label_function = _rollup_codes(self.first_day, len(self.fees), bucket)
+        bucket_codes, fees = _sum_by_codes(self.fees, codes)
+        _, inputs = _sum_by_codes(self.inputs, codes)
+        _, outputs = _sum_by_codes(self.outputs, codes)
+        _, script_bytes = _sum_by_codes(self.script_bytes, codes)
+        _, counts = _sum_by_codes(self.script_type_counts, codes)
+
+        script_type_counts = np.zeros((len(bucket_codes), analizer.SCRIPT_TYPES_QUANTITY), dtype='int64')
+        script_type_counts[:, self.script_types] = counts
+        congestion = analizer.get_network_congestion(inputs, outputs, script_bytes)
+        return analizer.build_bucket_data(label_function(bucket_codes), fees, congestion, script_type_counts, bucket)
+
+    def pool_rollup(self, bucket = None):
+        """Pools metrics rolled up to a time bucket (same format of analizer.aggregate_pool_statistics)
+        @param [optional] bucket : 'day', 'week', 'month', 'bi_month', 'quarter', 'year' or None (global statistics)
+        @return dataframe with minted blocks and dataframe with total rewards for each pool (and bucket)
+        """
+        if bucket is None:
+            bucket_codes = np.zeros(1, dtype='int64')
+            blocks = self.pool_blocks.sum(axis=0, keepdims=True)
+            rewards = self.pool_rewards.sum(axis=0, keepdims=True)
+        else:
+            codes, label_function = _rollup_codes(self.pool_first_day, len(self.pool_blocks), bucket)
+            bucket_codes, blocks = _sum_by_codes(self.pool_blocks, codes)
+            _, rewards = _sum_by_codes(self.pool_rewards, codes)
+
+        # righe (pool, bucket) ordinate per pool e bucket, solo quelle con almeno un blocco
+        bucket_index, pool_index = np.nonzero(blocks)
+        order = np.lexsort((bucket_index, pool_index))
+        bucket_index, pool_index = bucket_index[order], pool_index[order]
+
+        keys = {'pool': pd.Index(self.pools.astype(str)).take(pool_index)}
+        if bucket is not None:
+            keys[bucket] = label_function(bucket_codes[bucket_index])
+        blocks_mined_df = pd.DataFrame({**keys, 'blocks_mined': blocks[bucket_index, pool_index]})
+        total_rewards_df = pd.DataFrame({**keys, 'total_rewards': rewards[bucket_index, pool_index]})
+        return blocks_mined_df, total_rewards_df
+
+    def save(self, cubeDir, signature):
+        """Persist the cube (.npy files) with the signature of its sources
+        @param cubeDir : directory of the cube
+        @param signature : signature of the sources (json serializable)
+        @no return
+        """
+        os.makedirs(cubeDir, exist_ok=True)
+        meta_path = os.path.join(cubeDir, CUBE_META_FILE_NAME)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        for name in CUBE_ARRAYS:
+            np.save(os.path.join(cubeDir, f"{name}.npy"), getattr(self, name))
+        with open(meta_path, "w") as meta_file:
+            json.dump({'signature': signature, 'first_day': self.first_day, 'pool_first_day': self.pool_first_day}, meta_file)
+
+    @classmethod
+    def load(cls, cubeDir, signature):
+        """Load a persisted cube if it was built by the same sources
+        @param cubeDir : directory of the cube
+        @param signature : current signature of the sources
+        @return MetricsCube or None if missing / stale
+        """
+        meta_path = os.path.join(cubeDir, CUBE_META_FILE_NAME)
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, "r") as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+        if meta.get('signature') != signature:
+            return None
+
+        arrays = {name: np.load(os.path.join(cubeDir, f"{name}.npy")) for name in CUBE_ARRAYS}
+        return cls(meta['first_day'], arrays['fees'], arrays['inputs'], arrays['outputs'], arrays['script_bytes'],
+                   arrays['script_types'], arrays['script_type_counts'], meta['pool_first_day'],
+                   arrays['pools'], arrays['pool_blocks'], arrays['pool_rewards'])
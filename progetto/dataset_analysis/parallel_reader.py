@@ -0,0 +1,123 @@
+import io
+import os
+import multiprocessing
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from pandas.api.types import union_categoricals
+import instrumentation
+from utilities import SETTINGS
+
+MAX_PROCESS_QUANTITY = SETTINGS['MAX_PROCESS_QUANTITY'] or os.cpu_count() or 1
+RANGES_PER_PROCESS = 4 # more ranges than processes to balance the load between them
+# the readers are started by the worker threads of the stage scheduler (while the scraper threads are running):
+# a process forked by a multi-threaded process can inherit locks held by other threads -> fresh worker processes
+PROCESS_CONTEXT = multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+if PROCESS_CONTEXT.get_start_method() == 'forkserver':
+    # pandas, the main module and the analysis are imported once by the fork server, not by every worker
+    PROCESS_CONTEXT.set_forkserver_preload(['__main__', __name__, 'dataset_analysis.analizer'])
+
+
+def split_byte_ranges(filePath, parts, startByte = 0):
+    """Split a CSV file in byte ranges aligned to the start of a line
+    @param filePath : path of the CSV file
+    @param parts : desired number of ranges
+    @param [optional] startByte : first byte to split (start of a line, default = 0)
+    @return list of (start, end) byte offsets, every range contains only complete lines
+    """
+    size = os.path.getsize(filePath)
+    if size <= startByte:
+        return []
+    parts = max(1, min(parts, size - startByte))
+
+    boundaries = [startByte]
+    with open(filePath, "rb") as f:
+        for i in range(1, parts):
+            offset = startByte + (size - startByte) * i // parts
+            if offset <= boundaries[-1]:
+                continue
+            f.seek(offset - 1)
+            f.readline() # move to the beginning of the next line
+            position = f.tell()
+            if position >= size:
+                break
+            if position > boundaries[-1]:
+                boundaries.append(position)
+    boundaries.append(size)
+
+    return [(boundaries[i], boundaries[i+1]) for i in range(len(boundaries)-1)]
+
+def parse_byte_range(filePath, start, end, schema, columns, usecols):
+    """Parse a single byte range of a CSV file (executed in a worker process)
+    @param filePath : path of the CSV file
+    @param start : first byte of the range (start of a line)
+    @param end : last byte (excluded) of the range (start of a line or end of file)
+    @param schema : schema of data types
+    @param columns : column'n names
+    @param usecols : columns indexes of csv file
+    @return dictionary column name -> typed values of the range
+    """
+    with open(filePath, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    df = pd.read_csv(io.BytesIO(data), usecols=usecols, dtype=schema, names=columns)
+    values = {}
+    for column in columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            values[column] = df[column].array
+        else:
+            values[column] = df[column].to_numpy()
+    return values
+
+def _parse_byte_range_task(args):
+    return parse_byte_range(*args)
+
+def _union_categoricals(parts):
+    """Concatenate the categorical values of the ranges (a range with only missing values
+    has empty categories of another dtype, they take the dtype of the other ranges)"""
+    reference = next((part for part in parts if len(part.categories) > 0), parts[0])
+    return union_categoricals([part if len(part.categories) > 0 else pd.Categorical.from_codes(part.codes, categories=reference.categories[:0]) 
+                               for part in parts])
+
+def read_csv_parallel(schema, columns, usecols, filePath, processes = MAX_PROCESS_QUANTITY, startByte = 0):
+    """Read a CSV using all the cores: the file is split in newline-aligned byte ranges,
+    every range is parsed by a process of a pool and the typed columns are written
+    directly in preallocated arrays (single copy).
+    @param schema : schema of data types (to reduce dimension)
+    @param columns : column'n names
+    @param usecols : columns indexes of csv file
+    @param filePath : path of the CSV file
+    @param [optional] processes : number of worker processes (default = MAX_PROCESS_QUANTITY)
+    @param [optional] startByte : first byte to read (start of a line, ex. a watermark), default = 0
+    @return dataframe with the typed columns of the CSV
+    """
+    ranges = split_byte_ranges(filePath, processes * RANGES_PER_PROCESS, startByte)
+    if len(ranges) == 0:
+        return pd.DataFrame({column: pd.Series(dtype=schema.get(column)) for column in columns})
+
+    with instrumentation.span(f"parse {os.path.basename(filePath)} by byte ranges", ranges=len(ranges), processes=processes) as span:
+        tasks = [(filePath, start, end, schema, columns, usecols) for start, end in ranges]
+        if processes > 1 and len(ranges) > 1:
+            with ProcessPoolExecutor(max_workers=min(processes, len(ranges)), mp_context=PROCESS_CONTEXT) as executor:
+                parts = list(executor.map(_parse_byte_range_task, tasks))
+        else:
+            parts = [_parse_byte_range_task(task) for task in tasks]
+
+        total_rows = sum(len(part[columns[0]]) for part in parts)
+        data = {}
+        for column in columns:
+            if isinstance(parts[0][column], pd.Categorical):
+                data[column] = _union_categoricals([part[column] for part in parts])
+                continue
+            column_values = np.empty(total_rows, dtype=parts[0][column].dtype)
+            position = 0
+            for part in parts:
+                length = len(part[column])
+                column_values[position:position+length] = part[column]
+                position += length
+            data[column] = column_values
+
+        df = pd.DataFrame(data, copy=False)
+        span.set(rows=total_rows)
+    return df
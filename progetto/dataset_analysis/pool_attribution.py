@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import instrumentation
+from instrumentation import log
+
+pd.set_option("mode.copy_on_write", True)
+
+# Array-backed attribution of the mining pools:
+# every pool address (by scraper.getPools) is resolved to its addressId once and a dense
+# int8 array indexed by addressId holds the code of its pool, so the pool of every
+# coinbase output is a single vectorized gather instead of a chain of merges.
+
+NO_POOL = -1
+
+
+class PoolAttribution:
+    """Dense array addressId -> pool code"""
+
+    def __init__(self, pools, poolCodes):
+        """
+        @param pools : names of the pools (code i -> pools[i])
+        @param poolCodes : numpy array (int8) indexed by addressId with the pool code (NO_POOL = no pool)
+        """
+        self.pools = pools
+        self.poolCodes = poolCodes
+
+    @classmethod
+    def from_pool_addresses(cls, miningPoolAddressesDF, addressIndex):
+        """Build the attribution by the mining pool addresses
+        @param miningPoolAddressesDF : dataframe with txHash and pool columns (by scraper.getPools)
+        @param addressIndex : hash index of the map csv (address hash <--> addressId)
+        @return PoolAttribution
+        """
+        resolved = addressIndex.resolve_pools(miningPoolAddressesDF)
+        codes, pools = pd.factorize(resolved['pool'], sort=True)
+        if len(pools) > np.iinfo('int8').max:
+            raise ValueError(f"too many pools for an int8 attribution array ({len(pools)})")
+        addressIds = resolved['addressId'].to_numpy()
+        valid = codes >= 0
+        addressIds, codes = addressIds[valid], codes[valid]
+
+        poolCodes = np.full(int(addressIds.max()) + 1 if len(addressIds) > 0 else 0, NO_POOL, dtype='int8')
+        # un indirizzo associato a più pool -> vale la prima associazione (come per i doppioni di hash)
+        _, first_positions = np.unique(addressIds, return_index=True)
+        if len(first_positions) < len(addressIds):
+            log(('debug', 'all infos'), "pool attribution : {} repeated pool addresses ignored", len(addressIds) - len(first_positions))
+        poolCodes[addressIds[first_positions]] = codes[first_positions]
+        return cls(np.asarray(pools, dtype=object), poolCodes)
+
+    def label(self, addressIds):
+        """Vectorized pool code of addresses
+        @param addressIds : array / Series of addressIds
+        @return numpy array (int8) of pool codes (NO_POOL for addresses without pool)
+        """
+        addressIds = np.asarray(addressIds, dtype='int64')
+        codes = np.full(len(addressIds), NO_POOL, dtype='int8')
+        covered = (addressIds >= 0) & (addressIds < len(self.poolCodes))
+        codes[covered] = self.poolCodes[addressIds[covered]]
+        return codes
+
+    def split_coinbase(self, coinbaseOutputs, addressIndex):
+        """Split coinbase outputs in the ones associated to a mining pool and the not associated ones
+        (only outputs whose address is in the map csv)
+        @param coinbaseOutputs : dataframe of coinbase transactions with addressId and amount columns
+        @param addressIndex : hash index of the map csv (address hash <--> addressId)
+        @return coinbase associated dataframe (with pool column), coinbase not associated dataframe
+        """
+        with instrumentation.span('coinbase outputs attributed to the pools', rows=len(coinbaseOutputs)):
+            addressIds = coinbaseOutputs['addressId'].to_numpy()
+            codes = self.label(addressIds)
+            associated = codes != NO_POOL
+            # gli indirizzi di una pool sono nella map csv per costruzione (risolti dall'indice)
+            notAssociated = ~associated & addressIndex.contains_address_ids(addressIds)
+
+            coinbase_associated = coinbaseOutputs.loc[associated].reset_index(drop=True)
+            coinbase_associated['pool'] = self.pools[codes[associated]]
+            coinbaseNotAssociated = coinbaseOutputs.loc[notAssociated].reset_index(drop=True)
+        return coinbase_associated, coinbaseNotAssociated
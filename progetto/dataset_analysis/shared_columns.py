@@ -0,0 +1,61 @@
+import numpy as np
+from multiprocessing import shared_memory
+
+# Numpy columns published once in shared memory blocks:
+# the worker processes of a pool attach to the blocks by name and read the columns
+# as zero-copy numpy views, so the (multi-gigabyte) columns are never pickled for every task.
+
+
+class SharedColumns:
+    """Numpy columns copied in shared memory blocks (owned by the process that creates them)"""
+
+    def __init__(self, arrays):
+        """
+        @param arrays : dictionary column name -> numpy array
+        """
+        self.blocks = []
+        self.specs = {}
+        try:
+            for name, array in arrays.items():
+                array = np.ascontiguousarray(array)
+                block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+                self.blocks.append(block)
+                view = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+                view[...] = array
+                self.specs[name] = (block.name, array.shape, array.dtype.str)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        """Release and remove the shared memory blocks
+        @no params
+        @no return
+        """
+        for block in self.blocks:
+            block.close()
+            try:
+                block.unlink()
+            except FileNotFoundError:
+                pass
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+def attach_columns(specs):
+    """Attach to columns published by SharedColumns (executed in a worker process)
+    @param specs : SharedColumns.specs (column name -> (block name, shape, dtype))
+    @return dictionary column name -> numpy view, list of the attached blocks (keep them alive while using the views)
+    """
+    columns = {}
+    blocks = []
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        columns[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return columns, blocks
@@ -0,0 +1,249 @@
+import numpy as np
+import pandas as pd
+import instrumentation
+from instrumentation import log
+from utilities import month_id, month_id_to_label
+from dataset_analysis.analizer import DEFAULT_SCRIPT_SIZE, SCRIPT_TYPES_QUANTITY, get_script_size_array, build_month_data
+
+pd.set_option("mode.copy_on_write", True)
+
+# Streaming (out-of-core) version of the monthly analysis:
+# the chunks read by the csv files are consumed by incremental aggregators, so the
+# rows of the csv files are never concatenated in a single dataframe.
+# The only state kept in memory is a few bytes for every transaction (indexed by txId)
+# and the per-month accumulators. Like the readers in main.py the aggregators keep
+# only the first row of every txId (drop_duplicates on txId).
+
+UNSET_MONTH = -1
+UNSET_SCRIPT_TYPE = -1
+
+
+def _grow(array, size, fillValue):
+    """Return the array extended (at least) to size elements, new elements are set to fillValue"""
+    if size <= len(array):
+        return array
+    grown = np.full(max(size, 2 * len(array)), fillValue, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+def _first_rows_by_txId(chunk, seen):
+    """Filter a chunk keeping only the first row of every txId not already seen in previous chunks
+    @param chunk : chunk dataframe (with txId column)
+    @param seen : boolean array indexed by txId (updated in place only for the returned rows)
+    @return filtered chunk, txIds of the filtered chunk
+    """
+    txIds = chunk['txId'].to_numpy()
+    _, first_positions = np.unique(txIds, return_index=True)
+    first_positions.sort()
+    txIds = txIds[first_positions]
+    is_new = ~seen[txIds]
+    seen[txIds[is_new]] = True
+    return chunk.iloc[first_positions[is_new]], txIds[is_new]
+
+
+class StreamingMonthlyAggregator:
+    """Incremental aggregator of the monthly statistics (fees, tx sizes, script types, coinbase rewards).
+    The transactions chunks must be consumed before the inputs and outputs chunks
+    (the txId -> month association is taken by the transactions).
+    """
+    def __init__(self, topMiners = None, topMinersPerPeriod = None):
+        """
+        @param [optional] topMiners : top-k sketch of the miners (see top_k.MisraGriesSketch) updated by the coinbase outputs
+        @param [optional] topMinersPerPeriod : top-k sketches of the miners of every time bucket (see top_k.PeriodTopK, 
+                                               bucket of a month or longer : the outputs are dated by the month of their transaction)
+        """
+        self.tx_month = np.full(0, UNSET_MONTH, dtype='int32')
+        self.tx_is_coinbase = np.zeros(0, dtype='bool')
+        self.tx_seen = np.zeros(0, dtype='bool')
+        self.input_seen = np.zeros(0, dtype='bool')
+        self.output_seen = np.zeros(0, dtype='bool')
+        self.tx_inputs = np.zeros(0, dtype='int32')
+        self.tx_outputs = np.zeros(0, dtype='int32')
+        self.tx_first_script_type = np.full(0, UNSET_SCRIPT_TYPE, dtype='int16')
+
+        self.month_fees = np.zeros(0, dtype='int64')
+        self.month_coinbase_rewards = np.zeros(0, dtype='int64')
+        self.month_coinbase_blocks = np.zeros(0, dtype='int64')
+        self.month_script_types = np.zeros((0, SCRIPT_TYPES_QUANTITY), dtype='int64')
+        self.first_month = None
+        self.last_month = None
+
+        self.coinbase_tx_chunks = []
+        self.coinbase_output_chunks = []
+        self.top_miners = topMiners
+        self.top_miners_per_period = topMinersPerPeriod
+
+    def _grow_tx_arrays(self, size):
+        self.tx_month = _grow(self.tx_month, size, UNSET_MONTH)
+        self.tx_is_coinbase = _grow(self.tx_is_coinbase, size, False)
+        self.tx_seen = _grow(self.tx_seen, size, False)
+        self.input_seen = _grow(self.input_seen, size, False)
+        self.output_seen = _grow(self.output_seen, size, False)
+        self.tx_inputs = _grow(self.tx_inputs, size, 0)
+        self.tx_outputs = _grow(self.tx_outputs, size, 0)
+        self.tx_first_script_type = _grow(self.tx_first_script_type, size, UNSET_SCRIPT_TYPE)
+
+    def _grow_month_arrays(self, size):
+        self.month_fees = _grow(self.month_fees, size, 0)
+        self.month_coinbase_rewards = _grow(self.month_coinbase_rewards, size, 0)
+        self.month_coinbase_blocks = _grow(self.month_coinbase_blocks, size, 0)
+        if size > len(self.month_script_types):
+            grown = np.zeros((max(size, 2 * len(self.month_script_types)), SCRIPT_TYPES_QUANTITY), dtype='int64')
+            grown[:len(self.month_script_types)] = self.month_script_types
+            self.month_script_types = grown
+
+    def add_transactions(self, chunk):
+        """Consume a chunk of the transactions csv (timestamp, blockId, txId, isCoinbase, fee)
+        @param chunk : transactions chunk
+        @no return
+        """
+        if len(chunk) == 0:
+            return
+        self._grow_tx_arrays(int(chunk['txId'].max()) + 1)
+        chunk, txIds = _first_rows_by_txId(chunk, self.tx_seen)
+        if len(chunk) == 0:
+            return
+
+        months = month_id(chunk['timestamp'])
+        is_coinbase = chunk['isCoinbase'].to_numpy() == 1
+        self.tx_month[txIds] = months
+        self.tx_is_coinbase[txIds] = is_coinbase
+        self._grow_month_arrays(int(months.max()) + 1)
+
+        not_coinbase_months = months[~is_coinbase]
+        if len(not_coinbase_months) > 0:
+            fees = chunk['fee'].to_numpy()[~is_coinbase].astype('int64')
+            self.month_fees += np.bincount(not_coinbase_months, weights=fees, minlength=len(self.month_fees)).astype('int64')
+            chunk_first, chunk_last = int(not_coinbase_months.min()), int(not_coinbase_months.max())
+            self.first_month = chunk_first if self.first_month is None else min(self.first_month, chunk_first)
+            self.last_month = chunk_last if self.last_month is None else max(self.last_month, chunk_last)
+
+        if is_coinbase.any():
+            coinbase_chunk = chunk.loc[is_coinbase].drop('fee', axis=1)
+            self.coinbase_tx_chunks.append(coinbase_chunk)
+            # one coinbase transaction per block
+            self.month_coinbase_blocks += np.bincount(months[is_coinbase], minlength=len(self.month_coinbase_blocks))
+
+    def add_inputs(self, chunk):
+        """Consume a chunk of the inputs csv (txId)
+        @param chunk : inputs chunk
+        @no return
+        """
+        if len(chunk) == 0:
+            return
+        self._grow_tx_arrays(int(chunk['txId'].max()) + 1)
+        _, txIds = _first_rows_by_txId(chunk, self.input_seen)
+        self.tx_inputs[txIds] += 1
+
+    def add_outputs(self, chunk):
+        """Consume a chunk of the outputs csv (txId, addressId, amount, scriptType)
+        @param chunk : outputs chunk
+        @no return
+        """
+        if len(chunk) == 0:
+            return
+        self._grow_tx_arrays(int(chunk['txId'].max()) + 1)
+        chunk, txIds = _first_rows_by_txId(chunk, self.output_seen)
+        if len(chunk) == 0:
+            return
+
+        self.tx_outputs[txIds] += 1
+        # stessa mappatura di analizer.aggregate_tx_range : i codici negativi (int8) diventano 128..255
+        script_types = chunk['scriptType'].to_numpy().astype('int16') % SCRIPT_TYPES_QUANTITY
+        unset = self.tx_first_script_type[txIds] == UNSET_SCRIPT_TYPE
+        self.tx_first_script_type[txIds[unset]] = script_types[unset]
+
+        months = self.tx_month[txIds]
+        is_coinbase = self.tx_is_coinbase[txIds]
+
+        counted = (months != UNSET_MONTH) & ~is_coinbase
+        if counted.any():
+            keys = months[counted].astype('int64') * SCRIPT_TYPES_QUANTITY + script_types[counted]
+            counts = np.bincount(keys, minlength=self.month_script_types.size)
+            self.month_script_types += counts.reshape(self.month_script_types.shape)
+
+        coinbase_outputs = (months != UNSET_MONTH) & is_coinbase
+        if coinbase_outputs.any():
+            amounts = chunk['amount'].to_numpy()[coinbase_outputs]
+            self.month_coinbase_rewards += np.bincount(months[coinbase_outputs], weights=amounts, minlength=len(self.month_coinbase_rewards)).astype('int64')
+            self.coinbase_output_chunks.append(chunk.loc[coinbase_outputs].drop('scriptType', axis=1))
+            self._update_top_miners(chunk['addressId'].to_numpy()[coinbase_outputs], months[coinbase_outputs])
+
+    def _update_top_miners(self, addressIds, months):
+        """Add the miners of the coinbase outputs of a chunk to the top-k sketches"""
+        if self.top_miners is not None:
+            self.top_miners.update(addressIds)
+        if self.top_miners_per_period is not None:
+            # timestamp del primo giorno del mese della transazione (basta per bucket di uno o più mesi)
+            timestamps = np.asarray(months, dtype='int64').astype('datetime64[M]').astype('datetime64[s]').astype('int64')
+            self.top_miners_per_period.update(pd.DataFrame({'timestamp': timestamps, 'addressId': addressIds}))
+
+    def get_month_data(self):
+        """Return the monthly statistics with the same format of analizer.processTransactions
+        @no params
+        @return dataframe of months in which every month has network congestion, fees and script types counts
+        """
+        if self.first_month is None:
+            return pd.DataFrame()
+
+        # dimensione delle transazioni che hanno sia input che output (come nel calcolo per mese)
+        # (l'ultimo elemento è usato per UNSET_SCRIPT_TYPE)
+        script_sizes = np.append(get_script_size_array(), DEFAULT_SCRIPT_SIZE)
+        counted = (self.tx_month != UNSET_MONTH) & ~self.tx_is_coinbase & (self.tx_inputs > 0) & (self.tx_outputs > 0)
+        tx_sizes = 40 * self.tx_inputs[counted] + 9 * self.tx_outputs[counted] + script_sizes[self.tx_first_script_type[counted]]
+        congestion = np.bincount(self.tx_month[counted], weights=tx_sizes, minlength=len(self.month_fees))
+
+        months = slice(self.first_month, self.last_month + 1)
+        return build_month_data(range(self.first_month, self.last_month + 1), self.month_fees[months], congestion[months], self.month_script_types[months])
+
+    def get_coinbase_rewards(self):
+        """Return coinbase rewards and blocks for every month
+        @no params
+        @return dataframe with month, blocks and coinbase_rewards columns
+        """
+        month_ids = np.flatnonzero(self.month_coinbase_blocks)
+        return pd.DataFrame({
+            'month': month_id_to_label(month_ids),
+            'blocks': self.month_coinbase_blocks[month_ids],
+            'coinbase_rewards': self.month_coinbase_rewards[month_ids],
+        })
+
+    def get_coinbase_outputs(self):
+        """Return coinbase transactions merged with their (first) output,
+        equal to the merge of coinbase transactions and outputs done on the whole dataframes
+        @no params
+        @return dataframe with timestamp, blockId, txId, isCoinbase, addressId, amount columns
+        """
+        if not self.coinbase_tx_chunks or not self.coinbase_output_chunks:
+            return pd.DataFrame(columns=['timestamp', 'blockId', 'txId', 'isCoinbase', 'addressId', 'amount'])
+        coinbaseTX = pd.concat(self.coinbase_tx_chunks, ignore_index=True)
+        coinbaseOutputs = pd.concat(self.coinbase_output_chunks, ignore_index=True)
+        return pd.merge(coinbaseTX, coinbaseOutputs, on='txId')
+
+
+def streamMonthlyAnalysis(transactionChunks, inputChunks, outputChunks, topMiners = None, topMinersPerPeriod = None):
+    """Calculate the monthly statistics consuming the csv chunks (out-of-core):
+    peak memory depends by the chunk size and the number of transactions, not by the number of rows.
+
+    @params : transactionChunks : iterator of transactions chunks
+    @params : inputChunks : iterator of inputs chunks
+    @params : outputChunks : iterator of outputs chunks
+    @params : [optional] topMiners : top-k sketch of the miners updated chunk by chunk (see StreamingMonthlyAggregator)
+    @params : [optional] topMinersPerPeriod : top-k sketches of the miners of every time bucket updated chunk by chunk
+    @return the aggregator with all the chunks consumed (see get_month_data, get_coinbase_rewards, get_coinbase_outputs)
+    """
+    aggregator = StreamingMonthlyAggregator(topMiners, topMinersPerPeriod)
+    with instrumentation.span('streaming analysis'):
+        for name, chunks, consume in (('transactions', transactionChunks, aggregator.add_transactions),
+                                      ('inputs', inputChunks, aggregator.add_inputs),
+                                      ('outputs', outputChunks, aggregator.add_outputs)):
+            rows = 0
+            with instrumentation.span(f"stream {name} chunks", logLevels=()) as span:
+                for chunk in chunks:
+                    consume(chunk)
+                    rows += len(chunk)
+                    instrumentation.count('chunks streamed')
+                span.set(rows=rows)
+            instrumentation.count('rows read', rows)
+            log(('processing', 'all infos', 'debug'), "streamed {} {} rows", rows, name)
+    return aggregator
@@ -0,0 +1,163 @@
+import os
+import json
+import numpy as np
+import instrumentation
+from instrumentation import log
+
+# Offline taint analysis on the inputs csv (txId, prevTxId, prevTxpos), without scraping:
+# every input spends the output prevTxpos of the transaction prevTxId, so the inputs sorted by
+# (prevTxId, prevTxpos) are a spent-by index output -> spending txId. The outputs spent of
+# all the transactions of a step are ranges of the sorted keys (two searchsorted), so the
+# k-step forward traversal is a few array operations for every step (no loop over the nodes).
+# The nodes have the txId / inputs / outputs structure of scraper.getTxAsNode (with txIds).
+
+SPENT_BY_META_FILE_NAME = "meta.json"
+POSITION_BITS = 32 # key of an output = prevTxId << POSITION_BITS | prevTxpos
+
+
+class SpentByIndex:
+    """Sorted arrays output (prevTxId, prevTxpos) -> spending txId"""
+
+    def __init__(self, keys, spendingTxIds):
+        """
+        @param keys : numpy array (int64) of the sorted keys of the spent outputs (prevTxId << POSITION_BITS | prevTxpos)
+        @param spendingTxIds : numpy array (int64) of the txId spending every output of keys
+        """
+        self.keys = keys
+        self.spendingTxIds = spendingTxIds
+
+    @classmethod
+    def from_inputs(cls, input_links):
+        """Build the index by the inputs dataframe
+        @param input_links : inputs dataframe with txId, prevTxId and prevTxpos columns
+        @return SpentByIndex
+        """
+        keys = (input_links['prevTxId'].to_numpy().astype('int64') << POSITION_BITS) | input_links['prevTxpos'].to_numpy().astype('int64')
+        order = np.argsort(keys, kind='stable')
+        return cls(keys[order], input_links['txId'].to_numpy().astype('int64')[order])
+
+    def __len__(self):
+        return len(self.keys)
+
+    def spender_of(self, txId, position):
+        """Transaction that spends an output
+        @param txId : txId of the output
+        @param position : position of the output in its transaction
+        @return spending txId or None if the output is unspent
+        """
+        key = (int(txId) << POSITION_BITS) | int(position)
+        row = np.searchsorted(self.keys, key)
+        if row < len(self.keys) and self.keys[row] == key:
+            return int(self.spendingTxIds[row])
+        return None
+
+    def spenders_of(self, txIds):
+        """Vectorized spending transactions of all the outputs of transactions
+        @param txIds : array of txIds
+        @return counts (spent outputs of every txId), spending txIds (grouped by txId in the order of txIds, by output position)
+        """
+        txIds = np.asarray(txIds, dtype='int64')
+        starts = np.searchsorted(self.keys, txIds << POSITION_BITS)
+        counts = np.searchsorted(self.keys, (txIds + 1) << POSITION_BITS) - starts
+        # posizione di ogni output speso = inizio del suo range + indice nel range
+        slice_starts = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        return counts, self.spendingTxIds[slice_starts + np.arange(int(counts.sum()))]
+
+    def save(self, indexDir, signature):
+        """Persist the index (.npy files) with the signature of its source
+        @param indexDir : directory of the index
+        @param signature : signature of the source (json serializable)
+        @no return
+        """
+        os.makedirs(indexDir, exist_ok=True)
+        meta_path = os.path.join(indexDir, SPENT_BY_META_FILE_NAME)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        np.save(os.path.join(indexDir, "keys.npy"), self.keys)
+        np.save(os.path.join(indexDir, "spendingTxIds.npy"), self.spendingTxIds)
+        with open(meta_path, "w") as meta_file:
+            json.dump({'signature': signature, 'rows': len(self.keys)}, meta_file)
+
+    @classmethod
+    def load(cls, indexDir, signature):
+        """Load a persisted index (memory-mapped) if it was built by the same source
+        @param indexDir : directory of the index
+        @param signature : current signature of the source
+        @return SpentByIndex or None if missing / stale
+        """
+        meta_path = os.path.join(indexDir, SPENT_BY_META_FILE_NAME)
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, "r") as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+        if meta.get('signature') != signature:
+            return None
+
+        with instrumentation.span('load spent-by index', rows=meta['rows']):
+            return cls(np.load(os.path.join(indexDir, "keys.npy"), mmap_mode='r'), np.load(os.path.join(indexDir, "spendingTxIds.npy"), mmap_mode='r'))
+
+
+def forward_taint(spentByIndex, rootTxId, steps, maxNodes = None):
+    """k-step forward taint traversal (breadth first) by a transaction: the transactions of a step
+    are the not visited transactions spending the outputs of the previous step
+    (most referenced first when the budget cuts a step)
+    @param spentByIndex : SpentByIndex of the inputs
+    @param rootTxId : txId of the first transaction (step 0)
+    @param steps : number of steps
+    @param [optional] maxNodes : max transactions visited (None = no budget)
+    @return visited txIds (by step), spent outputs counts of every visited txId, spending txIds (grouped by visited txId)
+    """
+    visited, counts, spenders = [], [], []
+    frontier = np.array([rootTxId], dtype='int64')
+    seen = frontier
+    remaining = maxNodes
+    for step in range(steps):
+        if remaining is not None and len(frontier) > remaining:
+            instrumentation.count('taint nodes over budget', len(frontier) - remaining)
+            frontier = frontier[:remaining]
+        if len(frontier) == 0:
+            break
+        stepCounts, stepSpenders = spentByIndex.spenders_of(frontier)
+        visited.append(frontier)
+        counts.append(stepCounts)
+        spenders.append(stepSpenders)
+        if remaining is not None:
+            remaining -= len(frontier)
+
+        candidates, references = np.unique(stepSpenders, return_counts=True)
+        new = ~np.isin(candidates, seen, assume_unique=True)
+        candidates, references = candidates[new], references[new]
+        frontier = candidates[np.lexsort((candidates, -references))]
+        seen = np.union1d(seen, candidates)
+        log(('debug', 'all infos', 'processing'), "-> found {} nodes at step {}/{}", len(visited[-1]), step, steps, spam=True)
+
+    if not visited:
+        empty = np.zeros(0, dtype='int64')
+        return empty, empty, empty
+    return np.concatenate(visited), np.concatenate(counts), np.concatenate(spenders)
+
+def get_taint_nodes(input_links, inputsTxIndex, spentByIndex, rootTxId, steps, maxNodes = None):
+    """Taint analysis graph by a transaction, as the list of nodes of scraper.getEligius_taint_analysis
+    @param input_links : inputs dataframe with txId, prevTxId and prevTxpos columns
+    @param inputsTxIndex : CSR index txId -> rows of input_links (see tx_index)
+    @param spentByIndex : SpentByIndex of input_links
+    @param rootTxId : txId of the first transaction
+    @param steps : number of steps
+    @param [optional] maxNodes : max transactions visited (None = no budget)
+    @return list of dictionaries with txId, inputs (spent txIds) and outputs (spending txIds) keys
+    """
+    with instrumentation.span('offline taint traversal', rootTxId=int(rootTxId), steps=steps) as span:
+        txIds, counts, spenders = forward_taint(spentByIndex, rootTxId, steps, maxNodes)
+        prevTxIds = input_links['prevTxId'].to_numpy()
+        outputs = np.split(spenders, np.cumsum(counts)[:-1]) if len(txIds) else []
+        nodes = [{
+            'txId': txId,
+            'inputs': prevTxIds[inputsTxIndex.rows_of(txId)].tolist(),
+            'outputs': nodeOutputs.tolist(),
+        } for txId, nodeOutputs in zip(txIds.tolist(), outputs)]
+        span.set(nodes=len(nodes), edges=len(spenders))
+    instrumentation.count('taint nodes', len(nodes))
+    return nodes
@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+from dataset_analysis import analizer
+
+pd.set_option("mode.copy_on_write", True)
+
+# Top-k ranking of the miners (addresses by number of coinbase outputs):
+# •exact : counts by bincount / unique and partial selection of the k largest (argpartition),
+#  no sort of all the miners
+# •sketch : mergeable Misra-Gries summary with a fixed number of counters, updated chunk by chunk
+#  (streaming); every reported count is a lower bound and count + error an upper bound of the
+#  real one, with error <= rows / (capacity + 1)
+
+TOP_K_COLUMNS = ['addressId', 'blocks_mined']
+
+
+def _select_top_k(items, counts, k):
+    """Select the k items with the largest counts (ties -> smallest item first)
+    @param items : numpy array of items
+    @param counts : numpy array of counts aligned to items
+    @param k : number of items to select
+    @return positions of the selected items, sorted by count (descending)
+    """
+    if k <= 0 or len(items) == 0:
+        return np.zeros(0, dtype='int64')
+    if k < len(items):
+        # only the items with a count >= the k-th largest one are sorted
+        kth_count = counts[np.argpartition(-counts, k - 1)[k - 1]]
+        candidates = np.flatnonzero(counts >= kth_count)
+    else:
+        candidates = np.arange(len(items))
+    order = np.lexsort((items[candidates], -counts[candidates]))
+    return candidates[order[:k]]
+
+def top_k_exact(addressIds, k):
+    """Exact top-k miners by number of rows (coinbase outputs)
+    @param addressIds : array / Series of addressIds (one for every coinbase output)
+    @param k : number of miners
+    @return dataframe with addressId and blocks_mined columns, sorted by blocks_mined (descending)
+    """
+    items, counts = np.unique(np.asarray(addressIds), return_counts=True)
+    selected = _select_top_k(items, counts, k)
+    return pd.DataFrame({'addressId': items[selected], 'blocks_mined': counts[selected]})
+
+def top_k_exact_per_period(df, k, bucket = 'year'):
+    """Exact top-k miners of every time bucket
+    @param df : dataframe of coinbase outputs (with Unix timestamp and addressId columns)
+    @param k : number of miners for every bucket
+    @param [optional] bucket : time bucket (see analizer.get_bucket_codes), default = 'year'
+    @return dataframe with bucket, rank, addressId and blocks_mined columns
+    """
+    codes, label_function, bucket_column = analizer.get_bucket_codes(df, bucket)
+    codes = np.asarray(codes, dtype='int64')
+    addressIds = np.asarray(df['addressId'], dtype='int64')
+    pairs, counts = np.unique(np.stack((codes, addressIds), axis=1), axis=0, return_counts=True)
+
+    # le coppie sono ordinate per bucket : ogni bucket è un intervallo contiguo
+    starts = np.flatnonzero(np.concatenate(([True], pairs[1:, 0] != pairs[:-1, 0]))) if len(pairs) > 0 else np.zeros(0, dtype='int64')
+    ends = np.append(starts[1:], len(pairs))
+    selected = [start + _select_top_k(pairs[start:end, 1], counts[start:end], k) for start, end in zip(starts, ends)]
+    selected = np.concatenate(selected) if selected else np.zeros(0, dtype='int64')
+    ranks = np.concatenate([np.arange(1, min(k, end - start) + 1) for start, end in zip(starts, ends)]) if len(starts) > 0 else np.zeros(0, dtype='int64')
+
+    return pd.DataFrame({
+        bucket_column: label_function(pairs[selected, 0]),
+        'rank': ranks,
+        'addressId': pairs[selected, 1],
+        'blocks_mined': counts[selected]
+    })
+
+
+class MisraGriesSketch:
+    """Mergeable Misra-Gries summary (heavy hitters) with at most capacity counters"""
+
+    def __init__(self, capacity):
+        """
+        @param capacity : maximum number of monitored items (>= k of the requested top-k)
+        """
+        if capacity <= 0:
+            raise ValueError(f"sketch capacity must be positive, got {capacity}")
+        self.capacity = capacity
+        self.items = np.zeros(0, dtype='int64')
+        self.counts = np.zeros(0, dtype='int64')
+        self.error = 0 # sum of the decrements : real count <= count + error
+        self.rows = 0
+
+    def update(self, addressIds):
+        """Add a chunk of rows to the summary (vectorized merge of the exact counts of the chunk)
+        @param addressIds : array / Series of addressIds of the chunk
+        @no return
+        """
+        chunk_items, chunk_counts = np.unique(np.asarray(addressIds, dtype='int64'), return_counts=True)
+        self.rows += int(chunk_counts.sum())
+        items = np.concatenate((self.items, chunk_items))
+        counts = np.concatenate((self.counts, chunk_counts))
+        items, inverse = np.unique(items, return_inverse=True)
+        counts = np.bincount(inverse, weights=counts, minlength=len(items)).astype('int64')
+
+        if len(items) > self.capacity:
+            # decrement all the counters by the (capacity+1)-th largest count and drop the ones <= 0
+            decrement = counts[np.argpartition(-counts, self.capacity)[self.capacity]]
+            counts = counts - decrement
+            kept = counts > 0
+            items, counts = items[kept], counts[kept]
+            self.error += int(decrement)
+        self.items, self.counts = items, counts
+
+    def top_k(self, k, candidates = None):
+        """Top-k miners of the summary
+        @param k : number of miners (<= capacity)
+        @param [optional] candidates : addressIds that can be ranked (ex. the miners not associated to the pools), None = all
+        @return dataframe with addressId, blocks_mined (lower bound) and max_error (blocks_mined + max_error = upper bound) columns
+        """
+        items, counts = self.items, self.counts
+        if candidates is not None:
+            ranked = np.isin(items, np.asarray(candidates, dtype='int64'))
+            items, counts = items[ranked], counts[ranked]
+        selected = _select_top_k(items, counts, k)
+        return pd.DataFrame({
+            'addressId': items[selected],
+            'blocks_mined': counts[selected],
+            'max_error': np.full(len(selected), self.error, dtype='int64')
+        })
+
+
+class PeriodTopK:
+    """Streaming top-k miners of every time bucket (a sketch for every bucket)"""
+
+    def __init__(self, k, capacity, bucket = 'year'):
+        """
+        @param k : number of miners for every bucket
+        @param capacity : counters of the sketch of every bucket
+        @param [optional] bucket : time bucket (see analizer.get_bucket_codes), default = 'year'
+        """
+        self.k = k
+        self.capacity = capacity
+        self.bucket = bucket
+        self.sketches = {}
+        self.label_function = None
+        self.bucket_column = bucket if isinstance(bucket, str) else analizer.BLOCKS_BUCKET_COLUMN
+
+    def update(self, chunk):
+        """Add a chunk of coinbase outputs
+        @param chunk : dataframe chunk (with Unix timestamp, blockId and addressId columns)
+        @no return
+        """
+        codes, self.label_function, self.bucket_column = analizer.get_bucket_codes(chunk, self.bucket)
+        codes = np.asarray(codes, dtype='int64')
+        addressIds = np.asarray(chunk['addressId'], dtype='int64')
+        order = np.argsort(codes, kind='stable')
+        codes, addressIds = codes[order], addressIds[order]
+        starts = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1]))) if len(codes) > 0 else []
+        for start, end in zip(starts, np.append(starts[1:], len(codes))):
+            code = int(codes[start])
+            if code not in self.sketches:
+                self.sketches[code] = MisraGriesSketch(self.capacity)
+            self.sketches[code].update(addressIds[start:end])
+
+    def top_k(self, candidates = None):
+        """Top-k miners of every bucket seen so far
+        @param [optional] candidates : addressIds that can be ranked (ex. the miners not associated to the pools), None = all
+        @return dataframe with bucket, rank, addressId, blocks_mined and max_error columns
+        """
+        results = []
+        for code in sorted(self.sketches):
+            top = self.sketches[code].top_k(self.k, candidates)
+            top.insert(0, 'rank', np.arange(1, len(top) + 1))
+            top.insert(0, self.bucket_column, [self.label_function([code])[0]] * len(top))
+            results.append(top)
+        if not results:
+            return pd.DataFrame(columns=[self.bucket_column, 'rank'] + TOP_K_COLUMNS + ['max_error'])
+        return pd.concat(results, ignore_index=True)
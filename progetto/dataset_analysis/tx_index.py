@@ -0,0 +1,134 @@
+import os
+import json
+import numpy as np
+import instrumentation
+
+# CSR (compressed sparse row) index txId -> rows of a dataframe (inputs / outputs):
+# the row positions are sorted by txId once and offsets[txId] : offsets[txId+1] is the
+# slice of the rows of a transaction, so "all outputs of tx X" is a slice and
+# "all inputs of the txs in S" is a gather of |S| slices, without masks or merges
+# over the whole dataframe.
+
+MISSING_ROW = -1
+TX_INDEX_META_FILE_NAME = "meta.json"
+
+
+class TxRowsIndex:
+    """Offsets (one for every txId) and row positions sorted by txId"""
+
+    def __init__(self, offsets, rows):
+        """
+        @param offsets : numpy array (int64) of len max txId + 2, rows of txId t are rows[offsets[t]:offsets[t+1]]
+        @param rows : numpy array (int64) of row positions sorted (stable) by txId
+        """
+        self.offsets = offsets
+        self.rows = rows
+
+    @classmethod
+    def from_txIds(cls, txIds):
+        """Build the index by the txId column of a dataframe
+        @param txIds : array / Series of txIds (row i of the dataframe -> txIds[i])
+        @return TxRowsIndex
+        """
+        txIds = np.asarray(txIds)
+        if len(txIds) == 0:
+            return cls(np.zeros(1, dtype='int64'), np.zeros(0, dtype='int64'))
+        if np.all(txIds[1:] >= txIds[:-1]):
+            rows = np.arange(len(txIds), dtype='int64') # already sorted (as in the dataset)
+        else:
+            rows = np.argsort(txIds, kind='stable').astype('int64')
+        offsets = np.zeros(int(txIds.max()) + 2, dtype='int64')
+        np.cumsum(np.bincount(txIds), out=offsets[1:])
+        return cls(offsets, rows)
+
+    @property
+    def tx_quantity(self):
+        """Number of txIds covered by the index (max txId + 1)"""
+        return len(self.offsets) - 1
+
+    def _clip(self, txIds):
+        """txIds as int64 array and mask of the txIds covered by the index"""
+        txIds = np.asarray(txIds, dtype='int64')
+        return txIds, (txIds >= 0) & (txIds < self.tx_quantity)
+
+    def rows_of(self, txId):
+        """Rows of a single transaction
+        @param txId : txId
+        @return numpy array of row positions (empty if the transaction has no rows)
+        """
+        if txId < 0 or txId >= self.tx_quantity:
+            return self.rows[:0]
+        return self.rows[self.offsets[txId]:self.offsets[txId + 1]]
+
+    def counts(self, txIds):
+        """Vectorized number of rows of transactions
+        @param txIds : array of txIds
+        @return numpy array (int64) of row counts
+        """
+        txIds, covered = self._clip(txIds)
+        counts = np.zeros(len(txIds), dtype='int64')
+        counts[covered] = self.offsets[txIds[covered] + 1] - self.offsets[txIds[covered]]
+        return counts
+
+    def rows_of_many(self, txIds):
+        """Rows of a set of transactions (concatenated slices, in the order of txIds)
+        @param txIds : array of txIds
+        @return numpy array of row positions
+        """
+        txIds, covered = self._clip(txIds)
+        txIds = txIds[covered]
+        starts = self.offsets[txIds]
+        lengths = self.offsets[txIds + 1] - starts
+        # position of every selected row = start of its slice + index inside the slice
+        slice_starts = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return self.rows[slice_starts + np.arange(int(lengths.sum()))]
+
+    def first_rows(self, txIds):
+        """First row (in the dataframe order) of every transaction
+        @param txIds : array of txIds
+        @return numpy array (int64) of row positions (MISSING_ROW for transactions without rows)
+        """
+        txIds, covered = self._clip(txIds)
+        first = np.full(len(txIds), MISSING_ROW, dtype='int64')
+        covered_txIds = txIds[covered]
+        has_rows = self.offsets[covered_txIds + 1] > self.offsets[covered_txIds]
+        positions = np.flatnonzero(covered)[has_rows]
+        first[positions] = self.rows[self.offsets[covered_txIds[has_rows]]]
+        return first
+
+    def save(self, indexDir, signature):
+        """Persist the index (.npy files) with the signature of its source
+        @param indexDir : directory of the index
+        @param signature : signature of the source (json serializable)
+        @no return
+        """
+        os.makedirs(indexDir, exist_ok=True)
+        meta_path = os.path.join(indexDir, TX_INDEX_META_FILE_NAME)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        np.save(os.path.join(indexDir, "offsets.npy"), self.offsets)
+        np.save(os.path.join(indexDir, "rows.npy"), self.rows)
+        with open(meta_path, "w") as meta_file:
+            json.dump({'signature': signature, 'rows': len(self.rows)}, meta_file)
+
+    @classmethod
+    def load(cls, indexDir, signature):
+        """Load a persisted index (memory-mapped) if it was built by the same source
+        @param indexDir : directory of the index
+        @param signature : current signature of the source
+        @return TxRowsIndex or None if missing / stale
+        """
+        meta_path = os.path.join(indexDir, TX_INDEX_META_FILE_NAME)
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, "r") as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+        if meta.get('signature') != signature:
+            return None
+
+        with instrumentation.span('load tx index', rows=meta['rows']):
+            index = cls(np.load(os.path.join(indexDir, "offsets.npy"), mmap_mode='r'), np.load(os.path.join(indexDir, "rows.npy"), mmap_mode='r'))
+        return index
@@ -100,13 +100,22 @@ def plot_annual_script_type_usage(df):
     plt.tight_layout()
     plt.show()
 
-def plot_blocks_mined_by_top_4_miners(blocks_mined_by_T4miners):
+def plot_blocks_mined_by_top_miners(top_miners):
     plt.figure(figsize=(10, 6))
-    sns.barplot(x='addressId', y='blocks_mined', data=blocks_mined_by_T4miners)
-    plt.title('Total Blocks Mined by the top 4 miners')
+    sns.barplot(x='addressId', y='blocks_mined', data=top_miners, order=top_miners['addressId'])
+    plt.title(f'Total Blocks Mined by the top {len(top_miners)} miners')
     plt.xlabel('Miner')
     plt.ylabel('Total Blocks Mined')
     plt.show()
+
+def plot_top_miners_per_year(top_miners_per_year):
+    plt.figure(figsize=(14, 8))
+    sns.barplot(x='year', y='blocks_mined', hue='rank', data=top_miners_per_year)
+    plt.title('Blocks Mined by the top miners of every year')
+    plt.xlabel('Year')
+    plt.ylabel('Blocks Mined')
+    plt.legend(title='Rank')
+    plt.show()
     
 def plot_total_blocks_mined(global_blocks_mined):
     plt.figure(figsize=(10, 6))
@@ -0,0 +1,276 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+import functools
+import tracemalloc
+from utilities import LOG_LEVELS, SETTINGS
+try:
+    import resource
+except ImportError: # Windows : the peak RSS is not available
+    resource = None
+
+# Instrumentation of the pipeline:
+# •spans : timed sections (context manager span / decorator traced), nested by thread
+# •counters : totals incremented by the code (rows read, requests made, retries, pages fetched, ...)
+# •gauges : maximum values (peak RSS, peak memory traced by tracemalloc)
+# Every closed span is written as a json line in the trace file (one file for every run, in TRACE_DIR),
+# counters, gauges and the summary of the spans are written when the trace is closed.
+# log() formats the message only if one of its log levels is enabled, so disabled levels
+# cost a dictionary lookup also in the hot loops.
+
+TRACE_ENABLED = SETTINGS['TRACE_ENABLED']
+TRACE_DIR = os.path.join(os.path.dirname(__file__), SETTINGS['TRACE_DIR'])
+TRACE_MEMORY = SETTINGS['TRACE_MEMORY']
+LOG_PREVIEW_ROWS = 10 # rows of dataframes printed by log (head and tail)
+
+
+def enabled(levels, spam = False):
+    """Check if at least one of the log levels is enabled
+    @param levels : log level name or tuple of names (see utilities.LOG_LEVELS)
+    @param [optional] spam : if True the message is also disabled by the 'reduce spam' level
+    @return boolean
+    """
+    if spam and LOG_LEVELS['reduce spam']:
+        return False
+    if isinstance(levels, str):
+        return LOG_LEVELS.get(levels, False)
+    return any(LOG_LEVELS.get(level, False) for level in levels)
+
+def _render(value):
+    """Render a log argument (dataframes and series are truncated to a preview)"""
+    if hasattr(value, 'to_string') and hasattr(value, '__len__') and len(value) > 2 * LOG_PREVIEW_ROWS:
+        return f"{value.to_string(max_rows=2 * LOG_PREVIEW_ROWS)}\n[{len(value)} rows]"
+    return value
+
+def log(levels, message, *args, spam = False):
+    """Print a message if one of the log levels is enabled.
+    The message is formatted (str.format with args) only when it is printed.
+    @param levels : log level name or tuple of names
+    @param message : message (with {} placeholders if args are given)
+    @param args : values of the placeholders (dataframes are printed as a preview)
+    @param [optional] spam : if True the message is also disabled by the 'reduce spam' level
+    @no return
+    """
+    if not enabled(levels, spam):
+        return
+    print(message.format(*[_render(arg) for arg in args]) if args else message)
+
+def get_peak_rss_mb():
+    """Peak resident set size of the process (MB), None if not available"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024**2 if sys.platform == 'darwin' else peak / 1024
+
+
+class Span:
+    """Timed section of a Tracer (see Tracer.span)"""
+
+    def __init__(self, tracer, name, attributes, logLevels):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.logLevels = logLevels
+        self.seconds = None
+
+    def set(self, **attributes):
+        """Add attributes to the span (written in the trace)
+        @no return
+        """
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.parent = self.tracer._push(self.name)
+        self.startTime = time.time()
+        self.startT = time.perf_counter()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.seconds = time.perf_counter() - self.startT
+        self.tracer._pop()
+        self.tracer._close_span(self, 'ok' if excType is None else 'error')
+        if self.logLevels and enabled(self.logLevels):
+            print(f"\n{self.name} ended in {self.seconds} seconds")
+        return False
+
+
+class Tracer:
+    """Collector of spans, counters and gauges, with a json lines trace file"""
+
+    def __init__(self, traceDir = TRACE_DIR, isEnabled = TRACE_ENABLED, traceMemory = TRACE_MEMORY):
+        """
+        @param [optional] traceDir : directory of the trace files (None = no trace file)
+        @param [optional] isEnabled : if False spans, counters and gauges are not recorded
+        @param [optional] traceMemory : if True python allocations are traced by tracemalloc (slower)
+        """
+        self.traceDir = traceDir
+        self.enabled = isEnabled
+        self.tracePath = None
+        self.traceFile = None
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.spans = {} # name -> [count, total seconds, max seconds, errors]
+        self.counters = {}
+        self.gauges = {}
+        if isEnabled and traceMemory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def span(self, name, logLevels = ('time',), **attributes):
+        """Timed section (context manager): with tracer.span('read inputs csv') as span: ...
+        @param name : name of the span
+        @param [optional] logLevels : log levels that print the duration at the end (() = never printed)
+        @param attributes : attributes of the span (written in the trace)
+        @return Span
+        """
+        return Span(self, name, attributes, logLevels)
+
+    def count(self, name, value = 1):
+        """Increment a counter
+        @param name : name of the counter
+        @param [optional] value : increment, default = 1
+        @no return
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        """Record a value of a gauge (the maximum value is kept)
+        @param name : name of the gauge
+        @param value : current value
+        @no return
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            self.gauges[name] = max(self.gauges.get(name, value), value)
+
+    def update_memory_gauges(self):
+        """Record the memory gauges (peak RSS and, if traced, peak python allocations)
+        @no params
+        @no return
+        """
+        peak_rss_mb = get_peak_rss_mb()
+        if peak_rss_mb is not None:
+            self.gauge('peak rss mb', peak_rss_mb)
+        if tracemalloc.is_tracing():
+            self.gauge('tracemalloc peak mb', tracemalloc.get_traced_memory()[1] / 1024**2)
+
+    def _push(self, name):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        parent = stack[-1] if stack else None
+        stack.append(name)
+        return parent
+
+    def _pop(self):
+        self.local.stack.pop()
+
+    def _close_span(self, span, status):
+        if not self.enabled:
+            return
+        self.update_memory_gauges()
+        with self.lock:
+            stats = self.spans.setdefault(span.name, [0, 0.0, 0.0, 0])
+            stats[0] += 1
+            stats[1] += span.seconds
+            stats[2] = max(stats[2], span.seconds)
+            stats[3] += status != 'ok'
+        self._write({
+            'type': 'span',
+            'name': span.name,
+            'parent': span.parent,
+            'thread': threading.current_thread().name,
+            'start': span.startTime,
+            'seconds': span.seconds,
+            'status': status,
+            'peak_rss_mb': self.gauges.get('peak rss mb'),
+            **span.attributes,
+        })
+
+    def _write(self, event):
+        if self.traceDir is None:
+            return
+        line = json.dumps(event, default=str)
+        with self.lock:
+            if self.traceFile is None:
+                os.makedirs(self.traceDir, exist_ok=True)
+                self.tracePath = os.path.join(self.traceDir, f"trace-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl")
+                self.traceFile = open(self.tracePath, "a")
+            self.traceFile.write(line + "\n")
+
+    def summary(self):
+        """Summary of the spans (count, total / max seconds, errors), counters and gauges
+        @no params
+        @return dictionary with spans, counters and gauges
+        """
+        with self.lock:
+            spans = {name: {'count': stats[0], 'total_seconds': stats[1], 'max_seconds': stats[2], 'errors': stats[3]}
+                     for name, stats in self.spans.items()}
+            return {'spans': spans, 'counters': dict(self.counters), 'gauges': dict(self.gauges)}
+
+    def summary_table(self):
+        """Summary as a text table (spans sorted by total seconds)
+        @no params
+        @return string
+        """
+        summary = self.summary()
+        lines = [f"{'span':<40}{'count':>8}{'total s':>12}{'max s':>12}{'errors':>8}"]
+        for name, stats in sorted(summary['spans'].items(), key=lambda item: -item[1]['total_seconds']):
+            lines.append(f"{name[:39]:<40}{stats['count']:>8}{stats['total_seconds']:>12.3f}{stats['max_seconds']:>12.3f}{stats['errors']:>8}")
+        for kind in ('counters', 'gauges'):
+            if summary[kind]:
+                lines.append("")
+                lines += [f"{name[:39]:<40}{value:>20.1f}" if isinstance(value, float) else f"{name[:39]:<40}{value:>20}"
+                          for name, value in sorted(summary[kind].items())]
+        return "\n".join(lines)
+
+    def close(self):
+        """Write counters, gauges and summary of the spans in the trace file and close it
+        @no params
+        @no return
+        """
+        if not self.enabled or (self.traceFile is None and not self.counters):
+            return
+        self.update_memory_gauges()
+        self._write({'type': 'summary', **self.summary()})
+        with self.lock:
+            if self.traceFile is not None:
+                self.traceFile.close()
+                self.traceFile = None
+
+
+TRACER = Tracer()
+atexit.register(TRACER.close)
+
+def span(name, logLevels = ('time',), **attributes):
+    """Timed section of the global tracer (see Tracer.span)"""
+    return TRACER.span(name, logLevels, **attributes)
+
+def traced(name = None, logLevels = ('time',)):
+    """Decorator: every call of the function is a span of the global tracer
+    @param [optional] name : name of the span (default = function name)
+    @param [optional] logLevels : log levels that print the duration at the end
+    @return decorator
+    """
+    def decorator(function):
+        spanName = name or function.__name__
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with TRACER.span(spanName, logLevels):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def count(name, value = 1):
+    """Increment a counter of the global tracer (see Tracer.count)"""
+    TRACER.count(name, value)
+
+def gauge(name, value):
+    """Record a gauge value of the global tracer (see Tracer.gauge)"""
+    TRACER.gauge(name, value)
@@ -1,13 +1,25 @@
+import numpy as np
 import pandas as pd
-from concurrent.futures import ThreadPoolExecutor
 import os
 import time
 from graphic import plot_creator
-from utilities import calculate_chunk_size
-from utilities import unix_to_date
 from dataset_analysis import analizer
+from dataset_analysis import columnar_cache
+from dataset_analysis import parallel_reader
+from dataset_analysis import streaming_analizer
+from dataset_analysis import chunk_planner
+from dataset_analysis import hash_index
+from dataset_analysis import incremental
+from dataset_analysis import metrics_cube
+from dataset_analysis import tx_index
+from dataset_analysis import pool_attribution
+from dataset_analysis import top_k
+from dataset_analysis import taint_graph
 from scraping import scraper
 from utilities import LOG_LEVELS, SETTINGS
+from stage_scheduler import Stage, StageScheduler
+import instrumentation
+from instrumentation import log
 
 pd.set_option("mode.copy_on_write", True)
 
@@ -15,6 +27,7 @@ pd.set_option("mode.copy_on_write", True)
 CURRENT_PATH = os.path.dirname(__file__)
 DATASET_ANALYSIS_PATH = os.path.join(CURRENT_PATH, "dataset_analysis")
 DATASET_PATH = os.path.join(DATASET_ANALYSIS_PATH, "datasetCSV")
+DATASET_CACHE_PATH = os.path.join(DATASET_ANALYSIS_PATH, "datasetCache")
 
 INPUTS_CSV_PATH = os.path.join(DATASET_PATH, "inputs.csv")
 MAP_CSV_PATH = os.path.join(DATASET_PATH, "map.csv")
@@ -23,6 +36,23 @@ TRANSACTIONS_CSV_PATH = os.path.join(DATASET_PATH, "transactions.csv")
 
 MAX_THREAD_QUANTITY = SETTINGS['MAX_THREAD_QUANTITY']
 CHUNK_SIZE = 10000
+USE_COLUMNAR_CACHE = SETTINGS['USE_COLUMNAR_CACHE']
+PARALLEL_CSV_PARSING = SETTINGS['PARALLEL_CSV_PARSING']
+STREAMING_MODE = SETTINGS['STREAMING_MODE']
+INCREMENTAL_INGESTION = SETTINGS['INCREMENTAL_INGESTION']
+TOP_MINERS_QUANTITY = SETTINGS['TOP_MINERS_QUANTITY']
+TOP_MINERS_MODE = SETTINGS['TOP_MINERS_MODE']
+TOP_MINERS_SKETCH_CAPACITY = SETTINGS['TOP_MINERS_SKETCH_CAPACITY']
+TAINT_ANALYSIS_BACKEND = SETTINGS['TAINT_ANALYSIS_BACKEND']
+TAINT_ROOT_TX_ID = SETTINGS['TAINT_ROOT_TX_ID']
+
+# exclusive resource of the stages that parse csv files: every file is parsed using all the cores
+# (see parallel_reader), so the files are read one after the other to not oversubscribe the processes
+CSV_READER = 'csv reader'
+
+# rows of every csv file already processed in the previous run ('previousRows') and rows read now ('rows')
+INGESTION_WATERMARKS = {}
+RESULTS_STORE = incremental.IncrementalResultsStore(os.path.join(DATASET_CACHE_PATH, "results"))
 
 
 inputs_columns = ["txId", "prevTxId", "prevTxpos"]
@@ -46,275 +76,770 @@ def read_csv_chunk(schema, columns, usecols, filePath, chunkSize = CHUNK_SIZE, p
     """
     chuncks = pd.read_csv(filePath, usecols=usecols, dtype=schema, names=columns, parse_dates=parseDate, chunksize= chunkSize)           
     return chuncks
+
+def read_csv_columns(schema, columns, usecols, filePath, chunkSize = None):
+    """Read a CSV as a single dataframe using the typed columnar cache:
+    the CSV is parsed (in parallel byte ranges or by chunks) only if its cache is missing or the file changed since the cache was written
+    @param schema : schema of data types (to reduce dimension)
+    @param columns : column'n names 
+    @param usecols : columns indexes of csv file
+    @param filePath : path of the CSV file
+    @param [optional] chunkSize : size of 1 chunk (default = None -> planned by the rows of the file, see chunk_planner)
+    @return dataframe with the typed columns of the CSV
+    """
+    if USE_COLUMNAR_CACHE:
+        df = columnar_cache.load_columns(DATASET_CACHE_PATH, filePath, schema, columns)
+        if df is not None:
+            INGESTION_WATERMARKS[filePath] = {'previousRows': len(df), 'rows': len(df)}
+            return df
+        
+        if INCREMENTAL_INGESTION:
+            df = read_appended_rows(schema, columns, usecols, filePath)
+            if df is not None:
+                return df
+    
+    if PARALLEL_CSV_PARSING:
+        df = parallel_reader.read_csv_parallel(schema,columns,usecols,filePath)
+    else:
+        if chunkSize is None:
+            chunkSize = chunk_planner.plan_chunks(filePath, schema, columns)['chunkSize']
+        chunks = read_csv_chunk(schema,columns,usecols,filePath,chunkSize)
+        df = pd.concat(chunks, ignore_index=True)
+    
+    if USE_COLUMNAR_CACHE:
+        columnar_cache.store_columns(DATASET_CACHE_PATH, filePath, schema, columns, df)
+    INGESTION_WATERMARKS[filePath] = {'previousRows': 0, 'rows': len(df)}
+    return df
+
+def read_appended_rows(schema, columns, usecols, filePath):
+    """Extend the columnar cache of a CSV with the rows appended after its watermark
+    (only the new bytes of the file are parsed and stored as a new segment of the cache)
+    @param schema : schema of data types (to reduce dimension)
+    @param columns : column'n names 
+    @param usecols : columns indexes of csv file
+    @param filePath : path of the CSV file
+    @return dataframe with cached and new rows, or None if the file was not only appended (-> full read)
+    """
+    watermark = columnar_cache.get_append_watermark(DATASET_CACHE_PATH, filePath, schema, columns)
+    if watermark is None:
+        return None
+    
+    with instrumentation.span(f"read appended rows of {os.path.basename(filePath)}", ('time', 'processing')) as span:
+        processes = parallel_reader.MAX_PROCESS_QUANTITY if PARALLEL_CSV_PARSING else 1
+        new_rows = parallel_reader.read_csv_parallel(schema, columns, usecols, filePath, processes, startByte=watermark['bytes'])
+        columnar_cache.append_columns(DATASET_CACHE_PATH, filePath, schema, columns, new_rows)
+        df = columnar_cache.load_columns(DATASET_CACHE_PATH, filePath, schema, columns)
+        if df is None or len(df) != watermark['rows'] + len(new_rows):
+            return None
+        INGESTION_WATERMARKS[filePath] = {'previousRows': watermark['rows'], 'rows': len(df)}
+        span.set(rows=len(new_rows))
+        instrumentation.count('rows appended', len(new_rows))
+    return df
+
+def getNewRowsMask(spec, df):
+    """Return the mask of the rows of a dataframe read after the previous watermark of its csv file
+    (all the rows if the file was read from the start)
+    @param spec : csv spec (ex. INPUTS_CSV_SPEC)
+    @param df : dataframe returned by a reader (index = row of the csv file)
+    @return boolean numpy array
+    """
+    watermark = INGESTION_WATERMARKS.get(spec['path'], {'previousRows': 0})
+    return df.index.to_numpy() >= watermark['previousRows']
    
-def readInputs():
-    """Read inputs csv by chunk 
-    (calculating the chunk size using the number of rows in csv file)
+# schema and columns of every csv file read by the readers :
+# the offline taint analysis needs the links of every input (prevTxId, prevTxpos), 
+# the other analyses only the txId : the link columns are read only when they are used
+OFFLINE_TAINT_ANALYSIS = TAINT_ANALYSIS_BACKEND == 'offline' and not STREAMING_MODE
+
+INPUTS_CSV_SPEC = {
+    'path': INPUTS_CSV_PATH,
+    'schema': {
+        "txId": "int32",
+        "prevTxId": "int32",
+        "prevTxpos": "int32",
+    },
+    'usecols': [0, 1, 2],
+    'columns': ["txId", "prevTxId", "prevTxpos"],
+} if OFFLINE_TAINT_ANALYSIS else {
+    'path': INPUTS_CSV_PATH,
+    'schema': {
+        "txId": "int32",
+    },
+    'usecols': [0],
+    'columns': ["txId"],
+}
+
+OUTPUTS_CSV_SPEC = {
+    'path': OUTPUTS_CSV_PATH,
+    'schema': {
+        "txId": "int32",
+        "scriptType": "int8",
+        "amount": "int64",
+        "addressId": "int32",
+    },
+    'usecols': [0,2,3,4],
+    'columns': ["txId", "addressId","amount", "scriptType"],
+}
+
+TRANSACTIONS_CSV_SPEC = {
+    'path': TRANSACTIONS_CSV_PATH,
+    'schema': {
+        "timestamp": "int32",
+        "blockId": "int32",
+        "txId": "int32",
+        "isCoinbase": "int8",
+        "fee": "int32",
+    },
+    'usecols': [0, 1, 2, 3, 4],
+    'columns': ["timestamp", 'blockId' ,"txId", "isCoinbase", "fee"],
+}
+
+MAP_CSV_SPEC = {
+    'path': MAP_CSV_PATH,
+    'schema': {
+        "txHash":'category',
+        "addressId": "int32"
+    },
+    'usecols': [0,1],
+    'columns': ["txHash","addressId"],
+}
+
+def getChunkSize_bySpec(spec):
+    """Return the chunk size for a csv file described by a spec, planned by the number 
+    of rows in csv file and the memory budget of a chunk (see chunk_planner)
+    @param spec : csv spec (ex. INPUTS_CSV_SPEC)
+    @return chunk size
+    """
+    plan = chunk_planner.plan_chunks(spec['path'], spec['schema'], spec['columns'])
+    return plan['chunkSize']
+
+def readCSV_bySpec(spec):
+    """Read a csv file described by a spec (schema, columns) as a single dataframe 
+    @param spec : csv spec (ex. INPUTS_CSV_SPEC)
+    @return dataframe
+    """
+    return read_csv_columns(spec['schema'], spec['columns'], spec['usecols'], spec['path'])
+
+def iterCSV_bySpec(spec):
+    """Iterate a csv file described by a spec (schema, columns) by chunks, 
+    without loading the whole file in memory
+    @param spec : csv spec (ex. INPUTS_CSV_SPEC)
+    @return chunks iterator
+    """
+    return read_csv_chunk(spec['schema'], spec['columns'], spec['usecols'], spec['path'], getChunkSize_bySpec(spec))
+
+def readInputLinks():
+    """Read inputs csv with the columns of INPUTS_CSV_SPEC (by the columnar cache, in parallel or by chunks):
+    with the offline taint analysis every row is an input of txId spending the output prevTxpos of prevTxId
     @no params
-    @return inputs dataframe
-    """
-    startT = time.time()
-    print('\nStarted reading inputs csv')
-    schema = {        
-        "txId": "int32",                 
-    }
-    usecols = [0]
-    rowsInFile = 21378771
-    _ , chunk_size = calculate_chunk_size(rowsInFile, 200000)
-    columns = ["txId"]
-    chunks = read_csv_chunk(schema,columns,usecols,INPUTS_CSV_PATH,chunk_size)
-    df = pd.concat(chunks)
-    df = df.drop_duplicates(subset=['txId'])
-    endT = time.time()
-    diff = endT - startT
-    if LOG_LEVELS['time']:
-        print(f"\nInputs csv read in {diff} seconds")
+    @return inputs dataframe with txId (and prevTxId, prevTxpos) columns
+    """
+    log('processing', '\nStarted reading inputs csv')
+    with instrumentation.span('read inputs csv') as span:
+        df = readCSV_bySpec(INPUTS_CSV_SPEC)
+        span.set(rows=len(df))
+    instrumentation.count('rows read', len(df))
     return df
 
+def readInputs(input_links = None):
+    """Read inputs csv (by the columnar cache, in parallel or by chunks)
+    @param [optional] input_links : inputs dataframe already read by readInputLinks
+    @return inputs dataframe (txId column, one row for every transaction)
+    """
+    if input_links is None:
+        input_links = readInputLinks()
+    return input_links[['txId']].drop_duplicates(subset=['txId'])
+
 def readOutputs():
-    """Read outputs csv by chunk 
-    (calculating the chunk size using the number of rows in csv file)
+    """Read outputs csv (by the columnar cache, in parallel or by chunks)
     @no params
     @return outputs dataframe
     """
-    startT = time.time()
-    print('\nStarted reading outputs csv ')
-    schema = {        
-        "txId": "int32",                 
-        "scriptType": "int8",                 
-        "amount": "int64",                 
-        "addressId": "int32",                 
-    }
-    usecols = [0,2,3,4]
-    rowsInFile = 24613799
-    _ , chunk_size = calculate_chunk_size(rowsInFile, 210000)
-    columns = ["txId", "addressId","amount", "scriptType"]
-    chunks = read_csv_chunk(schema,columns,usecols,OUTPUTS_CSV_PATH,chunk_size)
-    df = pd.concat(chunks)
-    df = df.drop_duplicates(subset=['txId'])
-    endT = time.time()
-    diff = endT - startT
-    if LOG_LEVELS['time']:
-        print(f"\nOutputs csv read in {diff} seconds")
+    log('processing', '\nStarted reading outputs csv')
+    with instrumentation.span('read outputs csv') as span:
+        df = readCSV_bySpec(OUTPUTS_CSV_SPEC)
+        df = df.drop_duplicates(subset=['txId'])
+        span.set(rows=len(df))
+    instrumentation.count('rows read', len(df))
     return df
 
 def readTransaction():
-    """Read transactions csv by chunk 
-    (calculating the chunk size using the number of rows in csv file)
+    """Read transactions csv (by the columnar cache, in parallel or by chunks)
     @no params
     @return outputs dataframe
     """   
-    startT = time.time()
-    print('\nStarted reading transactions csv')
-    schema = {
-        "timestamp": "int32",
-        "blockId": "int32",
-        "txId": "int32",
-        "isCoinbase": "int8",
-        "fee": "int32",                
-    }
-    usecols = [0, 1, 2, 3, 4]
-    
-    rowsInFile = 10572829
-    _ , chunk_size = calculate_chunk_size(rowsInFile, 200000)
-    columns = ["timestamp", 'blockId' ,"txId", "isCoinbase", "fee"]    
-    chunks = read_csv_chunk(schema,columns,usecols,TRANSACTIONS_CSV_PATH,chunk_size)
-    df = pd.concat(chunks)    
-    df = df.drop_duplicates(subset=['txId'])    
-   
-    df['timestamp'] = df['timestamp'].apply(unix_to_date)
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
-    
-    endT = time.time()
-    diff = endT - startT
-    if LOG_LEVELS['time']:
-        print(f"\nTransaction csv read in {diff} seconds")
+    log('processing', '\nStarted reading transactions csv')
+    with instrumentation.span('read transactions csv') as span:
+        df = readCSV_bySpec(TRANSACTIONS_CSV_SPEC)
+        df = df.drop_duplicates(subset=['txId'])    
+        # timestamp is kept as int32 Unix epoch : month / bi-month / year buckets 
+        # are derived by array arithmetic (see utilities.month_id) 
+        span.set(rows=len(df))
+    instrumentation.count('rows read', len(df))
     return df 
 
 def takeCSV_data():
     """Take CSV data from inputs, outputs, transactions csv and convert them to dataframes.
-    Use threads to improve performances.
+    Every file is parsed using all the cores (see parallel_reader), 
+    so the files are read one after the other to not oversubscribe the processes.
     
     @no params 
     @return inputs, outputs, transactions dataframes
     """
-    with ThreadPoolExecutor(max_workers=MAX_THREAD_QUANTITY) as executor:
-        inputs_future = executor.submit(readInputs)
-        inputs = inputs_future.result()
-        
-    with ThreadPoolExecutor(max_workers=MAX_THREAD_QUANTITY) as executor:
-        outputs_future = executor.submit(readOutputs)
-        outputs = outputs_future.result()        
-        
-    with ThreadPoolExecutor(max_workers=MAX_THREAD_QUANTITY*3) as executor:
-        tx_future = executor.submit(readTransaction)        
-        tx = tx_future.result()       
+    inputs = readInputs()
+    outputs = readOutputs()
+    tx = readTransaction()
             
     return inputs, outputs, tx
 
 # --- read datas by csv files (for scraping) :
 
 def readMap():
-    """Read map csv by chunk 
-    (calculating the chunk size using the number of rows in csv file)
+    """Read map csv (by the columnar cache, in parallel or by chunks)
     @no params
     @return map dataframe
     """ 
-    startT = time.time()
-    print('\nStarted reading map csv')
-    schema = {        
-        "txHash":'category',
-        "addressId": "int32"              
-    }
-    usecols = [0,1]
-    rowsInFile = 8708821
-    _ , chunk_size = calculate_chunk_size(rowsInFile, 200000)
-    columns = ["txHash","addressId"]
-    chunks = read_csv_chunk(schema,columns,usecols,MAP_CSV_PATH,chunk_size)
-    df = pd.concat(chunks)
-    endT = time.time()
-    diff = endT - startT
-    if LOG_LEVELS['time']:
-        print(f"\nMap csv read in {diff} seconds")
+    log('processing', '\nStarted reading map csv')
+    with instrumentation.span('read map csv') as span:
+        df = readCSV_bySpec(MAP_CSV_SPEC)
+        span.set(rows=len(df))
+    instrumentation.count('rows read', len(df))
     return df
         
 def takeMapCSV_data():  
     """Take map CSV data from map csv and convert them to dataframes.
-    Use threads to improve performances.
+    The file is parsed using all the cores (see parallel_reader).
     
     @no params 
     @return map dataframes
     """ 
-    with ThreadPoolExecutor(max_workers=MAX_THREAD_QUANTITY*3) as executor:        
-        map_future = executor.submit(readMap)                        
-        mapDF = map_future.result()       
+    mapDF = readMap()
                     
     return mapDF
 
-# --- main : 
-
-def main():
-    main_execution_start_time = time.time()
-    
-    # --- read input, output, transactions csv and create DF
-    input_dataframe, outputs_dataframe, transaction_dataframe = takeCSV_data() 
-    line = "------------------------"
-        
-    if LOG_LEVELS['time']:
-        print(f"\nTime for read csv = {time.time()-main_execution_start_time} seconds")
+def readAddressIndex():
+    """Return the compact hash index (address hash -> addressId) of the map csv:
+    the index is loaded by the cache if the map csv did not change, 
+    otherwise it is built by the map dataframe (and then persisted)
+    @no params
+    @return AddressHashIndex
+    """
+    signature = columnar_cache.get_source_signature(MAP_CSV_SPEC['path'], MAP_CSV_SPEC['schema'], MAP_CSV_SPEC['columns'])
+    indexDir = os.path.join(DATASET_CACHE_PATH, "map_index")
+    if USE_COLUMNAR_CACHE:
+        addressIndex = hash_index.AddressHashIndex.load(indexDir, signature)
+        if addressIndex is not None:
+            return addressIndex
     
-    if LOG_LEVELS['debug'] or LOG_LEVELS['all infos']:
-        print(f"\n{line}Dataframes:\n\ninputs for congestion:\n{input_dataframe}\n{line}\noutputs for congestion:\n{outputs_dataframe}\n{line}\ntransaction:\n{transaction_dataframe}\n{line}")
+    with instrumentation.span('build address hash index') as span:
+        mapDF = takeMapCSV_data()
+        addressIndex = hash_index.AddressHashIndex.from_map_dataframe(mapDF)
+        if USE_COLUMNAR_CACHE:
+            addressIndex.save(indexDir, signature)
+        span.set(hashes=len(addressIndex))
+    return addressIndex
+
+# --- pipeline stages (for calculation of network congestion and script type data) :
+
+DEBUG_LINE = "------------------------"
+
+def dailyMetricsStage(input_dataframe, outputs_dataframe, transaction_dataframe):
+    """Get the daily transactions metrics (metrics cube without pools, see metrics_cube): loaded by the cache 
+    if the csv files did not change, otherwise built by the dataframes in a single pass (and then persisted)
+    @param input_dataframe : inputs dataframe
+    @param outputs_dataframe : outputs dataframe
+    @param transaction_dataframe : transactions dataframe
+    @return MetricsCube without pools
+    """
+    signature = {os.path.basename(spec['path']): columnar_cache.get_source_signature(spec['path'], spec['schema'], spec['columns']) 
+                 for spec in [INPUTS_CSV_SPEC, OUTPUTS_CSV_SPEC, TRANSACTIONS_CSV_SPEC]}
+    cubeDir = os.path.join(DATASET_CACHE_PATH, "metrics_cube")
+    daily_metrics = metrics_cube.MetricsCube.load(cubeDir, signature) if USE_COLUMNAR_CACHE else None
+    if daily_metrics is None:
+        log(('debug', 'all infos'), "\n{0}Dataframes:\n\ninputs for congestion:\n{1}\n{0}\noutputs for congestion:\n{2}\n{0}\ntransaction:\n{3}\n{0}", 
+            DEBUG_LINE, input_dataframe, outputs_dataframe, transaction_dataframe)
+        notCoinbaseTX = transaction_dataframe.loc[transaction_dataframe['isCoinbase'] != 1]
+        daily_metrics = metrics_cube.MetricsCube.build(input_dataframe, outputs_dataframe, notCoinbaseTX)
+        if USE_COLUMNAR_CACHE:
+            daily_metrics.save(cubeDir, signature)
+    return daily_metrics
+
+def monthlyAnalysisStage(daily_metrics):
+    """Obtain datas of network congestion & script type per month (rollup of the daily metrics)
+    @param daily_metrics : MetricsCube
+    @return dataframe of months (see analizer.processTransactions)
+    """
+    month_data_DF = daily_metrics.rollup('month')
+    log(('processing', 'all infos', 'debug'), "found {} months\n{}", len(month_data_DF), DEBUG_LINE)
+    return month_data_DF
+
+def newRowsStage(input_dataframe, outputs_dataframe, transaction_dataframe):
+    """Find the months touched by the rows appended to the csv files after the previous run
+    @param input_dataframe : inputs dataframe
+    @param outputs_dataframe : outputs dataframe
+    @param transaction_dataframe : transactions dataframe
+    @return month ids touched by the new rows
+    """
+    newTxIds = np.union1d(
+        input_dataframe['txId'].to_numpy()[getNewRowsMask(INPUTS_CSV_SPEC, input_dataframe)],
+        outputs_dataframe['txId'].to_numpy()[getNewRowsMask(OUTPUTS_CSV_SPEC, outputs_dataframe)]
+    )
+    newTransactionsMask = getNewRowsMask(TRANSACTIONS_CSV_SPEC, transaction_dataframe)
+    touched_month_ids = incremental.touched_month_ids(transaction_dataframe, newTransactionsMask, newTxIds)
+    log(('processing', 'all infos', 'debug'), "\nnew rows touch {} months", len(touched_month_ids))
+    return touched_month_ids
+
+def getSourceRows(key, specs):
+    """Return the rows of the csv files used by the previous run ('previousRows') or by this run ('rows')
+    @param key : 'previousRows' or 'rows'
+    @param specs : csv specs
+    @return dictionary csv file name -> rows
+    """
+    return {os.path.basename(spec['path']): INGESTION_WATERMARKS.get(spec['path'], {}).get(key, 0) for spec in specs}
+
+def incrementalMonthlyAnalysisStage(input_dataframe, outputs_dataframe, transaction_dataframe, touched_month_ids):
+    """Obtain datas of network congestion & script type per month recalculating only the months 
+    touched by new rows (the other months are taken by the results of the previous run)
+    @param input_dataframe : inputs dataframe
+    @param outputs_dataframe : outputs dataframe
+    @param transaction_dataframe : transactions dataframe
+    @param touched_month_ids : month ids touched by new rows
+    @return dataframe of months (see analizer.processTransactions)
+    """
+    specs = [INPUTS_CSV_SPEC, OUTPUTS_CSV_SPEC, TRANSACTIONS_CSV_SPEC]
+    previous = RESULTS_STORE.load('month_data', getSourceRows('previousRows', specs))
     
-    # --- obtain datas of network congestion & script type per month 
     notCoinbaseTX = transaction_dataframe.loc[transaction_dataframe['isCoinbase'] != 1] 
     notCoinbaseTX = notCoinbaseTX.drop('blockId', axis=1)
-    notCoinbaseTX.set_index('timestamp',inplace=True)
     outputsToCalculateCongestion = outputs_dataframe.drop('addressId', axis=1)
-    month_data_DF = analizer.processTransactions(input_dataframe, outputsToCalculateCongestion, notCoinbaseTX)
+    month_data_DF = incremental.incrementalProcessTransactions(input_dataframe, outputsToCalculateCongestion, notCoinbaseTX, touched_month_ids, previous)
     
-    # --- create plots for stats (network congestion & fees | script type)
+    RESULTS_STORE.save('month_data', month_data_DF, getSourceRows('rows', specs))
+    return month_data_DF
+
+def plotMonthlyAnalysisStage(month_data_DF):
+    """Create plots for stats (network congestion & fees | script type)
+    @param month_data_DF : dataframe of months
+    @no return
+    """
     plot_creator.plot_fees_vs_network_congestion(month_data_DF)
     plot_creator.plot_script_type_usage(month_data_DF)
     plot_creator.plot_annual_script_type_usage(month_data_DF)
+
+# --- pipeline stages (for scraping & mining pool analysis) :
+
+def readTxRowsIndex(spec, dataframe):
+    """Return the CSR index txId -> rows of a dataframe read by a csv file (see tx_index):
+    the index is loaded by the cache (next to the columnar cache of the csv) if the csv did not change, 
+    otherwise it is built by the dataframe (and then persisted)
+    @param spec : csv spec of the dataframe
+    @param dataframe : dataframe read by the csv (with txId column)
+    @return TxRowsIndex
+    """
+    signature = columnar_cache.get_source_signature(spec['path'], spec['schema'], spec['columns'])
+    signature['rows'] = len(dataframe)
+    indexDir = os.path.join(columnar_cache.get_cache_dir(DATASET_CACHE_PATH, spec['path']), "tx_index")
+    if USE_COLUMNAR_CACHE:
+        txRowsIndex = tx_index.TxRowsIndex.load(indexDir, signature)
+        if txRowsIndex is not None:
+            return txRowsIndex
     
-    # --- scraping & mining pool analysis :
+    with instrumentation.span(f"build tx index of {os.path.basename(spec['path'])}"):
+        txRowsIndex = tx_index.TxRowsIndex.from_txIds(dataframe['txId'])
+        if USE_COLUMNAR_CACHE:
+            txRowsIndex.save(indexDir, signature)
+    return txRowsIndex
+
+def outputsTxIndexStage(outputs_dataframe):
+    """Get the CSR index txId -> rows of the outputs dataframe
+    @param outputs_dataframe : outputs dataframe
+    @return TxRowsIndex of the outputs
+    """
+    return readTxRowsIndex(OUTPUTS_CSV_SPEC, outputs_dataframe)
+
+def coinbaseOutputsStage(transaction_dataframe, outputs_dataframe, outputsTxIndex):
+    """Associate every coinbase transaction to its (first) output
+    @param transaction_dataframe : transactions dataframe
+    @param outputs_dataframe : outputs dataframe
+    @param outputsTxIndex : CSR index txId -> rows of the outputs dataframe
+    @return dataframe of coinbase transactions with addressId and amount columns
+    """
     coinbaseTX = transaction_dataframe.loc[transaction_dataframe['isCoinbase'] == 1] #filter coinbase tx
     coinbaseTX = coinbaseTX.drop('fee', axis=1) # delete fee column
     coinbaseTX = coinbaseTX.drop_duplicates(subset=['txId']) #delete any duplicates
-    if LOG_LEVELS['debug'] or LOG_LEVELS['all infos']:
-        print(f"coinbaseTX:{coinbaseTX}")
-    
-    outputsToMiningPoolsAnalisis = outputs_dataframe.drop('scriptType', axis=1) #delete script type 
-    outputsToMiningPoolsAnalisis = outputsToMiningPoolsAnalisis.drop_duplicates(subset=['txId']) #delete any duplicates
-    
-    if LOG_LEVELS['debug'] or LOG_LEVELS['all infos']:
-        print(f"outputs To Mining Pools Analisis:\n{outputsToMiningPoolsAnalisis}")
+    log(('debug', 'all infos'), "coinbaseTX:{}", coinbaseTX)
     
-    mapDF = takeMapCSV_data() #take map dataframe
-    if LOG_LEVELS['debug'] or LOG_LEVELS['all infos']:
-        print(f"mapDF:\n\n{mapDF}")
+    #first output of every coinbase tx by the index (no merge over the whole outputs dataframe)
+    outputRows = outputsTxIndex.first_rows(coinbaseTX['txId'].to_numpy())
+    found = outputRows != tx_index.MISSING_ROW
+    coinbaseTX = coinbaseTX.loc[found].reset_index(drop=True)
+    outputColumns = [column for column in outputs_dataframe.columns if column not in ('txId', 'scriptType')] #delete script type 
+    coinbaseTXOutputs = outputs_dataframe.iloc[outputRows[found]][outputColumns].reset_index(drop=True)
     
-    
-    parsedTxDF = pd.merge(coinbaseTX, outputsToMiningPoolsAnalisis, on='txId') #merge coinbase tx with (parsed) outputs 
-    if LOG_LEVELS['debug'] or LOG_LEVELS['all infos']:
-        print(f"parsedTxDF (1):\n\n{parsedTxDF}")
-    
-    parsedTxDF = pd.merge(parsedTxDF, mapDF, on='addressId') #merge previous resoult with map dataframe (to insert hash column)
-    if LOG_LEVELS['debug'] or LOG_LEVELS['all infos']:
-        print(f"parsedTxDF (2):\n\n{parsedTxDF}")
-    
-    
-    miningPoolAddressesDF = scraper.getPools() #get dataframe with txHash<-->mining pool association
-    if LOG_LEVELS['debug'] or LOG_LEVELS['all infos']:
-        print(f'\nminingPoolAddressesDF:\n{miningPoolAddressesDF}')
-    
-    #merge previous resoult with parsedTxDF to obtain all coinbase tx associated to a mining pool :
-    # -> included coinbase tx that have addresses that do not belong to any of the 4 mining pools
-    allCoinbaseTxWithPools = pd.merge(parsedTxDF,miningPoolAddressesDF, on='txHash', how='left') 
-    if LOG_LEVELS['debug'] or LOG_LEVELS['all infos']:
-        print(f'\nallCoinbaseTxWithPools:\n{allCoinbaseTxWithPools}')
-  
-
-    #filter transactions that not have the address associated to any mining pool
-    coinbaseNotAssociated = allCoinbaseTxWithPools[allCoinbaseTxWithPools['pool'].isna()]
-    coinbaseNotAssociated.drop('pool', axis=1)
-    if LOG_LEVELS['debug'] or LOG_LEVELS['all infos']:
-        print(f'\ncoinbaseNotAssociated:\n{coinbaseNotAssociated}')
-    
-    #filter transactions that have address associated to a mining pool
-    coinbase_associated = allCoinbaseTxWithPools[~allCoinbaseTxWithPools['pool'].isna()]
-    if LOG_LEVELS['debug'] or LOG_LEVELS['all infos']:
-        print(f'\ncoinbase_associated:\n{coinbase_associated}')
+    coinbaseOutputs = pd.concat([coinbaseTX, coinbaseTXOutputs], axis=1) #coinbase tx with their (parsed) outputs 
+    log(('debug', 'all infos'), "parsedTxDF (1):\n\n{}", coinbaseOutputs)
+    return coinbaseOutputs
 
-        
-    #group by 'txHash' and count transactions for each miner
-    miner_counts = coinbaseNotAssociated.groupby('addressId')['txHash'].count().reset_index(name='blocks_mined')
-    
-    #sort miners     
-    sorted_miners = miner_counts.sort_values(by='blocks_mined', ascending=False)
+def streamingAnalysisStage():
+    """Obtain datas of network congestion & script type per month and the coinbase outputs
+    consuming the csv files by chunks (out-of-core, see streaming_analizer); the top-k sketches 
+    of the miners are updated by the coinbase outputs of every chunk
+    @no params
+    @return dataframe of months, dataframe of coinbase transactions with addressId and amount columns,
+            top-k sketch of the miners, top-k sketches of the miners of every year
+    """
+    topMiners = top_k.MisraGriesSketch(TOP_MINERS_SKETCH_CAPACITY)
+    topMinersPerYear = top_k.PeriodTopK(TOP_MINERS_QUANTITY, TOP_MINERS_SKETCH_CAPACITY, 'year')
+    aggregator = streaming_analizer.streamMonthlyAnalysis(
+        iterCSV_bySpec(TRANSACTIONS_CSV_SPEC), 
+        iterCSV_bySpec(INPUTS_CSV_SPEC), 
+        iterCSV_bySpec(OUTPUTS_CSV_SPEC),
+        topMiners, topMinersPerYear
+    )
+    if instrumentation.enabled(('debug', 'all infos')):
+        log(('debug', 'all infos'), "\ncoinbase rewards per month:\n{}", aggregator.get_coinbase_rewards())
+    return aggregator.get_month_data(), aggregator.get_coinbase_outputs(), topMiners, topMinersPerYear
 
-    #select top 4 miners 
-    top_4_miners = sorted_miners.head(4)
+def scrapePoolsStage():
+    """Get dataframe with txHash<-->mining pool association (by scraping)
+    @no params
+    @return mining pool addresses dataframe
+    """
+    miningPoolAddressesDF = scraper.getPools()
+    log(('debug', 'all infos'), '\nminingPoolAddressesDF:\n{}', miningPoolAddressesDF)
+    return miningPoolAddressesDF
 
-    if LOG_LEVELS.get('debug', False):
-        print(f"Top 4 miners:\n{top_4_miners}")
-        
+def poolAttributionStage(coinbase_outputs, miningPoolAddressesDF, addressIndex):
+    """Split coinbase transactions (with an address of the map csv) in the ones associated to a mining pool 
+    and the not associated ones, by a dense array addressId -> pool (see pool_attribution)
+    @param coinbase_outputs : dataframe of coinbase transactions with addressId and amount columns
+    @param miningPoolAddressesDF : mining pool addresses dataframe
+    @param addressIndex : hash index of the map csv (address hash <--> addressId)
+    @return coinbase associated dataframe, coinbase not associated dataframe
+    """
+    #resolve the hashes of the mining pool addresses to their addressId once (binary search on the hash index)
+    attribution = pool_attribution.PoolAttribution.from_pool_addresses(miningPoolAddressesDF, addressIndex)
     
-    others_miners = sorted_miners.iloc[4:]
-    if LOG_LEVELS.get('debug', False):
-        print(f"others miners:\n{others_miners}")
+    #label every coinbase output with its pool (single gather on the attribution array)
+    coinbase_associated, coinbaseNotAssociated = attribution.split_coinbase(coinbase_outputs, addressIndex)
+    log(('debug', 'all infos'), '\ncoinbaseNotAssociated:\n{}\n\ncoinbase_associated:\n{}', coinbaseNotAssociated, coinbase_associated)
+    return coinbase_associated, coinbaseNotAssociated
 
-        
-  
-    # Calculate global statistics
-    global_blocks_mined, global_total_rewards = analizer.calculate_pool_statistics(coinbase_associated)
-    if LOG_LEVELS['debug'] or LOG_LEVELS['all infos']:
-        print(f'\nglobal_blocks_mined:\n{global_blocks_mined}')
-        print(f'\nglobal_total_rewards:\n{global_total_rewards}')
+TOP_MINERS_CHUNK_ROWS = 1_000_000 # rows of coinbase outputs added to the sketch at a time
+
+def iterChunks(df, chunkRows = TOP_MINERS_CHUNK_ROWS):
+    """Iterate a dataframe by chunks of rows
+    @param df : dataframe
+    @param [optional] chunkRows : rows of every chunk
+    @return generator of dataframe chunks
+    """
+    for start in range(0, len(df), chunkRows):
+        yield df.iloc[start:start+chunkRows]
+
+def topMinersStage(coinbaseNotAssociated):
+    """Find the top k miners (not associated to the mining pools), k = SETTINGS['TOP_MINERS_QUANTITY']
+    @param coinbaseNotAssociated : coinbase not associated dataframe
+    @return top k miners dataframe
+    """
+    if TOP_MINERS_MODE == 'sketch':
+        #heavy hitters summary updated chunk by chunk (blocks_mined is a lower bound, see max_error)
+        sketch = top_k.MisraGriesSketch(TOP_MINERS_SKETCH_CAPACITY)
+        for chunk in iterChunks(coinbaseNotAssociated):
+            sketch.update(chunk['addressId'])
+        top_miners = sketch.top_k(TOP_MINERS_QUANTITY)
+    else:
+        #count blocks for each miner and select the top k without sorting all the miners
+        top_miners = top_k.top_k_exact(coinbaseNotAssociated['addressId'], TOP_MINERS_QUANTITY)
+
+    log('debug', "Top {} miners:\n{}", TOP_MINERS_QUANTITY, top_miners)
+    return top_miners
+
+def topMinersPerYearStage(coinbaseNotAssociated):
+    """Find the top k miners (not associated to the mining pools) of every year
+    @param coinbaseNotAssociated : coinbase not associated dataframe
+    @return dataframe with year, rank, addressId and blocks_mined columns
+    """
+    if TOP_MINERS_MODE == 'sketch':
+        periodTopK = top_k.PeriodTopK(TOP_MINERS_QUANTITY, TOP_MINERS_SKETCH_CAPACITY, 'year')
+        for chunk in iterChunks(coinbaseNotAssociated):
+            periodTopK.update(chunk)
+        top_miners_per_year = periodTopK.top_k()
+    else:
+        top_miners_per_year = top_k.top_k_exact_per_period(coinbaseNotAssociated, TOP_MINERS_QUANTITY, 'year')
+
+    log(('debug', 'all infos'), "Top {} miners per year:\n{}", TOP_MINERS_QUANTITY, top_miners_per_year)
+    return top_miners_per_year
+
+def streamingTopMinersStage(top_miners_sketch, coinbaseNotAssociated):
+    """Top k miners (not associated to the mining pools) by the sketch updated while streaming the csv files
+    @param top_miners_sketch : top-k sketch of the miners of all the coinbase outputs
+    @param coinbaseNotAssociated : coinbase not associated dataframe (miners that can be ranked)
+    @return top k miners dataframe (blocks_mined lower bound and max_error columns)
+    """
+    top_miners = top_miners_sketch.top_k(TOP_MINERS_QUANTITY, np.unique(coinbaseNotAssociated['addressId'].to_numpy()))
+    log('debug', "Top {} miners:\n{}", TOP_MINERS_QUANTITY, top_miners)
+    return top_miners
+
+def streamingTopMinersPerYearStage(top_miners_per_year_sketch, coinbaseNotAssociated):
+    """Top k miners (not associated to the mining pools) of every year by the sketches updated while streaming the csv files
+    @param top_miners_per_year_sketch : top-k sketches of the miners of every year
+    @param coinbaseNotAssociated : coinbase not associated dataframe (miners that can be ranked)
+    @return dataframe with year, rank, addressId, blocks_mined and max_error columns
+    """
+    top_miners_per_year = top_miners_per_year_sketch.top_k(np.unique(coinbaseNotAssociated['addressId'].to_numpy()))
+    log(('debug', 'all infos'), "Top {} miners per year:\n{}", TOP_MINERS_QUANTITY, top_miners_per_year)
+    return top_miners_per_year
+
+def poolStatisticsStage(metrics_cube):
+    """Calculate global and bi-monthly statistics of the mining pools (rollups of the metrics cube)
+    @param metrics_cube : MetricsCube with the pools
+    @return global blocks mined, global total rewards, bi-monthly blocks mined, bi-monthly total rewards dataframes
+    """
+    global_blocks_mined, global_total_rewards = metrics_cube.pool_rollup()
+    bi_monthly_blocks_mined, bi_monthly_total_rewards = metrics_cube.pool_rollup('bi_month')
+    log(('debug', 'all infos'), '\nglobal_blocks_mined:\n{}\n\nglobal_total_rewards:\n{}', global_blocks_mined, global_total_rewards)
+    log(('debug', 'all infos'), '\nbi_monthly_blocks_mined:\n{}\n\nbi_monthly_total_rewards:\n{}', bi_monthly_blocks_mined, bi_monthly_total_rewards)
+    return global_blocks_mined, global_total_rewards, bi_monthly_blocks_mined, bi_monthly_total_rewards
 
-    # Calculate bi-monthly statistics
+def streamingPoolStatisticsStage(coinbase_associated):
+    """Calculate global and bi-monthly statistics of the mining pools by the coinbase transactions (streaming mode, no metrics cube)
+    @param coinbase_associated : coinbase associated dataframe
+    @return global blocks mined, global total rewards, bi-monthly blocks mined, bi-monthly total rewards dataframes
+    """
+    global_blocks_mined, global_total_rewards = analizer.calculate_pool_statistics(coinbase_associated)
     bi_monthly_blocks_mined, bi_monthly_total_rewards = analizer.calculate_bi_monthly_statistics(coinbase_associated)
-    if LOG_LEVELS['debug'] or LOG_LEVELS['all infos']:
-        print(f'\npbi_monthly_blocks_mined:\n{bi_monthly_blocks_mined}')
-        print(f'\nbi_monthly_total_rewards:\n{bi_monthly_total_rewards}')
+    log(('debug', 'all infos'), '\nglobal_blocks_mined:\n{}\n\nglobal_total_rewards:\n{}', global_blocks_mined, global_total_rewards)
+    log(('debug', 'all infos'), '\nbi_monthly_blocks_mined:\n{}\n\nbi_monthly_total_rewards:\n{}', bi_monthly_blocks_mined, bi_monthly_total_rewards)
+    return global_blocks_mined, global_total_rewards, bi_monthly_blocks_mined, bi_monthly_total_rewards
+
+def getPoolsFingerprint(miningPoolAddressesDF):
+    """Fingerprint of the data the pools attribution depends on: the pools addresses and the map csv
+    @param miningPoolAddressesDF : mining pool addresses dataframe
+    @return string fingerprint
+    """
+    mapSignature = columnar_cache.get_source_signature(MAP_CSV_SPEC['path'], MAP_CSV_SPEC['schema'], MAP_CSV_SPEC['columns'])
+    return f"{incremental.dataframe_fingerprint(miningPoolAddressesDF)}-{mapSignature['size']}-{mapSignature['mtime_ns']}"
+
+def incrementalPoolStatisticsStage(coinbase_associated, miningPoolAddressesDF, touched_month_ids):
+    """Calculate global and bi-monthly statistics of the mining pools recalculating only 
+    the bi-month periods touched by new rows 
+    @param coinbase_associated : coinbase associated dataframe
+    @param miningPoolAddressesDF : mining pool addresses dataframe (results depend also by them)
+    @param touched_month_ids : month ids touched by new rows
+    @return global blocks mined, global total rewards, bi-monthly blocks mined, bi-monthly total rewards dataframes
+    """
+    specs = [OUTPUTS_CSV_SPEC, TRANSACTIONS_CSV_SPEC]
+    poolsFingerprint = getPoolsFingerprint(miningPoolAddressesDF)
+    previous_blocks = RESULTS_STORE.load('bi_monthly_blocks_mined', getSourceRows('previousRows', specs), poolsFingerprint)
+    previous_rewards = RESULTS_STORE.load('bi_monthly_total_rewards', getSourceRows('previousRows', specs), poolsFingerprint)
+    previous = None
+    if previous_blocks is not None and previous_rewards is not None:
+        previous = (previous_blocks, previous_rewards)
+    
+    touched_bi_month_ids = np.unique(np.asarray(touched_month_ids) // 2)
+    results = incremental.incrementalBiMonthlyStatistics(coinbase_associated, touched_bi_month_ids, previous)
+    global_blocks_mined, global_total_rewards, bi_monthly_blocks_mined, bi_monthly_total_rewards = results
     
-    # Plot statistics
-    plot_creator.plot_blocks_mined_by_top_4_miners(top_4_miners)
+    RESULTS_STORE.save('bi_monthly_blocks_mined', bi_monthly_blocks_mined, getSourceRows('rows', specs), poolsFingerprint)
+    RESULTS_STORE.save('bi_monthly_total_rewards', bi_monthly_total_rewards, getSourceRows('rows', specs), poolsFingerprint)
+    log(('debug', 'all infos'), '\nglobal_blocks_mined:\n{}\n\nbi_monthly_blocks_mined:\n{}', global_blocks_mined, bi_monthly_blocks_mined)
+    return global_blocks_mined, global_total_rewards, bi_monthly_blocks_mined, bi_monthly_total_rewards
+
+def metricsCubeStage(daily_metrics, coinbase_associated):
+    """Get the daily metrics cube (see metrics_cube): the daily transactions metrics with the pools metrics
+    @param daily_metrics : MetricsCube without pools
+    @param coinbase_associated : coinbase associated dataframe
+    @return MetricsCube
+    """
+    cube = daily_metrics.with_pools(coinbase_associated)
+    if instrumentation.enabled(('debug', 'all infos')):
+        log(('debug', 'all infos'), '\nquarterly metrics (metrics cube rollup):\n{}', cube.rollup("quarter"))
+    return cube
+
+def plotPoolStatisticsStage(top_miners, top_miners_per_year, global_blocks_mined, global_total_rewards, bi_monthly_blocks_mined, bi_monthly_total_rewards):
+    """Plot mining pools statistics
+    @no return
+    """
+    plot_creator.plot_blocks_mined_by_top_miners(top_miners)
+    plot_creator.plot_top_miners_per_year(top_miners_per_year)
     plot_creator.plot_total_blocks_mined(global_blocks_mined)
     plot_creator.plot_bi_monthly_blocks_mined(bi_monthly_blocks_mined)
     plot_creator.plot_total_rewards(global_total_rewards)
     plot_creator.plot_bi_monthly_rewards(bi_monthly_total_rewards)
 
-    #Eligius taint analysis
-    nodes = scraper.getEligius_taint_analysis()    
-    if LOG_LEVELS['debug'] or LOG_LEVELS['all infos']:
-        print(f'\nnodes:\n{nodes}')
+def inputsTxIndexStage(input_links):
+    """Get the CSR index txId -> rows of the inputs dataframe (all the inputs)
+    @param input_links : inputs dataframe with txId, prevTxId and prevTxpos columns
+    @return TxRowsIndex of the inputs
+    """
+    return readTxRowsIndex(INPUTS_CSV_SPEC, input_links)
+
+def spentByIndexStage(input_links):
+    """Get the spent-by index output -> spending txId of the inputs (see taint_graph): 
+    loaded by the cache if the inputs csv did not change, otherwise built by the dataframe (and then persisted)
+    @param input_links : inputs dataframe with txId, prevTxId and prevTxpos columns
+    @return SpentByIndex
+    """
+    signature = columnar_cache.get_source_signature(INPUTS_CSV_SPEC['path'], INPUTS_CSV_SPEC['schema'], INPUTS_CSV_SPEC['columns'])
+    signature['rows'] = len(input_links)
+    indexDir = os.path.join(columnar_cache.get_cache_dir(DATASET_CACHE_PATH, INPUTS_CSV_SPEC['path']), "spent_by_index")
+    if USE_COLUMNAR_CACHE:
+        spentByIndex = taint_graph.SpentByIndex.load(indexDir, signature)
+        if spentByIndex is not None:
+            return spentByIndex
     
-    graph_DF = pd.DataFrame(nodes)
-    print(graph_DF)
+    with instrumentation.span('build spent-by index') as span:
+        spentByIndex = taint_graph.SpentByIndex.from_inputs(input_links)
+        if USE_COLUMNAR_CACHE:
+            spentByIndex.save(indexDir, signature)
+        span.set(rows=len(spentByIndex))
+    return spentByIndex
+
+def getEligiusRootTxId(coinbase_associated):
+    """txId of the first transaction of the offline taint analysis: TAINT_ROOT_TX_ID 
+    or (if None) the first coinbase transaction associated to Eligius
+    @param coinbase_associated : coinbase associated dataframe
+    @return txId or None if Eligius has no coinbase transactions
+    """
+    if TAINT_ROOT_TX_ID is not None:
+        return TAINT_ROOT_TX_ID
+    eligiusTxIds = coinbase_associated.loc[coinbase_associated['pool'] == 'Eligius', 'txId']
+    return int(eligiusTxIds.min()) if len(eligiusTxIds) > 0 else None
+
+def offlineTaintAnalysisStage(input_links, inputsTxIndex, spentByIndex, coinbase_associated = None):
+    """Eligius taint analysis on the inputs csv (no scraping, see taint_graph)
+    @param input_links : inputs dataframe with txId, prevTxId and prevTxpos columns
+    @param inputsTxIndex : CSR index txId -> rows of the inputs dataframe
+    @param spentByIndex : spent-by index of the inputs
+    @param [optional] coinbase_associated : coinbase associated dataframe (not used if TAINT_ROOT_TX_ID is set)
+    @return list of nodes of the Eligius graph
+    """
+    rootTxId = getEligiusRootTxId(coinbase_associated)
+    if rootTxId is None:
+        log(('debug', 'all infos', 'results'), "\nno Eligius coinbase transactions -> empty taint analysis")
+        return []
+    nodes = taint_graph.get_taint_nodes(input_links, inputsTxIndex, spentByIndex, rootTxId, 
+                                        SETTINGS['ELIGIUS_ANALYSIS_STEPS'], SETTINGS['TAINT_MAX_NODES'])
+    log(('debug', 'all infos', 'results'), "\nFound {} nodes in {} steps (offline, from txId {})", len(nodes), SETTINGS['ELIGIUS_ANALYSIS_STEPS'], rootTxId)
+    log(('debug', 'all infos'), '\nnodes:\n{}', nodes)
+    return nodes
+
+def eligiusTaintAnalysisStage():
+    """Eligius taint analysis (by scraping)
+    @no params
+    @return list of nodes of the Eligius graph
+    """
+    nodes = scraper.getEligius_taint_analysis()    
+    log(('debug', 'all infos'), '\nnodes:\n{}', nodes)
+    return nodes
+
+def plotEligiusStage(eligius_nodes):
+    """Plot the graph of the Eligius taint analysis
+    @param eligius_nodes : list of nodes of the Eligius graph
+    @no return
+    """
+    graph_DF = pd.DataFrame(eligius_nodes)
+    log(('debug', 'all infos'), '\nEligius graph:\n{}', graph_DF)
     
     plot_creator.plot_Eligius_path(graph_DF)
+
+def getPipelineStages():
+    """Return the stages of the pipeline with their inputs and outputs.
+    Plots are executed in the main thread (matplotlib windows), all the other stages 
+    are executed in worker threads as soon as their inputs are ready.
+    The Eligius taint analysis is calculated on the inputs (offline backend) or by scraping.
+    In streaming mode the monthly analysis and the coinbase outputs are calculated by chunks,
+    in incremental mode only the months touched by the rows appended to the csv files are recalculated.
+    When the dataframes are in memory (not streaming mode) the daily metrics cube is built once (or loaded by the cache):
+    the months and the pools statistics are rollups of the cube.
+    @no params
+    @return list of Stage
+    """
+    if OFFLINE_TAINT_ANALYSIS:
+        # all the inputs are kept for the taint analysis, the analyses use the txIds without duplicates
+        readStages = [
+            Stage('read inputs', readInputLinks, outputs=['input_links'], resources=[CSV_READER]),
+            Stage('inputs', readInputs, inputs=['input_links'], outputs=['input_dataframe']),
+        ]
+    else:
+        readStages = [Stage('read inputs', readInputs, outputs=['input_dataframe'], resources=[CSV_READER])]
+    readStages += [
+        Stage('read outputs', readOutputs, outputs=['outputs_dataframe'], resources=[CSV_READER]),
+        Stage('read transactions', readTransaction, outputs=['transaction_dataframe'], resources=[CSV_READER]),
+        Stage('outputs tx index', outputsTxIndexStage, inputs=['outputs_dataframe'], outputs=['outputsTxIndex']),
+        Stage('coinbase outputs', coinbaseOutputsStage, 
+              inputs=['transaction_dataframe', 'outputs_dataframe', 'outputsTxIndex'], outputs=['coinbase_outputs']),
+    ]
+    poolStatisticsOutputs = ['global_blocks_mined', 'global_total_rewards', 'bi_monthly_blocks_mined', 'bi_monthly_total_rewards']
+    
+    if STREAMING_MODE:
+        # the inputs / outputs / transactions csv are never loaded as a whole
+        analysisStages = [
+            Stage('streaming analysis', streamingAnalysisStage, 
+                  outputs=['month_data_DF', 'coinbase_outputs', 'top_miners_sketch', 'top_miners_per_year_sketch'], resources=[CSV_READER]),
+            Stage('pool statistics', streamingPoolStatisticsStage, inputs=['coinbase_associated'], outputs=poolStatisticsOutputs),
+            Stage('top miners', streamingTopMinersStage, inputs=['top_miners_sketch', 'coinbaseNotAssociated'], outputs=['top_miners']),
+            Stage('top miners per year', streamingTopMinersPerYearStage, 
+                  inputs=['top_miners_per_year_sketch', 'coinbaseNotAssociated'], outputs=['top_miners_per_year']),
+        ]
+    else:
+        analysisStages = list(readStages)
+        if INCREMENTAL_INGESTION:
+            # only the months touched by the new rows are recalculated (the metrics cube would be rebuilt as a whole)
+            analysisStages += [
+                Stage('new rows', newRowsStage, 
+                      inputs=['input_dataframe', 'outputs_dataframe', 'transaction_dataframe'], outputs=['touched_month_ids']),
+                Stage('monthly analysis', incrementalMonthlyAnalysisStage, 
+                      inputs=['input_dataframe', 'outputs_dataframe', 'transaction_dataframe', 'touched_month_ids'], outputs=['month_data_DF']),
+                Stage('pool statistics', incrementalPoolStatisticsStage, 
+                      inputs=['coinbase_associated', 'miningPoolAddressesDF', 'touched_month_ids'], outputs=poolStatisticsOutputs),
+            ]
+        else:
+            # daily metrics aggregated once: months, pools and bi-monthly statistics (and the query service) are rollups of the cube
+            analysisStages += [
+                Stage('daily metrics', dailyMetricsStage, 
+                      inputs=['input_dataframe', 'outputs_dataframe', 'transaction_dataframe'], outputs=['daily_metrics']),
+                Stage('metrics cube', metricsCubeStage, inputs=['daily_metrics', 'coinbase_associated'], outputs=['metrics_cube']),
+                Stage('monthly analysis', monthlyAnalysisStage, inputs=['daily_metrics'], outputs=['month_data_DF']),
+                Stage('pool statistics', poolStatisticsStage, inputs=['metrics_cube'], outputs=poolStatisticsOutputs),
+            ]
+        analysisStages += [
+            Stage('top miners', topMinersStage, inputs=['coinbaseNotAssociated'], outputs=['top_miners']),
+            Stage('top miners per year', topMinersPerYearStage, inputs=['coinbaseNotAssociated'], outputs=['top_miners_per_year']),
+        ]
+    
+    if OFFLINE_TAINT_ANALYSIS:
+        # the root is the first Eligius coinbase (pool attribution, by scraping) only if TAINT_ROOT_TX_ID is not set
+        rootInputs = ['coinbase_associated'] if TAINT_ROOT_TX_ID is None else []
+        taintStages = [
+            Stage('inputs tx index', inputsTxIndexStage, inputs=['input_links'], outputs=['inputsTxIndex']),
+            Stage('spent-by index', spentByIndexStage, inputs=['input_links'], outputs=['spentByIndex']),
+            Stage('offline taint analysis', offlineTaintAnalysisStage, 
+                  inputs=['input_links', 'inputsTxIndex', 'spentByIndex'] + rootInputs, outputs=['eligius_nodes']),
+        ]
+    else:
+        taintStages = [Stage('eligius taint analysis', eligiusTaintAnalysisStage, outputs=['eligius_nodes'])]
+    
+    return analysisStages + [
+        Stage('read address index', readAddressIndex, outputs=['addressIndex'], resources=[CSV_READER]),
+        Stage('scrape pools', scrapePoolsStage, outputs=['miningPoolAddressesDF']),
+    ] + taintStages + [
+        Stage('pool attribution', poolAttributionStage, 
+              inputs=['coinbase_outputs', 'miningPoolAddressesDF', 'addressIndex'], outputs=['coinbase_associated', 'coinbaseNotAssociated']),
+        Stage('plot monthly analysis', plotMonthlyAnalysisStage, inputs=['month_data_DF'], mainThread=True),
+        Stage('plot pool statistics', plotPoolStatisticsStage, 
+              inputs=['top_miners', 'top_miners_per_year', 'global_blocks_mined', 'global_total_rewards', 'bi_monthly_blocks_mined', 'bi_monthly_total_rewards'], 
+              mainThread=True),
+        Stage('plot eligius path', plotEligiusStage, inputs=['eligius_nodes'], mainThread=True),
+    ]
+
+# --- main : 
+
+def main():
+    scheduler = StageScheduler(getPipelineStages())
+    scheduler.run()
+    if LOG_LEVELS['time']:
+        print(f"\n{instrumentation.TRACER.summary_table()}")
     
         
 def test_eligius_graph():
@@ -322,7 +847,7 @@ def test_eligius_graph():
     nodes = scraper.getEligius_taint_analysis()    
     
     graph_DF = pd.DataFrame(nodes)
-    print(graph_DF)
+    log(('debug', 'all infos'), '\nEligius graph:\n{}', graph_DF)
     
     plot_creator.plot_Eligius_path(graph_DF)
     
@@ -0,0 +1,287 @@
+import json
+import time
+import threading
+import numpy as np
+import pandas as pd
+import requests
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from utilities import LOG_LEVELS, SETTINGS
+from utilities import SECONDS_PER_DAY
+from instrumentation import log
+from dataset_analysis import analizer, top_k
+from stage_scheduler import StageScheduler
+
+pd.set_option("mode.copy_on_write", True)
+
+# Warm query service:
+# the datasets are read and analysed once (all the pipeline stages except plots and the
+# Eligius taint analysis), then a local HTTP server answers JSON queries for any time range
+# by the in-memory results (metrics cube rollups, coinbase dataframes), without reading the
+# csv files again.
+#
+# GET /health
+# GET /metrics?bucket=month&start=2010-01-01&end=2011-01-01  -> fees, network congestion, script types
+# GET /pools?bucket=quarter&start=2011&end=2012               -> blocks mined and total rewards of the pools
+# GET /top-miners?k=4&start=2011&end=2012                    -> top k miners not associated to the pools
+
+QUERY_SERVICE_HOST = SETTINGS['QUERY_SERVICE_HOST']
+QUERY_SERVICE_PORT = SETTINGS['QUERY_SERVICE_PORT']
+SERVICE_EXCLUDED_STAGES = ('eligius taint analysis', 'inputs tx index', 'spent-by index', 'offline taint analysis')
+
+
+def parse_day(value):
+    """Convert a date ('aaaa', 'aaaa-mm' or 'aaaa-mm-gg') to a day id (days since 1970-01-01)
+    @param value : date string or None
+    @return day id or None
+    """
+    if value is None:
+        return None
+    try:
+        return int(np.datetime64(value).astype('datetime64[D]').astype('int64'))
+    except ValueError:
+        raise ValueError(f"invalid date {value}, expected aaaa, aaaa-mm or aaaa-mm-gg")
+
+def parse_range(start, end):
+    """Convert the dates of a range [start, end) to day ids (an empty range is valid, a reversed one is not)
+    @param start : first date of the range or None
+    @param end : last date (excluded) of the range or None
+    @return first day id or None, last day id or None
+    """
+    startDay, endDay = parse_day(start), parse_day(end)
+    if startDay is not None and endDay is not None and endDay < startDay:
+        raise ValueError(f"invalid range, end {end} is before start {start}")
+    return startDay, endDay
+
+def _in_range(df, startDay, endDay):
+    """Rows of a dataframe (with Unix timestamp column) in the days [startDay, endDay)"""
+    timestamps = df['timestamp'].to_numpy()
+    selected = np.ones(len(timestamps), dtype='bool')
+    if startDay is not None:
+        selected &= timestamps >= startDay * SECONDS_PER_DAY
+    if endDay is not None:
+        selected &= timestamps < endDay * SECONDS_PER_DAY
+    return selected
+
+def parse_bucket(value):
+    """Convert the bucket parameter of a query ('none' = no bucket, digits = number of blocks)"""
+    if value is None or value == 'none':
+        return None
+    return int(value) if value.isdigit() else value
+
+
+class QueryEngine:
+    """Answers the analysis queries by the in-memory results of the pipeline"""
+
+    def __init__(self, results):
+        """
+        @param results : values produced by the pipeline stages (see main.getPipelineStages),
+                         at least metrics_cube and coinbaseNotAssociated (coinbase_associated for the buckets of blocks)
+        """
+        if 'metrics_cube' not in results:
+            raise ValueError("the query service needs the metrics cube (not available in streaming and incremental mode)")
+        self.cube = results['metrics_cube']
+        self.coinbaseNotAssociated = results['coinbaseNotAssociated']
+        self.coinbaseAssociated = results.get('coinbase_associated')
+
+    def metrics(self, bucket = 'month', start = None, end = None):
+        """Fees, network congestion and script type counts of every bucket in [start, end)
+        @param [optional] bucket : 'day', 'week', 'month', 'bi_month', 'quarter' or 'year', default = 'month'
+        @param [optional] start : first date of the range (None = from the first day)
+        @param [optional] end : last date (excluded) of the range (None = up to the last day)
+        @return dataframe (same format of analizer.processTransactions)
+        """
+        return self.cube.between(*parse_range(start, end)).rollup(bucket)
+
+    def pools(self, bucket = None, start = None, end = None):
+        """Blocks mined and total rewards of every pool (and bucket) in [start, end)
+        @param [optional] bucket : time bucket, number of blocks (int, by the coinbase transactions) or None (statistics of the whole range)
+        @param [optional] start : first date of the range (None = from the first day)
+        @param [optional] end : last date (excluded) of the range (None = up to the last day)
+        @return dataframe with pool, [bucket], blocks_mined and total_rewards columns
+        """
+        startDay, endDay = parse_range(start, end)
+        if isinstance(bucket, int):
+            # il cubo è giornaliero : i bucket di N blocchi sono calcolati sulle transazioni coinbase
+            if self.coinbaseAssociated is None:
+                raise ValueError("buckets of blocks need the coinbase associated dataframe")
+            coinbaseAssociated = self.coinbaseAssociated.loc[_in_range(self.coinbaseAssociated, startDay, endDay)]
+            blocks_mined, total_rewards = analizer.aggregate_pool_statistics(coinbaseAssociated, bucket)
+        else:
+            blocks_mined, total_rewards = self.cube.between(startDay, endDay).pool_rollup(bucket)
+        blocks_mined['total_rewards'] = total_rewards['total_rewards']
+        return blocks_mined
+
+    def top_miners(self, k = 4, start = None, end = None):
+        """Top k miners (not associated to the pools) in [start, end)
+        @param [optional] k : number of miners, default = 4
+        @param [optional] start : first date of the range (None = from the first day)
+        @param [optional] end : last date (excluded) of the range (None = up to the last day)
+        @return dataframe with addressId and blocks_mined columns
+        """
+        selected = _in_range(self.coinbaseNotAssociated, *parse_range(start, end))
+        return top_k.top_k_exact(self.coinbaseNotAssociated['addressId'].to_numpy()[selected], k)
+
+    def query(self, path, params):
+        """Dispatch a query by its path
+        @param path : '/metrics', '/pools' or '/top-miners'
+        @param params : dictionary of the query parameters (strings)
+        @return dataframe with the result
+        """
+        start, end = params.get('start'), params.get('end')
+        if path == '/metrics':
+            return self.metrics(params.get('bucket', 'month'), start, end)
+        if path == '/pools':
+            return self.pools(parse_bucket(params.get('bucket')), start, end)
+        if path == '/top-miners':
+            return self.top_miners(int(params.get('k', 4)), start, end)
+        raise KeyError(path)
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    """HTTP handler of the query service (the engine is an attribute of the server)"""
+
+    def _send_json(self, status, body):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        startT = time.time()
+        url = urlparse(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        if url.path == '/health':
+            self._send_json(200, json.dumps({'status': 'ok'}))
+            return
+        try:
+            result = self.server.engine.query(url.path, params)
+        except KeyError:
+            self._send_json(404, json.dumps({'error': f"unknown query {url.path}"}))
+            return
+        except ValueError as e:
+            self._send_json(400, json.dumps({'error': str(e)}))
+            return
+        except Exception as e:
+            # un errore inatteso non deve chiudere la connessione senza risposta
+            print(f"query {self.path} failed : {type(e).__name__}: {e}")
+            self._send_json(500, json.dumps({'error': f"{type(e).__name__}: {e}"}))
+            return
+        self._send_json(200, result.to_json(orient='records'))
+        log('time', "query {} answered in {} seconds", self.path, time.time()-startT)
+
+    def log_message(self, format, *args):
+        if LOG_LEVELS['debug']:
+            super().log_message(format, *args)
+
+
+class QueryService:
+    """Local HTTP server of a QueryEngine"""
+
+    def __init__(self, engine, host = QUERY_SERVICE_HOST, port = QUERY_SERVICE_PORT):
+        """
+        @param engine : QueryEngine
+        @param [optional] host : host of the server, default = QUERY_SERVICE_HOST
+        @param [optional] port : port of the server (0 = any free port), default = QUERY_SERVICE_PORT
+        """
+        self.server = ThreadingHTTPServer((host, port), QueryRequestHandler)
+        self.server.engine = engine
+        self.thread = None
+
+    @property
+    def address(self):
+        """(host, port) of the server"""
+        return self.server.server_address[:2]
+
+    def start(self):
+        """Serve the queries in a background thread
+        @no params
+        @no return
+        """
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def serve_forever(self):
+        """Serve the queries in the current thread (until KeyboardInterrupt)
+        @no params
+        @no return
+        """
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.server.server_close()
+
+    def stop(self):
+        """Stop the server
+        @no params
+        @no return
+        """
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+
+class QueryClient:
+    """Client of the query service"""
+
+    def __init__(self, host = QUERY_SERVICE_HOST, port = QUERY_SERVICE_PORT, timeout = 30):
+        """
+        @param [optional] host : host of the service
+        @param [optional] port : port of the service
+        @param [optional] timeout : timeout of the requests (seconds)
+        """
+        self.base_url = f"http://{host}:{port}"
+        self.timeout = timeout
+
+    def _get(self, path, **params):
+        response = requests.get(self.base_url + path, params={name: value for name, value in params.items() if value is not None}, timeout=self.timeout)
+        if response.status_code != 200:
+            raise ValueError(f"query {path} failed ({response.status_code}) : {response.json().get('error')}")
+        return pd.DataFrame(response.json())
+
+    def health(self):
+        """Status of the service
+        @no params
+        @return dictionary with the status
+        """
+        return requests.get(self.base_url + '/health', timeout=self.timeout).json()
+
+    def metrics(self, bucket = 'month', start = None, end = None):
+        """See QueryEngine.metrics
+        @return dataframe of buckets
+        """
+        return self._get('/metrics', bucket=bucket, start=start, end=end)
+
+    def pools(self, bucket = None, start = None, end = None):
+        """See QueryEngine.pools
+        @return dataframe of pools statistics
+        """
+        return self._get('/pools', bucket=bucket, start=start, end=end)
+
+    def top_miners(self, k = 4, start = None, end = None):
+        """See QueryEngine.top_miners
+        @return dataframe of the top k miners
+        """
+        return self._get('/top-miners', k=k, start=start, end=end)
+
+
+def load_results():
+    """Run the pipeline stages (without plots and Eligius taint analysis) and return their values
+    @no params
+    @return dictionary value name -> value
+    """
+    import main
+    stages = [stage for stage in main.getPipelineStages() if not stage.mainThread and stage.name not in SERVICE_EXCLUDED_STAGES]
+    return StageScheduler(stages).run()
+
+
+if __name__ == "__main__":
+    startT = time.time()
+    service = QueryService(QueryEngine(load_results()))
+    print(f"query service ready in {time.time()-startT} seconds on http://{service.address[0]}:{service.address[1]}")
+    service.serve_forever()
@@ -0,0 +1,204 @@
+import asyncio
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from utilities import SETTINGS
+import instrumentation
+from instrumentation import log
+from scraping import http_backend
+
+# Asyncio crawler of the addresses pages of the mining pools:
+# the first page of every pool is requested at the same time, as soon as the number of pages
+# of a pool is known all its other pages are scheduled, so the pages of all the pools are
+# fetched concurrently. Every host has a limiter (max concurrent requests + min interval
+# between two request starts): the total time is bounded by the politeness budget of the host
+# (pages * CRAWLER_MIN_INTERVAL_SECONDS) instead of the serial round-trips.
+# The requests use the pooled session of http_backend (run in a thread pool, the connections
+# are shared by all the requests), parsing included.
+
+CRAWLER_HOST_CONCURRENCY = SETTINGS['CRAWLER_HOST_CONCURRENCY']
+CRAWLER_MIN_INTERVAL_SECONDS = SETTINGS['CRAWLER_MIN_INTERVAL_SECONDS']
+CRAWLER_ALLOW_MISSING_PAGES = SETTINGS['CRAWLER_ALLOW_MISSING_PAGES']
+
+
+class CrawlError(Exception):
+    def __init__(self, message, missing):
+        super().__init__(message)
+        self.missing = missing # list of (pool, page number) not fetched
+
+    def __str__(self):
+        pages = ", ".join(f"{pool} page {page}" for pool, page in self.missing)
+        return f"{self.args[0]}: {pages}"
+
+
+class HostLimiter:
+    """Async limiter of the requests to a host: max concurrent requests and min interval between two starts"""
+
+    def __init__(self, concurrency, minInterval):
+        """
+        @param concurrency : max concurrent requests
+        @param minInterval : min seconds between the start of two requests
+        """
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.minInterval = minInterval
+        self.nextStart = 0.0
+        self.lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        async with self.lock:
+            now = asyncio.get_running_loop().time()
+            wait = self.nextStart - now
+            self.nextStart = max(now, self.nextStart) + self.minInterval
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return self
+
+    async def __aexit__(self, excType, excValue, traceback):
+        self.semaphore.release()
+        return False
+
+
+class AsyncCrawler:
+    """Concurrent crawler of the addresses pages of the mining pools"""
+
+    def __init__(self, hostConcurrency = CRAWLER_HOST_CONCURRENCY, minInterval = CRAWLER_MIN_INTERVAL_SECONDS, fetch = http_backend.fetch_page, 
+                 allowMissingPages = CRAWLER_ALLOW_MISSING_PAGES):
+        """
+        @param [optional] hostConcurrency : max concurrent requests to a host, default = CRAWLER_HOST_CONCURRENCY
+        @param [optional] minInterval : min seconds between two requests to a host, default = CRAWLER_MIN_INTERVAL_SECONDS
+        @param [optional] fetch : function url -> HTML (blocking), default = http_backend.fetch_page (pooled session)
+        @param [optional] allowMissingPages : if True the pages not fetched are skipped (partial pools), 
+                                              otherwise the crawl raises CrawlError, default = CRAWLER_ALLOW_MISSING_PAGES
+        """
+        self.hostConcurrency = hostConcurrency
+        self.minInterval = minInterval
+        self.fetch = fetch
+        self.allowMissingPages = allowMissingPages
+        self.limiters = {}
+        self.executor = None
+
+    def _limiter(self, url):
+        host = urlparse(url).netloc
+        if host not in self.limiters:
+            self.limiters[host] = HostLimiter(self.hostConcurrency, self.minInterval)
+        return self.limiters[host]
+
+    async def _get(self, url, parse):
+        """Fetch and parse a page in the thread pool (within the limits of its host, 
+        the pages served by the http cache are not limited)"""
+        loop = asyncio.get_running_loop()
+        if http_backend.is_cached(url):
+            return await loop.run_in_executor(self.executor, lambda: parse(self.fetch(url)))
+        async with self._limiter(url):
+            return await loop.run_in_executor(self.executor, lambda: parse(self.fetch(url)))
+
+    async def _first_page(self, pool, url):
+        # la prima pagina dà sia il numero di pagine sia i suoi indirizzi (una sola richiesta)
+        pages, addresses = await self._get(url, lambda html: (http_backend.parse_number_of_pages(html), http_backend.parse_wallet_addresses(html)))
+        log(('debug', 'all infos', 'processing'), "{} : found {} pages to process", pool, pages)
+        return pool, url, 1, pages, addresses
+
+    async def _page(self, pool, url, page):
+        addresses = await self._get(f"{url}?page={page}", http_backend.parse_wallet_addresses)
+        return pool, url, page, None, addresses
+
+    async def stream_pages(self, pools):
+        """Async generator of the addresses pages of the pools, in completion order.
+        A page not fetched (after the retries of the http backend) does not stop the crawl:
+        it is counted, logged and requested again once at the end of the crawl. The pages still 
+        not fetched raise CrawlError after the other pages, or are skipped (a pool whose first page
+        is not fetched is skipped as a whole) if allowMissingPages
+        @param pools : dictionary pool name -> url of the first addresses page of the pool
+        @return async generator of (pool, page number, addresses of the page)
+        """
+        ownExecutor = self.executor is None
+        if ownExecutor:
+            self.executor = ThreadPoolExecutor(max_workers=max(1, self.hostConcurrency * len({urlparse(url).netloc for url in pools.values()})))
+        pending = {} # task -> (pool, url, page number)
+        def schedule(pool, url, page):
+            coroutine = self._first_page(pool, url) if page == 1 else self._page(pool, url, page)
+            pending[asyncio.create_task(coroutine)] = (pool, url, page)
+
+        for pool, url in pools.items():
+            schedule(pool, url, 1)
+        failed = []
+        missing = []
+        retrying = False
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    pool, url, page = pending.pop(task)
+                    try:
+                        _, _, _, pages, addresses = task.result()
+                    except Exception as e:
+                        instrumentation.count('crawl page errors')
+                        log(('debug', 'all infos', 'processing'), "{} : page {} not fetched ({}) -> {}", pool, page, e, 
+                            "missing" if retrying else "requested again at the end of the crawl")
+                        if retrying:
+                            missing.append((pool, page))
+                        else:
+                            failed.append((pool, url, page))
+                        continue
+                    if page == 1:
+                        for number in range(2, pages + 1):
+                            schedule(pool, url, number)
+                    instrumentation.count('crawled pages')
+                    yield pool, page, addresses
+                
+                if not pending and failed:
+                    retrying = True
+                    for pool, url, page in failed:
+                        schedule(pool, url, page)
+                    failed = []
+
+            if missing:
+                missing.sort(key=lambda item: (list(pools).index(item[0]), item[1]))
+                if not self.allowMissingPages:
+                    raise CrawlError("pages of the pools not fetched", missing)
+                instrumentation.count('crawl pages missing', len(missing))
+                log(('results', 'processing', 'debug'), "WARNING : {} pages of the pools not fetched -> skipped, the pools are partial ({})", 
+                    len(missing), ", ".join(f"{pool} page {page}" for pool, page in missing))
+        finally:
+            for task in pending:
+                task.cancel()
+            if ownExecutor:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
+
+    async def stream_addresses(self, pools):
+        """Async generator of the addresses of the pools, as soon as their pages are fetched
+        @param pools : dictionary pool name -> url of the first addresses page of the pool
+        @return async generator of (address, pool)
+        """
+        async for pool, _, addresses in self.stream_pages(pools):
+            for address in addresses:
+                yield address, pool
+
+    async def collect(self, pools):
+        """Crawl all the pages of the pools
+        @param pools : dictionary pool name -> url of the first addresses page of the pool
+        @return dataframe with txHash and pool columns (pools in the given order, pages in order)
+        """
+        pages = []
+        async for pool, page, addresses in self.stream_pages(pools):
+            pages.append((pool, page, addresses))
+        order = {pool: position for position, pool in enumerate(pools)}
+        pages.sort(key=lambda item: (order[item[0]], item[1]))
+        pool_data = [(address, pool) for pool, _, addresses in pages for address in addresses]
+        return pd.DataFrame(pool_data, columns=['txHash', 'pool'])
+
+
+def crawl_pools(pools, hostConcurrency = CRAWLER_HOST_CONCURRENCY, minInterval = CRAWLER_MIN_INTERVAL_SECONDS):
+    """Crawl concurrently the addresses pages of the pools (blocking, runs its own event loop)
+    @param pools : dictionary pool name -> url of the first addresses page of the pool
+    @param [optional] hostConcurrency : max concurrent requests to a host
+    @param [optional] minInterval : min seconds between two requests to a host
+    @return dataframe with txHash and pool columns
+    """
+    with instrumentation.span('crawl pools', pools=len(pools)) as span:
+        df_pools = asyncio.run(AsyncCrawler(hostConcurrency, minInterval).collect(pools))
+        span.set(addresses=len(df_pools))
+    log(('debug', 'all infos', 'results'), "Crawled {} addresses of {} pools", len(df_pools), len(pools))
+    return df_pools
@@ -0,0 +1,124 @@
+import threading
+from contextlib import contextmanager
+import instrumentation
+from instrumentation import log
+
+# Bounded pool of reusable Selenium drivers:
+# at most `size` browsers are alive at the same time, a driver is leased for a page and then
+# returned to the pool (the start-up of the browser is paid once per driver, not once per page).
+# A driver is checked before every lease (a crashed browser is replaced) and recycled
+# (quit and replaced at the next lease) after maxPages pages, so the memory of the browsers
+# stays flat also in long crawls.
+
+
+class _PooledDriver:
+    """Driver of the pool with the pages served by it"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+
+
+class DriverPool:
+    """Fixed size pool of Selenium drivers with lease / return semantics"""
+
+    def __init__(self, factory, size, maxPages):
+        """
+        @param factory : function without params that starts a new driver (ex. scraper.setup_selenium_driver)
+        @param size : max number of drivers alive at the same time
+        @param maxPages : pages served by a driver before it is recycled
+        """
+        if size <= 0:
+            raise ValueError(f"driver pool size must be positive, got {size}")
+        self.factory = factory
+        self.size = size
+        self.maxPages = maxPages
+        self.idle = []
+        self.alive = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def _quit(self, pooled):
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            log('debug', "error quitting a pooled driver:\n{}", e)
+
+    def _is_healthy(self, pooled):
+        """Health check: the browser answers (not crashed / session not lost)"""
+        try:
+            pooled.driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def _acquire(self):
+        with self.condition:
+            while True:
+                if self.closed:
+                    raise RuntimeError("driver pool is closed")
+                if self.idle:
+                    pooled = self.idle.pop()
+                    break
+                if self.alive < self.size:
+                    self.alive += 1
+                    pooled = None
+                    break
+                self.condition.wait()
+
+        if pooled is not None and not self._is_healthy(pooled):
+            instrumentation.count('selenium drivers replaced')
+            self._quit(pooled)
+            pooled = None
+        if pooled is None:
+            try:
+                pooled = _PooledDriver(self.factory())
+            except BaseException:
+                with self.condition:
+                    self.alive -= 1
+                    self.condition.notify()
+                raise
+        return pooled
+
+    def _release(self, pooled, failed):
+        pooled.pages += 1
+        discard = pooled.pages >= self.maxPages or (failed and not self._is_healthy(pooled))
+        if discard:
+            instrumentation.count('selenium drivers recycled')
+            self._quit(pooled)
+        with self.condition:
+            if discard or self.closed:
+                self.alive -= 1
+            else:
+                self.idle.append(pooled)
+            self.condition.notify()
+        if self.closed and not discard:
+            self._quit(pooled)
+
+    @contextmanager
+    def lease(self):
+        """Lease a driver for a page (with pool.lease() as driver: ...),
+        waiting if all the drivers are leased
+        @no params
+        @return context manager of a Selenium driver
+        """
+        pooled = self._acquire()
+        failed = True
+        try:
+            yield pooled.driver
+            failed = False
+        finally:
+            self._release(pooled, failed)
+
+    def close(self):
+        """Quit all the idle drivers (the leased ones are quit when returned)
+        @no params
+        @no return
+        """
+        with self.condition:
+            self.closed = True
+            idle, self.idle = self.idle, []
+            self.alive -= len(idle)
+            self.condition.notify_all()
+        for pooled in idle:
+            self._quit(pooled)
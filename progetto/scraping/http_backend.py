@@ -0,0 +1,212 @@
+import re
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup as bs
+from fake_useragent import UserAgent
+from utilities import SETTINGS
+import instrumentation
+from instrumentation import log
+from scraping.response_cache import RESPONSE_CACHE
+
+# Browser-free scraping of WalletExplorer:
+# the pages read by the Selenium path (paging info of the addresses pages, addresses tables,
+# inputs / outputs tables of the transaction pages) are fetched by a pooled HTTP session
+# (keep-alive connections shared by the threads) and parsed from the HTML with BeautifulSoup.
+# A page costs a request of a few KB instead of the start-up of a headless Chrome.
+# The pages are served by the persistent http cache when possible (see response_cache).
+
+BASE_LINK = "https://www.walletexplorer.com"
+MAX_THREAD_QUANTITY = SETTINGS['MAX_THREAD_QUANTITY']
+HTTP_TIMEOUT = SETTINGS['HTTP_TIMEOUT_SECONDS']
+HTTP_MAX_ATTEMPTS = SETTINGS['HTTP_MAX_ATTEMPTS']
+HTTP_BACKOFF_SECONDS = 2 # wait before the first retry, doubled at every retry
+PAGING_PATTERN = re.compile(r'Page 1 / (\d+)')
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class PageError(Exception):
+    def __init__(self, message, url):
+        super().__init__(message)
+        self.url = url
+
+    def __str__(self):
+        return f"{self.url}: {self.args[0]}"
+
+def get_session():
+    """Return the pooled HTTP session (created at the first call, shared by all the threads)
+    @no params
+    @return requests.Session
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_THREAD_QUANTITY)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update({
+                'User-Agent': UserAgent().random,
+                'accept': "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+                'accept-language': "en-US,en;q=0.9,it-IT;q=0.8,it;q=0.7",
+                'referer': BASE_LINK,
+            })
+            _session = session
+        return _session
+
+def is_cached(url):
+    """Check if a page is served by the http cache without requests
+    @param url : url of the page
+    @return boolean
+    """
+    return RESPONSE_CACHE.is_fresh(url)
+
+def fetch_page(url, parse = None):
+    """Fetch the HTML of a page by the http cache or by the pooled session (see download_page)
+    @param url : url of the page
+    @param [optional] parse : function HTML -> parsed page, raising on an unexpected page (not stored in the http cache)
+    @return HTML text of the page (parsed by parse if given)
+    """
+    return RESPONSE_CACHE.fetch(url, download_page, parse=parse)
+
+def download_page(url, headers = None):
+    """Download a page, retrying (with exponential backoff) the rate limited / failed responses
+    @param url : url of the page
+    @param [optional] headers : additional headers of the request (ex. conditional headers of the http cache)
+    @return status code (2xx or 304), HTML text and headers of the response
+    """
+    session = get_session()
+    wait = HTTP_BACKOFF_SECONDS
+    for attempt in range(1, HTTP_MAX_ATTEMPTS + 1):
+        try:
+            response = session.get(url, headers=headers, timeout=HTTP_TIMEOUT)
+            instrumentation.count('http requests')
+            if response.status_code == 304:
+                return response.status_code, response.text, response.headers
+            if 200 <= response.status_code <= 299 and not response.text.startswith("Too"):
+                instrumentation.count('pages fetched')
+                return response.status_code, response.text, response.headers
+            error = f"response status code = {response.status_code}"
+        except requests.RequestException as e:
+            instrumentation.count('http requests')
+            error = str(e)
+
+        log('debug', "Unsuccessful response for {} in attempt {}/{} - {}", url, attempt, HTTP_MAX_ATTEMPTS, error)
+        if attempt < HTTP_MAX_ATTEMPTS:
+            instrumentation.count('http retries')
+            time.sleep(wait)
+            wait *= 2
+    raise PageError(f"page not fetched in {HTTP_MAX_ATTEMPTS} attempts ({error})", url)
+
+def _table_rows(table):
+    """Rows of a table (not the rows of the nested tables), with or without tbody"""
+    body = table.find('tbody', recursive=False) or table
+    return body.find_all('tr', recursive=False)
+
+def _link_text(a_tag):
+    """Transaction id of a link to a transaction page, otherwise the text of the link (address / wallet)"""
+    href = a_tag.get('href', '')
+    if '/txid/' in href:
+        return href.split('/txid/')[1]
+    return a_tag.get_text(strip=True)
+
+def parse_number_of_pages(html):
+    """Number of pages of an addresses page ('Page 1 / N' in the paging info)
+    @param html : HTML of the first addresses page
+    @return number of pages (1 if the paging info is missing)
+    """
+    soup = bs(html, 'html.parser')
+    main = soup.find(id='main') or soup
+    match = PAGING_PATTERN.search(main.get_text(" "))
+    return int(match.group(1)) if match else 1
+
+def parse_wallet_addresses(html):
+    """Addresses of the table of an addresses page
+    @param html : HTML of the page
+    @return list of addresses
+    """
+    table = bs(html, 'html.parser').find('table')
+    if table is None:
+        return []
+    addresses = []
+    for tr in table.find_all('tr'):
+        td = tr.find('td')
+        if td and td.a and td.a.get('href'):
+            addresses.append(td.a['href'].split("/")[-1])
+    return addresses
+
+def parse_tx_node(html, txId, isCoinbase = False):
+    """Transaction node (txId, inputs, outputs) of a transaction page
+    @param html : HTML of the transaction page
+    @param txId : transaction hash (or hash prefix) requested
+    @param [optional] isCoinbase : True for a coinbase transaction (the inputs are the texts of the cells)
+    @return dictionary with txId, inputs and outputs keys
+    """
+    tx_node = {'txId': txId, 'inputs': [], 'outputs': []}
+    soup = bs(html, 'html.parser')
+    infoTable = soup.find('table', class_='info')
+    if infoTable is None:
+        raise PageError("transaction info table not found", txId)
+    infoRows = _table_rows(infoTable)
+    if infoRows and infoRows[0].find('td'):
+        tx_node['txId'] = infoRows[0].find('td').get_text(strip=True)
+
+    # tabella con gli input (prima cella) e gli output (seconda cella) della seconda riga
+    txTable = infoTable.find_next_sibling('table')
+    txRows = _table_rows(txTable) if txTable is not None else []
+    if len(txRows) < 2:
+        raise PageError("transaction inputs / outputs table not found", txId)
+    cells = txRows[1].find_all('td', recursive=False)
+    raw_inputs, raw_outputs = cells[0].find('table'), cells[1].find('table')
+
+    for tr in _table_rows(raw_inputs) if raw_inputs is not None else []:
+        if isCoinbase:
+            td = tr.find('td')
+            if td is not None:
+                tx_node['inputs'].append(td.get_text(strip=True))
+            continue
+        small = tr.find(class_='small')
+        if small is not None and small.a is not None:
+            tx_node['inputs'].append(_link_text(small.a))
+
+    for tr in _table_rows(raw_outputs) if raw_outputs is not None else []:
+        small = tr.find(class_='small')
+        if small is None:
+            continue
+        if small.a is None:
+            if 'unspent' in small.get_text():
+                log(('debug', 'all infos'), "unspent tx -> skip it")
+            continue
+        tx_node['outputs'].append(_link_text(small.a))
+    return tx_node
+
+def get_number_of_pages(url):
+    """Number of addresses pages of a pool (by HTTP)
+    @param url : url of the first addresses page of a pool
+    @return quantity of addresses pages of the pool
+    """
+    num_pages = parse_number_of_pages(fetch_page(url))
+    log(('debug', 'all infos', 'processing'), "Found {} pages to process", num_pages)
+    return num_pages
+
+def get_addresses_from_page(url, page_number):
+    """Addresses of a page of the addresses pages of a pool (by HTTP)
+    @param url : url of the first addresses page of a pool
+    @param page_number : number of the page
+    @return addresses found in the page
+    """
+    page_url = f"{url}?page={page_number}" if page_number != 1 else url
+    log(('debug', 'all infos', 'processing'), "processing page {}", page_number)
+    return parse_wallet_addresses(fetch_page(page_url))
+
+def get_tx_node(txId, isCoinbase = False):
+    """Transaction node of a transaction (by HTTP)
+    @param txId : transaction hash (a hash prefix is resolved by the search of WalletExplorer)
+    @param [optional] isCoinbase : True for a coinbase transaction
+    @return dictionary with txId, inputs and outputs keys
+    """
+    url = f"{BASE_LINK}/?q={txId}" if isCoinbase else f"{BASE_LINK}/txid/{txId}"
+    return fetch_page(url, lambda html: parse_tx_node(html, txId, isCoinbase))
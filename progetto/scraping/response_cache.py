@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from utilities import SETTINGS
+import instrumentation
+from instrumentation import log
+
+# Persistent cache of the HTTP responses of the scraper (WalletExplorer pages, proxies list):
+# •entries/<sha256 of the normalized url>.json : url, fetch time, ETag / Last-Modified, hash of the body
+# •bodies/<sha256 of the body> : body of the response (content addressed, equal pages are stored once)
+# A fresh entry (younger than the TTL) is served without requests, a stale entry is revalidated
+# by a conditional request (If-None-Match / If-Modified-Since, 304 = body still valid).
+# A downloaded page is stored only if its parser accepts it (a 2xx "not found" or search page is not cached).
+# In 'offline' mode the responses are served only by the cache (also if stale) and a missing
+# page raises CacheMiss: the scraper can be replayed, tested and benchmarked without network.
+
+HTTP_CACHE_MODES = ('online', 'offline', 'disabled')
+HTTP_CACHE_MODE = SETTINGS['HTTP_CACHE_MODE']
+HTTP_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), SETTINGS['HTTP_CACHE_DIR'])
+HTTP_CACHE_TTL_SECONDS = SETTINGS['HTTP_CACHE_TTL_SECONDS']
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+class CacheMiss(Exception):
+    def __init__(self, message, url):
+        super().__init__(message)
+        self.url = url
+
+    def __str__(self):
+        return f"{self.url}: {self.args[0]}"
+
+def normalize_url(url):
+    """Normalized url (key of the cache): lowercase scheme and host, no default port,
+    no fragment, query parameters sorted
+    @param url : url
+    @return normalized url
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port is not None and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or '/', query, ''))
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+def _write_atomic(path, data):
+    """Write a file by a temporary file + rename (readers never see a partial file)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmpPath = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        os.replace(tmpPath, path)
+    except BaseException:
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+        raise
+
+
+class ResponseCache:
+    """Content addressed on-disk cache of HTTP responses"""
+
+    def __init__(self, cacheDir = HTTP_CACHE_DIR, ttl = HTTP_CACHE_TTL_SECONDS, mode = HTTP_CACHE_MODE):
+        """
+        @param [optional] cacheDir : directory of the cache
+        @param [optional] ttl : seconds after which an entry is revalidated
+        @param [optional] mode : 'online' (cache + requests), 'offline' (only the cache) or 'disabled' (only requests)
+        """
+        if mode not in HTTP_CACHE_MODES:
+            raise ValueError(f"unknown http cache mode {mode}, valid modes : {HTTP_CACHE_MODES}")
+        self.cacheDir = cacheDir
+        self.ttl = ttl
+        self.mode = mode
+
+    def _entry_path(self, url):
+        return os.path.join(self.cacheDir, "entries", f"{_sha256(normalize_url(url).encode())}.json")
+
+    def _body_path(self, bodyHash):
+        return os.path.join(self.cacheDir, "bodies", bodyHash[:2], bodyHash)
+
+    def lookup(self, url):
+        """Entry of a url (None if missing or unreadable)
+        @param url : url
+        @return dictionary with url, fetched, etag, lastModified and body keys
+        """
+        try:
+            with open(self._entry_path(url), "r") as entryFile:
+                entry = json.load(entryFile)
+            with open(self._body_path(entry['bodyHash']), "rb") as bodyFile:
+                entry['body'] = bodyFile.read().decode('utf8')
+            return entry
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def is_fresh(self, url, ttl = None):
+        """Check if a url is served by the cache without requests (fresh entry, or any entry in offline mode)
+        @param url : url
+        @param [optional] ttl : seconds of validity of the entry (default = TTL of the cache)
+        @return boolean
+        """
+        if self.mode == 'disabled':
+            return False
+        entry_path = self._entry_path(url)
+        if not os.path.exists(entry_path):
+            return False
+        ttl = self.ttl if ttl is None else ttl
+        return self.mode == 'offline' or time.time() - os.path.getmtime(entry_path) < ttl
+
+    def store(self, url, body, headers = None):
+        """Store the body of a successful response
+        @param url : url
+        @param body : text of the response
+        @param [optional] headers : headers of the response (ETag / Last-Modified are kept for the revalidation)
+        @no return
+        """
+        data = body.encode('utf8')
+        bodyHash = _sha256(data)
+        body_path = self._body_path(bodyHash)
+        if not os.path.exists(body_path):
+            _write_atomic(body_path, data)
+        headers = headers or {}
+        entry = {
+            'url': normalize_url(url),
+            'fetched': time.time(),
+            'etag': headers.get('ETag'),
+            'lastModified': headers.get('Last-Modified'),
+            'bodyHash': bodyHash,
+        }
+        _write_atomic(self._entry_path(url), json.dumps(entry).encode('utf8'))
+        instrumentation.count('http cache stores')
+
+    def _touch(self, url, entry):
+        entry = {key: value for key, value in entry.items() if key != 'body'}
+        entry['fetched'] = time.time()
+        _write_atomic(self._entry_path(url), json.dumps(entry).encode('utf8'))
+
+    def fetch(self, url, download, ttl = None, parse = None):
+        """Body of a url by the cache, downloaded (and stored) if missing, revalidated if stale
+        @param url : url
+        @param download : function (url, conditional headers) -> (status code, text, headers) of a
+                          successful or not modified (304) response (it raises on errors)
+        @param [optional] ttl : seconds of validity of the entry (default = TTL of the cache)
+        @param [optional] parse : function text -> parsed page, raising on an unexpected page
+                                  (a downloaded page is stored only if it is parsed without errors)
+        @return text of the response (parsed by parse if given)
+        """
+        parse = parse or (lambda text: text)
+        if self.mode == 'disabled':
+            return parse(download(url, {})[1])
+
+        entry = self.lookup(url)
+        ttl = self.ttl if ttl is None else ttl
+        if entry is not None and (self.mode == 'offline' or time.time() - entry['fetched'] < ttl):
+            instrumentation.count('http cache hits')
+            return parse(entry['body'])
+        if self.mode == 'offline':
+            instrumentation.count('http cache misses')
+            raise CacheMiss("page not in the http cache (offline replay)", url)
+
+        conditional = {}
+        if entry is not None:
+            if entry.get('etag'):
+                conditional['If-None-Match'] = entry['etag']
+            if entry.get('lastModified'):
+                conditional['If-Modified-Since'] = entry['lastModified']
+        status, text, headers = download(url, conditional)
+        if status == 304 and entry is not None:
+            instrumentation.count('http cache revalidated')
+            log('debug', "http cache : {} not modified", url)
+            self._touch(url, entry)
+            return parse(entry['body'])
+        instrumentation.count('http cache misses')
+        try:
+            parsed = parse(text)
+        except Exception:
+            # pagine 2xx inattese (ex. pagina "not found" o di ricerca) : non finiscono nella cache
+            instrumentation.count('http cache rejected')
+            raise
+        self.store(url, text, headers)
+        return parsed
+
+RESPONSE_CACHE = ResponseCache()
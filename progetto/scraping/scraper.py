@@ -11,18 +11,44 @@ import sys
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from fake_useragent import UserAgent
 from urllib.request import Request, urlopen
+from urllib.error import HTTPError
 import random 
 
 # Aggiunge la directory contenente utilities.py al percorso di ricerca dei moduli
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from utilities import LOG_LEVELS, SETTINGS
+import instrumentation
+from instrumentation import log
+from scraping import http_backend
+from scraping import async_crawler
+from scraping.driver_pool import DriverPool
+from scraping.taint_frontier import TaintFrontier
+from scraping.taint_journal import TaintJournal
+from scraping.response_cache import RESPONSE_CACHE
+import atexit
 
 HEADLESS_MODE = SETTINGS['SELENIUM_HEADLESS_MODE']
+SCRAPING_BACKENDS = ('http', 'selenium')
+SCRAPING_BACKEND = SETTINGS['SCRAPING_BACKEND']
 BASE_LINK = "https://www.walletexplorer.com"
 MAX_THREAD_QUANTITY = SETTINGS['MAX_THREAD_QUANTITY']
+SELENIUM_POOL_SIZE = SETTINGS['SELENIUM_POOL_SIZE']
+SELENIUM_DRIVER_MAX_PAGES = SETTINGS['SELENIUM_DRIVER_MAX_PAGES']
+TAINT_MAX_NODES = SETTINGS['TAINT_MAX_NODES']
+TAINT_JOURNAL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), SETTINGS['TAINT_JOURNAL_PATH'])
+TAINT_RESUME = SETTINGS['TAINT_RESUME']
+PROXIES_CACHE_TTL_SECONDS = SETTINGS['PROXIES_CACHE_TTL_SECONDS']
+SSLPROXIES_LINK = 'https://www.sslproxies.org/'
 
 ELIGIUS_COINBASE_TX = 'c82c10925cc3890f1299'
 
+POOL_ADDRESSES_LINKS = { # first addresses page of every mining pool
+    'Eligius' : f"{BASE_LINK}/wallet/Eligius.st/addresses",
+    'DeepBit' : f"{BASE_LINK}/wallet/DeepBit.net/addresses",
+    'BitMinter' : f"{BASE_LINK}/wallet/BitMinter.com/addresses",
+    'BTCGuild' : f"{BASE_LINK}/wallet/BTCGuild.com/addresses",
+}
+
 sslproxies_infos = {
     'last search time': None,
     'sslproxies' : []
@@ -76,7 +102,8 @@ class RequestError(Exception):
 def generate_proxies(forceNew = False): 
     """generate and return (free) proxies by sslproxies.org if 
     the last request made to sslproxies is at least 3 seconds ago, 
-    otherwise it returns the last generated proxies
+    otherwise it returns the last generated proxies.
+    The proxies page is kept in the http cache for PROXIES_CACHE_TTL_SECONDS (see response_cache)
     
     @param forceNew : if True the function will request new proxies to sslproxies.org
     @return : proxies list with ip & port for every proxy
@@ -85,10 +112,7 @@ def generate_proxies(forceNew = False):
     lastReqTime = sslproxies_infos['last search time']
     
     if forceNew or (lastReqTime is None or time.time() - lastReqTime > 3):
-        user_agent = getRandomUserAgent()
-        proxies_req = Request('https://www.sslproxies.org/')
-        proxies_req.add_header('User-Agent', user_agent)
-        proxies_doc = urlopen(proxies_req).read().decode('utf8')
+        proxies_doc = RESPONSE_CACHE.fetch(SSLPROXIES_LINK, download_proxies_page, ttl=0 if forceNew else PROXIES_CACHE_TTL_SECONDS)
         soup = bs(proxies_doc, 'html.parser')
         proxies_table = soup.find('table', class_='table table-striped table-bordered')        
         
@@ -105,6 +129,25 @@ def generate_proxies(forceNew = False):
   
     return proxies
 
+def download_proxies_page(url, conditionalHeaders = None):
+    """Download the proxies page of sslproxies.org
+    @param url : url of the page
+    @param [optional] conditionalHeaders : conditional headers of the http cache
+    @return : status code (2xx or 304), HTML text and headers of the response
+    """
+    proxies_req = Request(url)
+    proxies_req.add_header('User-Agent', getRandomUserAgent())
+    for name, value in (conditionalHeaders or {}).items():
+        proxies_req.add_header(name, value)
+    try:
+        response = urlopen(proxies_req)
+    except HTTPError as e:
+        if e.code == 304:
+            return e.code, '', e.headers
+        raise
+    instrumentation.count('http requests')
+    return response.status, response.read().decode('utf8'), response.headers
+
 def getRandomUserAgent():
     """generate and return a random user agent
     @no params
@@ -167,82 +210,80 @@ def getRequestUtils(specific = False):
     
     return headers, proxies
               
-def getWalletAddresses(url):  
-    """Get wallet addresses associated to a pool by the WalletExplorer's url. 
+def download_wallet_addresses_page(url, conditionalHeaders = None):
+    """Download an addresses page of WalletExplorer by a random proxy (up to 20 attempts)
     
     @params : url : url of the WalletExplorer address page of a pool.
+    @params : [optional] conditionalHeaders : conditional headers of the http cache
 
-    @return : list of addresses associated to the pool
+    @return : status code (2xx or 304), HTML text and headers of the response
     """
-    
-    startT = time.time()
-    
-    if LOG_LEVELS['time']:
-        print("get wallet addresses started")
-        
-    if LOG_LEVELS['all infos'] or LOG_LEVELS['debug']:
-        print(f"going to get wallet addresses with url {url}") 
-         
+    conditionalHeaders = conditionalHeaders or {}
     headers, proxies = getRequestUtils()
+    headers.update(conditionalHeaders)
     
-    addresses = [] 
-    
-  
     time.sleep(0.75)
-    timeBeforeRequest = time.time()
-    response = requests.get(url,headers=headers, proxies=random.choice(proxies)) 
-    if LOG_LEVELS['time']:
-        print(f"request time = {time.time()-timeBeforeRequest} seconds")
+    with instrumentation.span('wallet addresses request'):
+        response = requests.get(url,headers=headers, proxies=random.choice(proxies)) 
+    instrumentation.count('http requests')
     attempt = 0
-    while attempt < 20 and (response.text.startswith("Too") or response.status_code < 200 or response.status_code > 299):
+    while attempt < 20 and response.status_code != 304 and (response.text.startswith("Too") or response.status_code < 200 or response.status_code > 299):
         attempt+= 1
-        if LOG_LEVELS['debug']:
-            print(f"Unsuccessful response in attempt {attempt}/15 - response status code = {response.status_code}")
+        log('debug', "Unsuccessful response in attempt {}/20 - response status code = {}", attempt, response.status_code)
         
         new_headers, new_proxies = getRequestUtils(specific=True)
+        new_headers.update(conditionalHeaders)
         chosenProxy = random.choice(new_proxies)
         time.sleep(5)
         response = requests.get(url, proxies=chosenProxy, headers=new_headers)        
+        instrumentation.count('http requests')
+        instrumentation.count('http retries')
         
         
         if attempt == 20:
-            if LOG_LEVELS['debug']:
-                print(f'unsuccessful response:\n{response}\nTxt:\n{response.text}')
+            log('debug', 'unsuccessful response:\n{}\nTxt:\n{}', response, response.text)
             raise RequestError(f'Error in get wallet address request\nresponse status = {response.status_code}\nsession headers = {new_headers}\nchosen proxy = {chosenProxy}', response.status_code)
                 
 
+    if response.status_code != 304:
+        instrumentation.count('pages fetched')
+    return response.status_code, response.text, response.headers
 
-    html_content = response.text
-    soup = bs(html_content,'html.parser')
+def getWalletAddresses(url):  
+    """Get wallet addresses associated to a pool by the WalletExplorer's url. 
     
-    table = soup.find('table') 
-    if table:
-        trs = table.findAll('tr')
-        
-        if not LOG_LEVELS['reduce spam'] and ( LOG_LEVELS['all infos'] or LOG_LEVELS['debug']):
-            print(f"going to process {len(trs)} table rows")  
-    
-        i = 0
-        for tr in trs:
-            if not LOG_LEVELS['reduce spam'] and (LOG_LEVELS['all infos'] or LOG_LEVELS['debug'] or LOG_LEVELS['processing']):
-                print(f"processing row {i+1}/{len(trs)}") 
-            i+=1
-            td = tr.find('td')  # Find the first td element
-            
-            
-            if td and td.a:  # Check if td and td.a exist
-                href = td.a['href']
-                address = href.split("/")[-1]
-                addresses.append(address)  # Use append instead of push
-                if not LOG_LEVELS['reduce spam'] and (LOG_LEVELS['all infos'] or LOG_LEVELS['debug'] or LOG_LEVELS['processing']):
-                    print(f"-> found  wallet : {address}") 
-      
-    if LOG_LEVELS['all infos'] or LOG_LEVELS['debug'] or LOG_LEVELS['results']:
-        print(f"Found {len(addresses)} wallets") 
+    @params : url : url of the WalletExplorer address page of a pool.
+
+    @return : list of addresses associated to the pool
+    """
     
-    if LOG_LEVELS['time']:
-        print(f"get wallet addresses ended in {time.time()-startT} seconds")
+    log('time', "get wallet addresses started")
+    log(('all infos', 'debug'), "going to get wallet addresses with url {}", url)
+    
+    with instrumentation.span('get wallet addresses', url=url) as span:
+        addresses = [] 
+        
+        html_content = RESPONSE_CACHE.fetch(url, download_wallet_addresses_page)
+        soup = bs(html_content,'html.parser')
         
+        table = soup.find('table') 
+        if table:
+            trs = table.findAll('tr')
+            log(('all infos', 'debug'), "going to process {} table rows", len(trs), spam=True)
+            
+            for i, tr in enumerate(trs):
+                log(('all infos', 'debug', 'processing'), "processing row {}/{}", i+1, len(trs), spam=True)
+                td = tr.find('td')  # Find the first td element
+                
+                
+                if td and td.a:  # Check if td and td.a exist
+                    href = td.a['href']
+                    address = href.split("/")[-1]
+                    addresses.append(address)  # Use append instead of push
+                    log(('all infos', 'debug', 'processing'), "-> found  wallet : {}", address, spam=True)
+        span.set(addresses=len(addresses))
+          
+    log(('all infos', 'debug', 'results'), "Found {} wallets", len(addresses))
     return addresses
 
 def getWalletAddress_multiplePages(url):
@@ -252,35 +293,26 @@ def getWalletAddress_multiplePages(url):
     """
     
       
-    startT = time.time()
-    if LOG_LEVELS['time']:
-        print("get wallet addresses (with Selenium) started")
-    driver = setup_selenium_driver()
-    num_pages = get_number_of_pages(driver, url)
-    driver.quit()
-    
-    addresses = []
-    
-    for page_number in range(num_pages+1):
-        if LOG_LEVELS['debug'] or LOG_LEVELS['all infos'] or LOG_LEVELS['processing']:
-            print(f"processing page {page_number}")
-            
-
-        if page_number != 1:
-            page_url = f"{url}?page={page_number}"
-        else:
-            page_url = url
-                    
-        curent_addresses = getWalletAddresses(page_url)
-        addresses += curent_addresses
+    log('time', "get wallet addresses (with multiple pages) started")
+    with instrumentation.span('get wallet addresses (with multiple pages)', url=url) as span:
+        num_pages = get_pages_quantity(url)
+        
+        addresses = []
+        
+        for page_number in range(num_pages+1):
+            log(('debug', 'all infos', 'processing'), "processing page {}", page_number)
                 
-   
+
+            if page_number != 1:
+                page_url = f"{url}?page={page_number}"
+            else:
+                page_url = url
+                        
+            curent_addresses = getWalletAddresses(page_url)
+            addresses += curent_addresses
+        span.set(pages=num_pages, addresses=len(addresses))
             
-    if LOG_LEVELS['debug'] or LOG_LEVELS['all infos'] or LOG_LEVELS['results']:
-        print(f"Processed {num_pages} pages and found {len(addresses)} addresses")
-    
-    if LOG_LEVELS['time']:
-        print(f"get wallet addresses (with multiple pages) ended in {time.time()-startT} seconds")
+    log(('debug', 'all infos', 'results'), "Processed {} pages and found {} addresses", num_pages, len(addresses))
     return addresses
   
 def setup_selenium_driver():
@@ -293,11 +325,41 @@ def setup_selenium_driver():
     options = Options()
     if HEADLESS_MODE:
         options.add_argument('--headless=new')
-        if LOG_LEVELS['debug'] or LOG_LEVELS['all infos']:
-            print("Using Selenium in headless mode...")
-    driver = webdriver.Chrome(options=options)
+        log(('debug', 'all infos'), "Using Selenium in headless mode...")
+    with instrumentation.span('selenium driver setup', logLevels=()):
+        driver = webdriver.Chrome(options=options)
+    instrumentation.count('selenium drivers')
     return driver
 
+# drivers Selenium condivisi (taint analysis, pagine degli indirizzi e numero di pagine):
+# al massimo SELENIUM_POOL_SIZE browser aperti, riciclati ogni SELENIUM_DRIVER_MAX_PAGES pagine
+DRIVER_POOL = DriverPool(setup_selenium_driver, SELENIUM_POOL_SIZE, SELENIUM_DRIVER_MAX_PAGES)
+atexit.register(DRIVER_POOL.close)
+
+def check_backend(backend):
+    """Check the name of a scraping backend
+    @param backend : 'http' or 'selenium'
+    @no return
+    """
+    if backend not in SCRAPING_BACKENDS:
+        raise ValueError(f"unknown scraping backend {backend}, valid backends : {SCRAPING_BACKENDS}")
+
+def get_pages_quantity(url, backend = SCRAPING_BACKEND):
+    """Finds and returns the number of pages associated to a pool, 
+    by a plain HTTP request (http backend) or by a Selenium driver (selenium backend)
+    
+    @params : url : url of the first addresses page of a pool
+    @params : [optional] backend : 'http' or 'selenium', default = SCRAPING_BACKEND
+
+    @return : quantity of addresses pages of the pool
+    """
+    check_backend(backend)
+    if backend == 'http':
+        return http_backend.get_number_of_pages(url)
+    
+    with DRIVER_POOL.lease() as driver:
+        return get_number_of_pages(driver, url)
+
 def get_number_of_pages(driver, url):
     """Finds and returns the number of pages associated to a pool.
     
@@ -308,6 +370,7 @@ def get_number_of_pages(driver, url):
     """
     
     driver.get(url)
+    instrumentation.count('selenium pages fetched')
     time.sleep(2)
     
     paging_info = driver.find_elements(By.XPATH, '//*[@id="main"]/div[1]')[0]
@@ -316,8 +379,7 @@ def get_number_of_pages(driver, url):
     match = re.search(r'Page 1 / (\d+)', page_text)
     if match:
         num_pages = int(match.group(1))
-        if LOG_LEVELS['debug'] or LOG_LEVELS['all infos'] or LOG_LEVELS['processing']:
-            print(f"Found {num_pages} pages to process")
+        log(('debug', 'all infos', 'processing'), "Found {} pages to process", num_pages)
     else:
         num_pages = 1  # Default to 1 if the number of pages cannot be found
     
@@ -341,9 +403,9 @@ def get_addresses_from_page(driver, url, page_number):
             time.sleep(0.2)
         else:
             driver.get(url)
+        instrumentation.count('selenium pages fetched')
         
-        if LOG_LEVELS['debug'] or LOG_LEVELS['all infos'] or LOG_LEVELS['processing']:
-            print(f"processing page {page_number}")
+        log(('debug', 'all infos', 'processing'), "processing page {}", page_number)
             
         table = driver.find_element(By.TAG_NAME, 'table')
         trs = table.find_elements(By.TAG_NAME, 'tr')
@@ -358,24 +420,55 @@ def get_addresses_from_page(driver, url, page_number):
                         href = a_tag.get_attribute('href')
                         address = href.split("/")[-1]
                         addresses.append(address)
-                        if not LOG_LEVELS['reduce spam'] and (LOG_LEVELS['debug'] or LOG_LEVELS['all infos'] or LOG_LEVELS['processing']):
-                            print(f"-> found address {address}")
+                        log(('debug', 'all infos', 'processing'), "-> found address {}", address, spam=True)
 
                 except Exception as e:
-                    if LOG_LEVELS['debug'] or LOG_LEVELS['all infos'] or LOG_LEVELS['processing']:
-                        print(f"address {i} is not a standard address -> skipped")
-                        
-                    if LOG_LEVELS['debug']:
-                        print(f"error:\n{e}")
+                    log(('debug', 'all infos', 'processing'), "address {} is not a standard address -> skipped", i)
+                    log('debug', "error:\n{}", e)
 
                     continue
     except Exception as e:
-        if LOG_LEVELS['debug']:
-            print(f"error in get address from page:\n{e}")
+        instrumentation.count('page errors')
+        log('debug', "error in get address from page:\n{}", e)
     
     finally:
         return addresses
 
+def get_W_addresses(url, backend = SCRAPING_BACKEND):
+    """Finds and returns all the wallet addresses associated to a pool by the selected backend.
+    
+    @params : url : url of the first page of addresses of a pool
+    @params : [optional] backend : 'http' (pooled HTTP session) or 'selenium' (headless Chrome), default = SCRAPING_BACKEND
+
+    @return : all wallet addresses found for the pool
+    """
+    check_backend(backend)
+    if backend == 'http':
+        return get_W_addresses_http(url)
+    return get_W_addresses_Selenium(url)
+
+@instrumentation.traced('get wallet addresses (with HTTP)')
+def get_W_addresses_http(url):
+    """Finds and returns all the wallet addresses associated to a pool, 
+    fetching the pages in parallel by the pooled HTTP session (no browser).
+    
+    @params : url : url of the first page of addresses of a pool
+
+    @return : all wallet addresses found for the pool
+    """
+    log('time', "get wallet addresses (with HTTP) started")
+    num_pages = http_backend.get_number_of_pages(url)
+    max_t_quantity = min(MAX_THREAD_QUANTITY, num_pages)
+    
+    # pagine raccolte in ordine di numero di pagina
+    with ThreadPoolExecutor(max_workers=max_t_quantity) as executor:
+        pages = executor.map(lambda page: http_backend.get_addresses_from_page(url, page), range(1, num_pages + 1))
+        addresses = [address for page_addresses in pages for address in page_addresses]
+    
+    log(('debug', 'all infos', 'results'), "Processed {} pages and found {} addresses", num_pages, len(addresses))
+    return addresses
+
+@instrumentation.traced('get wallet addresses (with Selenium)')
 def get_W_addresses_Selenium(url):
     """Finds and returns all the wallet addresses associated to a pool.
     
@@ -384,25 +477,20 @@ def get_W_addresses_Selenium(url):
     @return : all wallet addresses found for the pool
     """
     
-    startT = time.time()
-    if LOG_LEVELS['time']:
-        print("get wallet addresses (with Selenium) started")
-    driver = setup_selenium_driver()
-    num_pages = get_number_of_pages(driver, url)
-    driver.quit()
+    log('time', "get wallet addresses (with Selenium) started")
+    num_pages = get_pages_quantity(url, 'selenium')
     
-    # Imposta MAX_THREAD_QUANTITY a num_pages se è maggiore
-    max_t_quantity = min(MAX_THREAD_QUANTITY, num_pages)
+    # Imposta MAX_THREAD_QUANTITY a num_pages se è maggiore (e non oltre i driver del pool)
+    max_t_quantity = min(MAX_THREAD_QUANTITY, SELENIUM_POOL_SIZE, num_pages)
     addresses = []
     
     def process_pages(start_page, end_page): #processa le pagine da start_page a end_page
-        local_driver = setup_selenium_driver()
         local_addresses = []
         for page in range(start_page, end_page + 1):
-            curent_addresses = get_addresses_from_page(local_driver, url, page)
+            with DRIVER_POOL.lease() as driver:
+                curent_addresses = get_addresses_from_page(driver, url, page)
             local_addresses += curent_addresses
         
-        local_driver.quit()
         return local_addresses
     
     with ThreadPoolExecutor(max_workers=max_t_quantity) as executor:
@@ -411,38 +499,39 @@ def get_W_addresses_Selenium(url):
             results = future.result()
             addresses += results
             
-    if LOG_LEVELS['debug'] or LOG_LEVELS['all infos'] or LOG_LEVELS['results']:
-        print(f"Processed {num_pages} pages and found {len(addresses)} addresses")
-    
-    if LOG_LEVELS['time']:
-        print(f"get wallet addresses (with Selenium) ended in {time.time()-startT} seconds")
+    log(('debug', 'all infos', 'results'), "Processed {} pages and found {} addresses", num_pages, len(addresses))
     return addresses
        
+@instrumentation.traced('get pools')
 def getPools(): 
-    """Finds and returns all the addresses associated with each of the 4 mining pools considered
+    """Finds and returns all the addresses associated with each of the 4 mining pools considered.
+    With the http backend the pages of all the pools are crawled concurrently (see async_crawler),
+    with the selenium backend the pools are scraped one after the other.
     
     @params : no params
 
     @return : dataframe of transactions associated to a pool
     """
 
-    startT = time.time()
-    if LOG_LEVELS['time']:
-        print("Get pools started")
+    log('time', "Get pools started")
+    if SCRAPING_BACKEND == 'http':
+        df_pools = async_crawler.crawl_pools(POOL_ADDRESSES_LINKS)
+        instrumentation.count('pool addresses', len(df_pools))
+        return df_pools
             
-    eligiusAddressesLink = f"{BASE_LINK}/wallet/Eligius.st/addresses"
-    deepBitAddressesLink = BASE_LINK+'/wallet/DeepBit.net'+'/addresses'    
-    bitMinterAddressesLink = BASE_LINK+'/wallet/BitMinter.com'+'/addresses'    
-    BTCGuildAddressesLink = BASE_LINK + '/wallet/BTCGuild.com'+ '/addresses'
+    eligiusAddressesLink = POOL_ADDRESSES_LINKS['Eligius']
+    deepBitAddressesLink = POOL_ADDRESSES_LINKS['DeepBit']
+    bitMinterAddressesLink = POOL_ADDRESSES_LINKS['BitMinter']
+    BTCGuildAddressesLink = POOL_ADDRESSES_LINKS['BTCGuild']
     
     
     BTCGuild_WalletAddresses = getWalletAddress_multiplePages(BTCGuildAddressesLink)
     
-    eligius_WalletAddresses = get_W_addresses_Selenium(eligiusAddressesLink)
+    eligius_WalletAddresses = get_W_addresses(eligiusAddressesLink)
     
     deepBit_WalletAddresses = getWalletAddresses(deepBitAddressesLink)
     
-    bitMinter_WalletAddresses = get_W_addresses_Selenium(bitMinterAddressesLink)
+    bitMinter_WalletAddresses = get_W_addresses(bitMinterAddressesLink)
     
     
     
@@ -458,18 +547,43 @@ def getPools():
 
     # Converto la lista di tuple in un DataFrame con colonne txHash e pool
     df_pools = pd.DataFrame(pool_data, columns=['txHash', 'pool'])
-    
-    if LOG_LEVELS['time']:
-        print(f"get pools ended in {time.time()-startT} seconds ")
-    
+    instrumentation.count('pool addresses', len(df_pools))
     return df_pools
     
 
-def getTxAsNode(txId):
+@instrumentation.traced('get tx as node', logLevels=())
+def getTxAsNode(txId, backend = SCRAPING_BACKEND, raiseErrors = False):
     """Searchs the single transaction by it's hash on WalletExplorer, 
     finds transaction's inputs and outputs and return the transaction as a node
     
     @params : txId : transaction hash 
+    @params : [optional] backend : 'http' (pooled HTTP session) or 'selenium' (headless Chrome), default = SCRAPING_BACKEND
+    @params : [optional] raiseErrors : if True the errors are raised, otherwise a node without inputs and outputs is returned
+
+    @return : the node related to the transaction as a dictionary with txId, inputs and outputs keys
+    """
+    check_backend(backend)
+    if backend == 'selenium':
+        return getTxAsNode_Selenium(txId, raiseErrors)
+    
+    try:
+        tx_node = http_backend.get_tx_node(txId, isCoinbase=txId == ELIGIUS_COINBASE_TX)
+        instrumentation.count('taint nodes fetched')
+        log(('debug', 'all infos', 'processing'), "-> found node:\n {}", tx_node, spam=True)
+        return tx_node
+    except Exception as e:
+        instrumentation.count('taint node errors')
+        log('debug', "error in get tx as node:\n{}", e)
+        if raiseErrors:
+            raise
+        return {'txId': txId, 'inputs': [], 'outputs': []}
+
+def getTxAsNode_Selenium(txId, raiseErrors = False):
+    """Searchs the single transaction by it's hash on WalletExplorer with a Selenium driver, 
+    finds transaction's inputs and outputs and return the transaction as a node
+    
+    @params : txId : transaction hash 
+    @params : [optional] raiseErrors : if True the errors are raised, otherwise the node found so far is returned
 
     @return : the node related to the transaction as a dictionary with txId, inputs and outputs keys
     """
@@ -481,141 +595,152 @@ def getTxAsNode(txId):
     }
     
     try:
-        driver = setup_selenium_driver()
-        if(txId == ELIGIUS_COINBASE_TX):
-            driver.get(BASE_LINK)
-            time.sleep(0.5)        
+        with DRIVER_POOL.lease() as driver:
+            if(txId == ELIGIUS_COINBASE_TX):
+                driver.get(BASE_LINK)
+                instrumentation.count('selenium pages fetched')
+                time.sleep(0.5)        
             
-            inputSpace = driver.find_element(By.XPATH, '/html/body/div[2]/form/p/label/input')
-            submitButton = driver.find_element(By.XPATH, '/html/body/div[2]/form/p/input')
+                inputSpace = driver.find_element(By.XPATH, '/html/body/div[2]/form/p/label/input')
+                submitButton = driver.find_element(By.XPATH, '/html/body/div[2]/form/p/input')
             
-            inputSpace.send_keys(txId)    
-            submitButton.click()
-        else:
-            link = f'{BASE_LINK}/txid/{txId}'
+                inputSpace.send_keys(txId)    
+                submitButton.click()
+            else:
+                link = f'{BASE_LINK}/txid/{txId}'
             
-            driver.get(link)
-            time.sleep(0.5)
+                driver.get(link)
+                instrumentation.count('selenium pages fetched')
+                time.sleep(0.5)
             
         
-        infoTable = driver.find_element(By.CLASS_NAME, 'info')        
-        infoTableBody = infoTable.find_element(By.TAG_NAME,'tbody')
-        infoTableFirstTr = infoTableBody.find_elements(By.TAG_NAME,'tr')[0]
-        tx_node['txId'] = infoTableFirstTr.find_element(By.TAG_NAME,'td').text
+            infoTable = driver.find_element(By.CLASS_NAME, 'info')        
+            infoTableBody = infoTable.find_element(By.TAG_NAME,'tbody')
+            infoTableFirstTr = infoTableBody.find_elements(By.TAG_NAME,'tr')[0]
+            tx_node['txId'] = infoTableFirstTr.find_element(By.TAG_NAME,'td').text
         
-        txTable = driver.find_element(By.XPATH, '/html/body/div[2]/table[2]')
-        txTableBody = txTable.find_element(By.TAG_NAME,'tbody')
-        txTableSecondTr = txTableBody.find_element(By.XPATH,'/html/body/div[2]/table[2]/tbody/tr[2]')
+            txTable = driver.find_element(By.XPATH, '/html/body/div[2]/table[2]')
+            txTableBody = txTable.find_element(By.TAG_NAME,'tbody')
+            txTableSecondTr = txTableBody.find_element(By.XPATH,'/html/body/div[2]/table[2]/tbody/tr[2]')
         
-        raw_inputs = txTableSecondTr.find_element(By.XPATH, '/html/body/div[2]/table[2]/tbody/tr[2]/td[1]')
-        raw_outputs = txTableSecondTr.find_element(By.XPATH, '/html/body/div[2]/table[2]/tbody/tr[2]/td[2]')    
-        raw_inputs_trs = raw_inputs.find_element(By.TAG_NAME,'tbody').find_elements(By.TAG_NAME,'tr')
-        raw_outputs_trs = raw_outputs.find_element(By.TAG_NAME,'tbody').find_elements(By.TAG_NAME,'tr')
+            raw_inputs = txTableSecondTr.find_element(By.XPATH, '/html/body/div[2]/table[2]/tbody/tr[2]/td[1]')
+            raw_outputs = txTableSecondTr.find_element(By.XPATH, '/html/body/div[2]/table[2]/tbody/tr[2]/td[2]')    
+            raw_inputs_trs = raw_inputs.find_element(By.TAG_NAME,'tbody').find_elements(By.TAG_NAME,'tr')
+            raw_outputs_trs = raw_outputs.find_element(By.TAG_NAME,'tbody').find_elements(By.TAG_NAME,'tr')
         
-        inputs = []
-        for tr in raw_inputs_trs:
-            if txId == ELIGIUS_COINBASE_TX:
-                firstTd = tr.find_elements(By.TAG_NAME,'td')[0]
-                inputTxt = firstTd.text
-                inputs.append(inputTxt)
-                
-            else:
-                firstTd = tr.find_element(By.CLASS_NAME,'small')
-                a_tag = firstTd.find_element(By.TAG_NAME, 'a')
-                href = a_tag.get_attribute('href')        
+            inputs = []
+            for tr in raw_inputs_trs:
+                if txId == ELIGIUS_COINBASE_TX:
+                    firstTd = tr.find_elements(By.TAG_NAME,'td')[0]
+                    inputTxt = firstTd.text
+                    inputs.append(inputTxt)
                 
-                if 'txid' in href:
-                    txid = href.split('/txid/')[1]
-                    inputs.append(txid)
                 else:
-                    inputTxt = a_tag.text
-                    inputs.append(inputTxt)
+                    firstTd = tr.find_element(By.CLASS_NAME,'small')
+                    a_tag = firstTd.find_element(By.TAG_NAME, 'a')
+                    href = a_tag.get_attribute('href')        
+                
+                    if 'txid' in href:
+                        txid = href.split('/txid/')[1]
+                        inputs.append(txid)
+                    else:
+                        inputTxt = a_tag.text
+                        inputs.append(inputTxt)
             
-        tx_node['inputs'] = inputs
+            tx_node['inputs'] = inputs
         
-        outputs = []
-        for tr in raw_outputs_trs:
-            firstTd = tr.find_element(By.CLASS_NAME,'small')
-            try:
-                a_tag = firstTd.find_element(By.TAG_NAME, 'a')
-                href = a_tag.get_attribute('href')        
+            outputs = []
+            for tr in raw_outputs_trs:
+                firstTd = tr.find_element(By.CLASS_NAME,'small')
+                try:
+                    a_tag = firstTd.find_element(By.TAG_NAME, 'a')
+                    href = a_tag.get_attribute('href')        
                 
-                if 'txid' in href:
-                    txid = href.split('/txid/')[1]
-                    outputs.append(txid)
-                else:
-                    outputTxt = a_tag.text
-                    outputs.append(outputTxt)
-
-            except Exception as e :
-                if 'unspent' in firstTd.text and (LOG_LEVELS['debug'] or LOG_LEVELS['all infos']):
-                    print("unspent tx -> skip it")                
-                elif LOG_LEVELS['debug']:
-                    print(f"error = {e}")
+                    if 'txid' in href:
+                        txid = href.split('/txid/')[1]
+                        outputs.append(txid)
+                    else:
+                        outputTxt = a_tag.text
+                        outputs.append(outputTxt)
+
+                except Exception as e :
+                    if 'unspent' in firstTd.text:
+                        log(('debug', 'all infos'), "unspent tx -> skip it")
+                    else:
+                        log('debug', "error = {}", e)
         
-        tx_node['outputs'] = outputs
+            tx_node['outputs'] = outputs
+            instrumentation.count('taint nodes fetched')
         
-        if not LOG_LEVELS['reduce spam'] and (LOG_LEVELS['debug'] or LOG_LEVELS['all infos'] or LOG_LEVELS['processing']):
-            print(f"-> found node:\n {tx_node}")
+            log(('debug', 'all infos', 'processing'), "-> found node:\n {}", tx_node, spam=True)
     except Exception as e:
-        if LOG_LEVELS['debug']:
-            print(f"error in get tx as node:\n{e}")
+        instrumentation.count('taint node errors')
+        log('debug', "error in get tx as node:\n{}", e)
+        if raiseErrors:
+            raise
             
-    finally:            
-        return tx_node
+    return tx_node
 
-def getEligius_taint_analysis():
-    """carries out the taint analysis on the Eligius pool for k steps, obtaining the graph of the path of the Bitcoins
+@instrumentation.traced('Eligius taint analysis')
+def getEligius_taint_analysis(resume = TAINT_RESUME):
+    """carries out the taint analysis on the Eligius pool for k steps, obtaining the graph of the path of the Bitcoins.
+    Every transaction is fetched once (see taint_frontier), at most TAINT_MAX_NODES transactions.
+    The fetched nodes and the frontier are written in a journal (see taint_journal): an interrupted crawl
+    is resumed by the last checkpoint without fetching again the nodes already found, 
+    a completed crawl is not resumed (the next call fetches the graph again).
     
-    @params : no params
+    @params : [optional] resume : if False the journal of the previous crawl is discarded, default = TAINT_RESUME
 
     @return : list of nodes of the graph related of Eligius pool taint analysis
     """
 
-    startT = time.time()
-    if LOG_LEVELS['time']:
-        print("Eligius taint analysis miners started")
+    log('time', "Eligius taint analysis miners started")
     
     steps = SETTINGS['ELIGIUS_ANALYSIS_STEPS']
     if steps < 0:
         raise ValueError('ELIGIUS_ANALYSIS_STEPS must be greater than 0')
 
-    nodes = []
-    last_outputs = []
-    for step in range(steps):
-        startLen = len(nodes)
-        currentOutputs = []
-        if step == 0:
-            eligiusCoinbaseNode = getTxAsNode(ELIGIUS_COINBASE_TX)
-            nodes.append(eligiusCoinbaseNode)        
-            currentOutputs += eligiusCoinbaseNode['outputs']
-        else:  
-            if (not LOG_LEVELS['reduce spam'] or LOG_LEVELS['results']) and (LOG_LEVELS['debug'] or LOG_LEVELS['all infos'] or LOG_LEVELS['processing']):
-                print(f"going to proceed {len(last_outputs)} transactions")
+    # ogni transazione è visitata una sola volta, al massimo TAINT_MAX_NODES pagine caricate
+    frontier = TaintFrontier(steps, TAINT_MAX_NODES)
+    frontier.push(ELIGIUS_COINBASE_TX, 0)
+    journal = TaintJournal(TAINT_JOURNAL_PATH, {'root': ELIGIUS_COINBASE_TX, 'steps': steps, 'maxNodes': TAINT_MAX_NODES})
+    nodes = journal.open(frontier, resume)
+
+    def fetch_node(txId, step):
+        try:
+            node, error = getTxAsNode(txId, raiseErrors=True), False
+        except Exception:
+            node, error = {'txId': txId, 'inputs': [], 'outputs': []}, True
+        journal.record_node(step, txId, node, error) # scritto appena trovato (anche se il crawl si interrompe)
+        return node
+
+    try:
+        while True:
+            step, last_outputs = frontier.pop_level()
+            if not last_outputs:
+                break
+            journal.checkpoint(step, last_outputs, frontier)
+            startLen = len(nodes)
+            # il livello 'results' mostra l'avanzamento anche con 'reduce spam'
+            log(('debug', 'all infos', 'processing'), "going to proceed {} transactions", len(last_outputs), spam=not LOG_LEVELS['results'])
                   
             max_t_quantity = min(MAX_THREAD_QUANTITY, len(last_outputs))
             if max_t_quantity > 7: #reduce the max threads quantity to 7 to do not overload the use of resources
                 max_t_quantity = 7
             with ThreadPoolExecutor(max_workers=max_t_quantity) as executor:
-                future_to_node = {executor.submit(getTxAsNode, id): id for id in last_outputs}
+                future_to_node = {executor.submit(fetch_node, id, step): id for id in last_outputs}
                 for future in as_completed(future_to_node):
                     node = future.result()
                     nodes.append(node)
-                    currentOutputs += node['outputs']
-            
-            
-                
-        last_outputs = currentOutputs
-        
-        if (not LOG_LEVELS['reduce spam'] or LOG_LEVELS['results']) and (LOG_LEVELS['debug'] or LOG_LEVELS['all infos'] or LOG_LEVELS['processing']):
-            print(f"-> found {len(nodes)-startLen} nodes at step {step}/{steps}")
+                    frontier.push_outputs(node, step)
             
-    if LOG_LEVELS['debug'] or LOG_LEVELS['all infos'] or LOG_LEVELS['results']:
-        print(f"Found {len(nodes)} nodes in {steps} steps")            
+            log(('debug', 'all infos', 'processing'), "-> found {} nodes at step {}/{}", len(nodes)-startLen, step, steps, spam=not LOG_LEVELS['results'])
+        journal.complete()
+    finally:
+        journal.close()
     
-    if LOG_LEVELS['time']:
-        print(f"Eligius taint analysis miners ended in {time.time()-startT} seconds")
-     
+    instrumentation.count('taint nodes', len(nodes))
+    log(('debug', 'all infos', 'results'), "Found {} nodes in {} steps", len(nodes), steps)
     return nodes
 
                
@@ -0,0 +1,126 @@
+import re
+import instrumentation
+
+# Frontier of the taint analysis crawl (breadth first, one level for every step):
+# •a transaction is fetched at most once (visited set shared by all the steps, a transaction
+#  reached by several paths is kept at its first depth)
+# •only the outputs that are transactions are expanded (addresses / wallets have no transaction page)
+# •the pending transactions of a level are served by priority: most referenced first (spent by
+#  more of the fetched nodes), then in discovery order
+# •the fetched nodes are bounded by a budget (max page loads of the crawl)
+
+TX_ID_PATTERN = re.compile(r'^[0-9a-fA-F]{64}$')
+
+
+def is_tx_id(value):
+    """Check if an output of a node is a transaction hash
+    @param value : output of a node (transaction hash, address or wallet name)
+    @return boolean
+    """
+    return isinstance(value, str) and TX_ID_PATTERN.match(value) is not None
+
+
+class TaintFrontier:
+    """Deduplicated and budgeted frontier of the taint analysis crawl"""
+
+    def __init__(self, maxDepth, maxNodes = None):
+        """
+        @param maxDepth : number of steps of the crawl (transactions at depth >= maxDepth are not expanded)
+        @param [optional] maxNodes : max transactions fetched (None = no budget)
+        """
+        self.maxDepth = maxDepth
+        self.maxNodes = maxNodes
+        self.seen = set()
+        self.levels = {} # depth -> {txId: [discovery order, references]}
+        self.discovered = 0
+        self.served = 0
+
+    def push(self, txId, depth):
+        """Add a transaction to the frontier (ignored if already seen or too deep)
+        @param txId : transaction hash
+        @param depth : step of the transaction
+        @return True if the transaction is a new one
+        """
+        pending = self.levels.get(depth)
+        if pending is not None and txId in pending:
+            pending[txId][1] += 1
+            instrumentation.count('taint duplicates skipped')
+            return False
+        if txId in self.seen:
+            instrumentation.count('taint duplicates skipped')
+            return False
+        if depth >= self.maxDepth:
+            return False
+        self.seen.add(txId)
+        self.levels.setdefault(depth, {})[txId] = [self.discovered, 1]
+        self.discovered += 1
+        return True
+
+    def push_outputs(self, node, depth):
+        """Add the outputs of a fetched node that are transactions
+        @param node : dictionary with txId, inputs and outputs keys
+        @param depth : step of the node
+        @return quantity of new transactions
+        """
+        self.seen.add(node['txId']) # id completo (il coinbase è cercato per prefisso)
+        return sum(self.push(output, depth + 1) for output in node['outputs'] if is_tx_id(output))
+
+    def remaining_budget(self):
+        """Transactions that can still be fetched (None = no budget)"""
+        return None if self.maxNodes is None else max(0, self.maxNodes - self.served)
+
+    def pop_level(self):
+        """Remove and return the pending transactions of the lowest level, by priority,
+        within the budget (the transactions over the budget are dropped)
+        @no params
+        @return (depth, list of transaction hashes), (None, []) when the crawl is over
+        """
+        if not self.levels:
+            return None, []
+        depth = min(self.levels)
+        pending = self.levels.pop(depth)
+        batch = sorted(pending, key=lambda txId: (-pending[txId][1], pending[txId][0]))
+        budget = self.remaining_budget()
+        if budget is not None and len(batch) > budget:
+            instrumentation.count('taint nodes over budget', len(batch) - budget + sum(map(len, self.levels.values())))
+            batch = batch[:budget]
+            self.levels.clear()
+        self.served += len(batch)
+        return (depth, batch) if batch else (None, [])
+
+    def requeue(self, txId, depth):
+        """Add again a served transaction that was not fetched (error or crawl interrupted), without using the budget
+        @param txId : transaction hash
+        @param depth : step of the transaction
+        @return True if the transaction is pending again
+        """
+        if txId not in self.seen or any(txId in pending for pending in self.levels.values()):
+            return False
+        self.seen.discard(txId)
+        self.served = max(0, self.served - 1)
+        return self.push(txId, depth)
+
+    def get_state(self):
+        """State of the frontier (json serializable, see TaintFrontier.set_state)
+        @no params
+        @return dictionary
+        """
+        return {
+            'seen': sorted(self.seen),
+            'levels': {str(depth): pending for depth, pending in self.levels.items()},
+            'discovered': self.discovered,
+            'served': self.served,
+        }
+
+    def set_state(self, state):
+        """Restore a state of the frontier (see TaintFrontier.get_state)
+        @param state : dictionary returned by get_state
+        @no return
+        """
+        self.seen = set(state['seen'])
+        self.levels = {int(depth): {txId: list(entry) for txId, entry in pending.items()} for depth, pending in state['levels'].items()}
+        self.discovered = state['discovered']
+        self.served = state['served']
+
+    def __len__(self):
+        return sum(map(len, self.levels.values()))
@@ -0,0 +1,150 @@
+import os
+import json
+import threading
+import instrumentation
+from instrumentation import log
+
+# Durable journal (json lines) of the taint analysis crawl:
+# •crawl : signature of the crawl (first line, a different signature starts a new journal)
+# •level : transactions served by the frontier for a step + state of the frontier after the pop (checkpoint)
+# •node : node fetched (or not fetched, error = true) for a transaction of the last level
+# •complete : the crawl is over (the next crawl starts a new journal and fetches the graph again)
+# Every line is flushed and synced on disk when written, so after a crash / ban / timeout the crawl
+# is resumed by the last checkpoint: the fetched nodes are not fetched again, the transactions
+# with errors or not fetched yet are fetched again (without using the budget).
+# As in a crawl without interruptions, a transaction not fetched is an empty node of the result.
+
+
+class TaintJournal:
+    """Json lines journal of a taint analysis crawl"""
+
+    def __init__(self, path, signature):
+        """
+        @param path : path of the journal file
+        @param signature : dictionary with the parameters of the crawl (steps, budget, root transaction)
+        """
+        self.path = path
+        self.signature = signature
+        self.file = None
+        self.lock = threading.Lock()
+
+    def _read_records(self):
+        """Records of the journal (None if missing or with a different signature),
+        a truncated last line (crash while writing) is removed from the file"""
+        if not os.path.exists(self.path):
+            return None
+        records = []
+        validBytes = 0
+        with open(self.path, "rb") as file:
+            for line in file:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("truncated line")
+                    records.append(json.loads(line))
+                except ValueError:
+                    log('debug', "taint journal: truncated record at byte {} -> ignored", validBytes)
+                    break
+                validBytes += len(line)
+        if not records or records[0].get('type') != 'crawl' or records[0].get('signature') != self.signature:
+            return None
+        if validBytes < os.path.getsize(self.path):
+            with open(self.path, "r+b") as file:
+                file.truncate(validBytes)
+        return records
+
+    def open(self, frontier, resume = True):
+        """Open the journal: the previous interrupted crawl (same signature) is restored in the frontier,
+        otherwise (no journal, different signature or completed crawl) a new journal is started
+        @param frontier : TaintFrontier of the crawl (with the root transaction already pushed)
+        @param [optional] resume : if False the previous journal is discarded
+        @return list of the nodes fetched by the previous crawl
+        """
+        records = self._read_records() if resume else None
+        if records is not None and records[-1]['type'] == 'complete':
+            log(('debug', 'all infos', 'processing'), "Previous taint analysis crawl completed -> new crawl")
+            records = None
+        nodes = []
+        if records is not None:
+            nodes = restore(records, frontier)
+            instrumentation.count('taint nodes resumed', len(nodes))
+            log(('debug', 'all infos', 'processing'), "Resumed taint analysis crawl: {} nodes fetched, {} transactions pending", len(nodes), len(frontier))
+            self.file = open(self.path, "a")
+        else:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.file = open(self.path, "w")
+            self._write({'type': 'crawl', 'signature': self.signature})
+        return nodes
+
+    def _write(self, record):
+        line = json.dumps(record) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def checkpoint(self, depth, batch, frontier):
+        """Record the transactions served for a step and the state of the frontier
+        @param depth : step
+        @param batch : transactions served by the frontier
+        @param frontier : TaintFrontier after the pop of the batch
+        @no return
+        """
+        self._write({'type': 'level', 'depth': depth, 'batch': batch, 'frontier': frontier.get_state()})
+
+    def record_node(self, depth, txId, node, error = False):
+        """Record a node of the last level (thread safe)
+        @param depth : step of the node
+        @param txId : transaction requested (the node can have the complete hash of a prefix)
+        @param node : dictionary with txId, inputs and outputs keys
+        @param [optional] error : True if the node was not fetched (it will be fetched again by a resume)
+        @no return
+        """
+        self._write({'type': 'node', 'depth': depth, 'txId': txId, 'node': node, 'error': error})
+
+    def complete(self):
+        """Record the end of the crawl (a completed crawl is not resumed)
+        @no params
+        @no return
+        """
+        self._write({'type': 'complete'})
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def restore(records, frontier):
+    """Restore the crawl of a journal: frontier of the last checkpoint + outputs of the nodes fetched after it,
+    the transactions with errors or not fetched yet are pending again
+    @param records : records of the journal
+    @param frontier : TaintFrontier of the crawl
+    @return list of the nodes fetched (and the empty nodes of the transactions with errors that are not pending again)
+    """
+    lastLevel = None
+    nodes = [] # (depth, txId, node, error, after the last checkpoint)
+    for record in records:
+        if record['type'] == 'level':
+            lastLevel = record
+            nodes = [entry[:4] + (False,) for entry in nodes]
+        elif record['type'] == 'node':
+            nodes.append((record['depth'], record['txId'], record['node'], record['error'], True))
+    if lastLevel is None:
+        return []
+
+    frontier.set_state(lastLevel['frontier'])
+    for depth, txId, node, error, afterCheckpoint in nodes:
+        if afterCheckpoint and not error:
+            frontier.push_outputs(node, depth)
+
+    fetched = {txId for _, txId, _, error, _ in nodes if not error}
+    recorded = {txId for _, txId, _, _, afterCheckpoint in nodes if afterCheckpoint}
+    failed = {txId: (depth, node) for depth, txId, node, error, _ in nodes if error and txId not in fetched}
+    interrupted = [(lastLevel['depth'], txId) for txId in lastLevel['batch'] if txId not in recorded]
+    # le transazioni con errori sono caricate di nuovo (il nodo vuoto resta solo se non tornano in coda)
+    kept = [node for depth, txId, node, error, _ in nodes if not error]
+    kept += [node for txId, (depth, node) in failed.items() if not frontier.requeue(txId, depth)]
+    for depth, txId in interrupted:
+        frontier.requeue(txId, depth)
+    return kept
@@ -0,0 +1,148 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utilities import SETTINGS
+import instrumentation
+
+MAX_THREAD_QUANTITY = SETTINGS['MAX_THREAD_QUANTITY']
+
+
+class StageError(Exception):
+    def __init__(self, message, stageName):
+        super().__init__(message)
+        self.stageName = stageName
+
+    def __str__(self):
+        return f"{self.stageName}: {self.args[0]}"
+
+class Stage:
+    """Named stage of the pipeline with declared inputs and outputs.
+    The function receives the inputs as keyword arguments and returns
+    the single output or a tuple with one value for each output.
+    """
+    def __init__(self, name, function, inputs = (), outputs = (), mainThread = False, resources = ()):
+        """
+        @param name : unique name of the stage
+        @param function : function executed by the stage
+        @param [optional] inputs : names of the values required by the stage
+        @param [optional] outputs : names of the values produced by the stage
+        @param [optional] mainThread : if True the stage is executed in the main thread (ex. plots with plt.show())
+        @param [optional] resources : names of the exclusive resources used by the stage (ex. the all-cores csv reader):
+                                      stages with a common resource are never executed at the same time
+        """
+        self.name = name
+        self.function = function
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.mainThread = mainThread
+        self.resources = frozenset(resources)
+
+    def execute(self, values):
+        """Execute the stage taking its inputs by values
+        @param values : dictionary name -> value of the already produced values
+        @return dictionary name -> value of the outputs produced by the stage
+        """
+        with instrumentation.span(f"stage '{self.name}'"):
+            result = self.function(**{name: values[name] for name in self.inputs})
+
+        if len(self.outputs) == 0:
+            return {}
+        if len(self.outputs) == 1:
+            return {self.outputs[0]: result}
+        if not isinstance(result, tuple) or len(result) != len(self.outputs):
+            raise StageError(f"expected {len(self.outputs)} outputs {self.outputs}", self.name)
+        return dict(zip(self.outputs, result))
+
+class StageScheduler:
+    """Run a DAG of stages overlapping the independent ones:
+    every stage starts as soon as all its inputs (and its exclusive resources) are available.
+    """
+    def __init__(self, stages, maxWorkers = MAX_THREAD_QUANTITY):
+        """
+        @param stages : list of Stage
+        @param [optional] maxWorkers : max quantity of stages executed at the same time in the worker threads
+        """
+        self.stages = list(stages)
+        self.maxWorkers = maxWorkers
+        self.validate()
+
+    def validate(self):
+        """Check that stage names and outputs are unique, that every input
+        is produced by a stage and that the stages graph has no cycles
+        @no params
+        @no return (raise StageError if the graph is not valid)
+        """
+        producers = {}
+        names = set()
+        for stage in self.stages:
+            if stage.name in names:
+                raise StageError("duplicated stage name", stage.name)
+            names.add(stage.name)
+            for output in stage.outputs:
+                if output in producers:
+                    raise StageError(f"output '{output}' is already produced by stage '{producers[output]}'", stage.name)
+                producers[output] = stage.name
+
+        for stage in self.stages:
+            for name in stage.inputs:
+                if name not in producers:
+                    raise StageError(f"input '{name}' is not produced by any stage", stage.name)
+
+        # topological visit (Kahn) to find cycles
+        available = set()
+        pending = list(self.stages)
+        while pending:
+            ready = [stage for stage in pending if all(name in available for name in stage.inputs)]
+            if not ready:
+                raise StageError("cycle between stages", ", ".join(stage.name for stage in pending))
+            for stage in ready:
+                available.update(stage.outputs)
+                pending.remove(stage)
+
+    def run(self):
+        """Execute all the stages: worker stages run in a thread pool, main thread stages
+        run in the calling thread when they are ready (after the ready worker stages are submitted)
+        @no params
+        @return dictionary name -> value with all the values produced by the stages
+        """
+        values = {}
+        pending = list(self.stages)
+        running = {}
+        held = set() # exclusive resources of the running stages
+
+        with instrumentation.span('all stages'), ThreadPoolExecutor(max_workers=self.maxWorkers) as executor:
+            try:
+                while pending or running:
+                    ready = [stage for stage in pending if all(name in values for name in stage.inputs)]
+
+                    for stage in ready:
+                        if not stage.mainThread and not stage.resources & held:
+                            held.update(stage.resources)
+                            pending.remove(stage)
+                            instrumentation.log(('processing', 'debug'), "\nstage '{}' started", stage.name)
+                            running[executor.submit(stage.execute, values)] = stage
+
+                    main_thread_ready = [stage for stage in ready if stage.mainThread and not stage.resources & held]
+                    if main_thread_ready:
+                        stage = main_thread_ready[0]
+                        pending.remove(stage)
+                        values.update(stage.execute(values))
+                        continue
+
+                    if not running:
+                        raise StageError("no stage can be started", ", ".join(stage.name for stage in pending))
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stage = running.pop(future)
+                        held.difference_update(stage.resources)
+                        try:
+                            values.update(future.result())
+                        except StageError:
+                            raise
+                        except Exception as e:
+                            raise StageError(f"stage failed with error: {e}", stage.name) from e
+            except BaseException:
+                for future in running:
+                    future.cancel()
+                raise
+
+        return values
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# i moduli del progetto sono importati dalla cartella progetto (come da main.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
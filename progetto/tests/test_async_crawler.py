@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from scraping import async_crawler, http_backend
+
+POOLS = {'Eligius': "https://example.org/wallet/Eligius/addresses", 'DeepBit': "https://example.org/wallet/DeepBit/addresses"}
+PAGES = 4
+
+
+def page_html(pool, page):
+    rows = "".join(f"<tr><td><a href='/address/{pool}-{page}-{i}'>{pool}-{page}-{i}</a></td></tr>" for i in range(3))
+    return f"<div id='main'>Page 1 / {PAGES}</div><table>{rows}</table>"
+
+class FlakyFetch:
+    """Fake fetch of the addresses pages: the urls of failures fail the first `times` requests"""
+    def __init__(self, failures, times = 1):
+        self.failures = failures
+        self.times = times
+        self.requests = {}
+
+    def __call__(self, url):
+        self.requests[url] = self.requests.get(url, 0) + 1
+        if url in self.failures and self.requests[url] <= self.times:
+            raise http_backend.PageError("response status code = 503", url)
+        pool = url.split('/')[-2]
+        page = int(url.split('?page=')[1]) if '?page=' in url else 1
+        return page_html(pool, page)
+
+def crawl(fetch, allowMissingPages = False):
+    return asyncio.run(async_crawler.AsyncCrawler(hostConcurrency=2, minInterval=0, fetch=fetch, allowMissingPages=allowMissingPages).collect(POOLS))
+
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch):
+    monkeypatch.setattr(http_backend, 'is_cached', lambda url: False)
+
+
+def test_all_pages():
+    df = crawl(FlakyFetch(set()))
+    assert len(df) == len(POOLS) * PAGES * 3
+    assert df['txHash'].tolist()[:4] == ['Eligius-1-0', 'Eligius-1-1', 'Eligius-1-2', 'Eligius-2-0']
+
+def test_failed_pages_are_requested_again():
+    fetch = FlakyFetch({POOLS['Eligius'] + "?page=3", POOLS['DeepBit']})
+    df = crawl(fetch)
+    assert len(df) == len(POOLS) * PAGES * 3
+    assert fetch.requests[POOLS['Eligius'] + "?page=3"] == 2
+
+def test_missing_pages_stop_the_crawl():
+    fetch = FlakyFetch({POOLS['Eligius'] + "?page=2", POOLS['DeepBit']}, times=2)
+    with pytest.raises(async_crawler.CrawlError) as error:
+        crawl(fetch)
+    # le pagine mancanti sono elencate dopo il secondo tentativo (le altre pagine sono state richieste)
+    assert error.value.missing == [('Eligius', 2), ('DeepBit', 1)]
+    assert "Eligius page 2, DeepBit page 1" in str(error.value)
+    assert fetch.requests[POOLS['Eligius'] + "?page=4"] == 1
+
+def test_missing_pages_skipped_if_allowed():
+    fetch = FlakyFetch({POOLS['Eligius'] + "?page=2", POOLS['DeepBit']}, times=2)
+    df = crawl(fetch, allowMissingPages=True)
+    # la pagina 2 di Eligius e il pool DeepBit (prima pagina) sono saltati dopo il secondo tentativo
+    assert set(df['pool']) == {'Eligius'}
+    assert len(df) == (PAGES - 1) * 3
+    assert fetch.requests[POOLS['DeepBit']] == 2
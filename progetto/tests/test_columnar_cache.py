@@ -0,0 +1,74 @@
+import os
+import numpy as np
+import pandas as pd
+from dataset_analysis import columnar_cache
+
+SCHEMA = {'txId': 'uint32', 'amount': 'float64', 'hash': 'category'}
+COLUMNS = ['txId', 'amount', 'hash']
+
+
+def write_source(tmp_path, rows = 4):
+    path = str(tmp_path / "data.csv")
+    with open(path, "w") as f:
+        f.write("".join(f"{i},{i / 2},h{i % 3}\n" for i in range(rows)))
+    return path
+
+def source_df(rows = 4):
+    return pd.DataFrame({
+        'txId': np.arange(rows, dtype='uint32'),
+        'amount': np.arange(rows) / 2,
+        'hash': pd.Categorical([f"h{i % 3}" for i in range(rows)]),
+    })
+
+def test_store_and_load(tmp_path):
+    path = write_source(tmp_path)
+    cacheRoot = str(tmp_path / "cache")
+    assert columnar_cache.load_columns(cacheRoot, path, SCHEMA, COLUMNS) is None
+
+    df = source_df()
+    columnar_cache.store_columns(cacheRoot, path, SCHEMA, COLUMNS, df)
+    cached = columnar_cache.load_columns(cacheRoot, path, SCHEMA, COLUMNS)
+    assert cached['txId'].dtype == np.uint32
+    assert isinstance(cached['hash'].dtype, pd.CategoricalDtype)
+    for column in COLUMNS:
+        pd.testing.assert_series_equal(pd.Series(np.asarray(cached[column])), pd.Series(np.asarray(df[column])), check_names=False)
+
+def test_object_column_stored_as_category(tmp_path):
+    path = write_source(tmp_path)
+    cacheRoot = str(tmp_path / "cache")
+    # chunk con categorie diverse concatenati come object (un valore mancante resta mancante)
+    df = source_df().astype({'hash': object})
+    df.loc[1, 'hash'] = None
+    columnar_cache.store_columns(cacheRoot, path, SCHEMA, COLUMNS, df)
+    cached = columnar_cache.load_columns(cacheRoot, path, SCHEMA, COLUMNS)
+    assert isinstance(cached['hash'].dtype, pd.CategoricalDtype)
+    assert cached['hash'].isna().tolist() == [False, True, False, False]
+    assert cached['hash'].astype(object).tolist()[2:] == ['h2', 'h0']
+
+def test_stale_signature(tmp_path):
+    path = write_source(tmp_path)
+    cacheRoot = str(tmp_path / "cache")
+    columnar_cache.store_columns(cacheRoot, path, SCHEMA, COLUMNS, source_df())
+
+    # schema del reader diverso -> cache non valido
+    assert columnar_cache.load_columns(cacheRoot, path, {**SCHEMA, 'txId': 'uint64'}, COLUMNS) is None
+
+    # file modificato -> cache non valido, ma caricabile senza validazione (per l'append)
+    with open(path, "a") as f:
+        f.write("4,2.0,h1\n")
+    assert columnar_cache.load_columns(cacheRoot, path, SCHEMA, COLUMNS) is None
+    assert len(columnar_cache.load_columns(cacheRoot, path, SCHEMA, COLUMNS, validateSignature=False)) == 4
+    assert columnar_cache.get_append_watermark(cacheRoot, path, SCHEMA, COLUMNS) == {'bytes': os.path.getsize(path) - 9, 'rows': 4}
+
+    # file riscritto (righe già lette modificate) -> nessun watermark, va letto da capo
+    with open(path, "w") as f:
+        f.write("".join(f"{i},{i},h{i}\n" for i in range(6)))
+    assert columnar_cache.get_append_watermark(cacheRoot, path, SCHEMA, COLUMNS) is None
+
+def test_interrupted_store_is_ignored(tmp_path):
+    path = write_source(tmp_path)
+    cacheRoot = str(tmp_path / "cache")
+    columnar_cache.store_columns(cacheRoot, path, SCHEMA, COLUMNS, source_df())
+    # il file meta è scritto per ultimo : senza meta il cache è ignorato
+    os.remove(os.path.join(columnar_cache.get_cache_dir(cacheRoot, path), columnar_cache.META_FILE_NAME))
+    assert columnar_cache.load_columns(cacheRoot, path, SCHEMA, COLUMNS) is None
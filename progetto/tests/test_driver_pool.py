@@ -0,0 +1,133 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from scraping.driver_pool import DriverPool
+
+
+class FakeDriver:
+    def __init__(self, number):
+        self.number = number
+        self.crashed = False
+        self.quit_calls = 0
+
+    @property
+    def current_url(self):
+        if self.crashed:
+            raise ConnectionError("browser crashed")
+        return "about:blank"
+
+    def quit(self):
+        self.quit_calls += 1
+
+
+class FakeFactory:
+    def __init__(self, failures = 0):
+        self.drivers = []
+        self.failures = failures
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            if self.failures > 0:
+                self.failures -= 1
+                raise RuntimeError("chromedriver not started")
+            driver = FakeDriver(len(self.drivers))
+            self.drivers.append(driver)
+            return driver
+
+
+def test_lease_reuses_drivers():
+    factory = FakeFactory()
+    pool = DriverPool(factory, size=2, maxPages=10)
+    for _ in range(3):
+        with pool.lease() as driver:
+            assert driver is factory.drivers[0]
+    assert len(factory.drivers) == 1
+
+def test_pool_is_bounded():
+    factory = FakeFactory()
+    pool = DriverPool(factory, size=2, maxPages=100)
+    leased = []
+    lock = threading.Lock()
+    maxLeased = [0]
+
+    def page(_):
+        with pool.lease() as driver:
+            with lock:
+                leased.append(driver)
+                maxLeased[0] = max(maxLeased[0], len(leased))
+            threading.Event().wait(0.005)
+            with lock:
+                leased.remove(driver)
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        list(executor.map(page, range(30)))
+    assert maxLeased[0] <= 2
+    assert len(factory.drivers) <= 2
+
+def test_recycle_after_max_pages():
+    factory = FakeFactory()
+    pool = DriverPool(factory, size=1, maxPages=2)
+    numbers = []
+    for _ in range(5):
+        with pool.lease() as driver:
+            numbers.append(driver.number)
+    assert numbers == [0, 0, 1, 1, 2]
+    assert [driver.quit_calls for driver in factory.drivers] == [1, 1, 0]
+
+def test_unhealthy_driver_is_replaced():
+    factory = FakeFactory()
+    pool = DriverPool(factory, size=1, maxPages=10)
+    with pool.lease() as driver:
+        pass
+    # il browser idle è crashato -> sostituito al lease successivo
+    driver.crashed = True
+    with pool.lease() as driver:
+        assert driver.number == 1
+    assert factory.drivers[0].quit_calls == 1
+
+    # un errore durante la pagina con il browser crashato -> il driver non torna nel pool
+    with pytest.raises(ValueError):
+        with pool.lease() as driver:
+            driver.crashed = True
+            raise ValueError("page failed")
+    with pool.lease() as driver:
+        assert driver.number == 2
+
+def test_failed_page_keeps_healthy_driver():
+    factory = FakeFactory()
+    pool = DriverPool(factory, size=1, maxPages=10)
+    with pytest.raises(ValueError):
+        with pool.lease():
+            raise ValueError("page failed")
+    with pool.lease() as driver:
+        assert driver.number == 0
+
+def test_factory_failure_frees_the_slot():
+    factory = FakeFactory(failures=1)
+    pool = DriverPool(factory, size=1, maxPages=10)
+    with pytest.raises(RuntimeError):
+        with pool.lease():
+            pass
+    # lo slot del driver non avviato è libero (altrimenti il lease resterebbe in attesa)
+    with pool.lease() as driver:
+        assert driver.number == 0
+
+def test_close():
+    factory = FakeFactory()
+    pool = DriverPool(factory, size=2, maxPages=10)
+    with pool.lease() as leased:
+        with pool.lease() as idle:
+            pass
+        pool.close()
+        assert idle.quit_calls == 1
+        assert leased.quit_calls == 0
+    # il driver in uso è chiuso quando torna al pool
+    assert leased.quit_calls == 1
+    with pytest.raises(RuntimeError):
+        with pool.lease():
+            pass
+
+def test_invalid_size():
+    with pytest.raises(ValueError):
+        DriverPool(FakeFactory(), size=0, maxPages=10)
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+from dataset_analysis.hash_index import AddressHashIndex, MISSING_ADDRESS_ID
+
+
+def test_lookup():
+    index = AddressHashIndex.from_hashes(pd.Series(['a', 'b', 'c', 'b']).astype('category'), [10, 11, 12, 13])
+    assert len(index) == 3
+    # un hash ripetuto tiene il primo addressId
+    assert index.lookup(np.array(['c', 'b', 'x'], dtype=object)).tolist() == [12, 11, MISSING_ADDRESS_ID]
+    assert index.contains_address_ids([11, 13]).tolist() == [True, False]
+
+def test_missing_hashes_never_match():
+    # categorical : il codice -1 non deve prendere il digest dell'ultima categoria
+    hashes = pd.Categorical(['a', None, 'b'])
+    index = AddressHashIndex.from_hashes(hashes, [1, 2, 3])
+    assert len(index) == 2
+    assert index.lookup(pd.Categorical([None, 'b', None], categories=['a', 'b'])).tolist() == [MISSING_ADDRESS_ID, 3, MISSING_ADDRESS_ID]
+    assert index.lookup(np.array([np.nan, None, 'a'], dtype=object)).tolist() == [MISSING_ADDRESS_ID, MISSING_ADDRESS_ID, 1]
+    assert index.lookup(pd.Categorical([None, None])).tolist() == [MISSING_ADDRESS_ID, MISSING_ADDRESS_ID]
+
+def test_resolve_pools():
+    index = AddressHashIndex.from_hashes(np.array(['a', 'b'], dtype=object), [1, 2])
+    pools = pd.DataFrame({'txHash': ['b', 'z', None], 'pool': ['Eligius', 'DeepBit', 'BTCGuild']})
+    resolved = index.resolve_pools(pools)
+    assert resolved[['pool', 'addressId']].values.tolist() == [['Eligius', 2]]
+
+def test_save_and_load(tmp_path):
+    index = AddressHashIndex.from_hashes(np.array(['a', 'b'], dtype=object), [1, 2])
+    index.save(str(tmp_path), {'size': 2})
+    assert AddressHashIndex.load(str(tmp_path), {'size': 3}) is None
+    assert AddressHashIndex.load(str(tmp_path), {'size': 2}).lookup(np.array(['b'], dtype=object)).tolist() == [2]
@@ -0,0 +1,58 @@
+import os
+import pytest
+from scraping import http_backend
+from scraping.http_backend import PageError
+
+# Pagine di WalletExplorer salvate (tests/fixtures) : i nodi attesi sono quelli estratti
+# dagli XPath di scraper.getTxAsNode_Selenium / get_number_of_pages / get_addresses_from_page
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+TX_ID = "6b86b273ff34fce19d6b804eff5a3f5747ada4eaa22f1d49c01e52ddb7875b4b"
+COINBASE_TX_ID = "5feceb66ffc86f38d952786c6d696c79c2dbc239dd4e91b46729d73a27fb57e9"
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_PATH, name), "r", encoding="utf8") as file:
+        return file.read()
+
+def test_parse_tx_node():
+    node = http_backend.parse_tx_node(read_fixture("tx_page.html"), TX_ID)
+    assert node == {
+        'txId': TX_ID,
+        # link 'prev tx' della cella small di ogni input
+        'inputs': [
+            "d4735e3a265e16eee03f59718b9b5d03019c07d8b6c51f90da3a666eec13ab35",
+            "4e07408562bedb8b60ce05c1decfe3ad16b72230967de01f640b7e4729b49fce",
+        ],
+        # link 'next tx' degli output spesi, gli output unspent sono saltati
+        'outputs': [
+            "4b227777d4dd1fc61c6f884f48641d02b4d121d3fd328cb08b5531fcacdabf8a",
+            "ef2d127de37b942baad06145e54b0c619a1f22327b2ebbcfbec78f5564afe39d",
+        ],
+    }
+
+def test_parse_coinbase_node_by_prefix():
+    # il coinbase è cercato per prefisso : il txId del nodo è quello completo della tabella info
+    node = http_backend.parse_tx_node(read_fixture("coinbase_page.html"), COINBASE_TX_ID[:16], isCoinbase=True)
+    assert node == {
+        'txId': COINBASE_TX_ID,
+        'inputs': ["(new coins)"],
+        # un output non speso verso un wallet è il testo del link
+        'outputs': [TX_ID, "Eligius"],
+    }
+
+def test_parse_not_found_page():
+    with pytest.raises(PageError):
+        http_backend.parse_tx_node(read_fixture("not_found_page.html"), TX_ID)
+
+def test_parse_addresses_page():
+    html = read_fixture("addresses_page.html")
+    assert http_backend.parse_number_of_pages(html) == 37
+    assert http_backend.parse_wallet_addresses(html) == [
+        "1Eligius2wNq7pPb2pLsyJybTZJfWmiYbk",
+        "1FeexV6bAHb8ybZjqQMjJrcCrHGW9sb6uF",
+        "3J98t1WpEZ73CNmQviecrnyiWrnqRhWNLy",
+    ]
+
+def test_parse_single_addresses_page():
+    assert http_backend.parse_number_of_pages(read_fixture("not_found_page.html")) == 1
+    assert http_backend.parse_wallet_addresses(read_fixture("not_found_page.html")) == []
@@ -0,0 +1,94 @@
+import os
+import pandas as pd
+import pytest
+import main
+from dataset_analysis import columnar_cache
+
+TRANSACTIONS_SPEC = {**main.TRANSACTIONS_CSV_SPEC, 'path': None}
+MAP_SPEC = {**main.MAP_CSV_SPEC, 'path': None}
+
+
+def transactions_rows(first, last):
+    # timestamp, blockId, txId, isCoinbase, fee (un giorno ogni 40 transazioni)
+    return "".join(f"{1262304000 + txId * 2160},{txId // 3},{txId},{int(txId % 3 == 0)},{txId % 7}\n" for txId in range(first, last))
+
+def map_rows(first, last):
+    return "".join(f"hash{addressId // 20:04d},{addressId}\n" for addressId in range(first, last))
+
+def read(spec, path):
+    return main.read_csv_columns(spec['schema'], spec['columns'], spec['usecols'], path)
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, 'DATASET_CACHE_PATH', str(tmp_path / "cache"))
+    monkeypatch.setattr(main, 'USE_COLUMNAR_CACHE', True)
+    monkeypatch.setattr(main, 'INCREMENTAL_INGESTION', True)
+    monkeypatch.setattr(main, 'PARALLEL_CSV_PARSING', False)
+    monkeypatch.setattr(main, 'INGESTION_WATERMARKS', {})
+    return tmp_path
+
+@pytest.mark.parametrize("spec, rows", [(TRANSACTIONS_SPEC, transactions_rows), (MAP_SPEC, map_rows)])
+def test_append_matches_full_recompute(cache, monkeypatch, spec, rows):
+    path = str(cache / "data.csv")
+    with open(path, "w") as f:
+        f.write(rows(0, 1000))
+    assert len(read(spec, path)) == 1000
+    cacheDir = columnar_cache.get_cache_dir(main.DATASET_CACHE_PATH, path)
+    first_segment = os.path.join(cacheDir, f"{spec['columns'][0]}.npy")
+    first_segment_stat = os.stat(first_segment)
+
+    # due aggiornamenti giornalieri : solo le righe nuove sono lette e salvate come nuovi segmenti
+    for first, last in ((1000, 1200), (1200, 1250)):
+        with open(path, "a") as f:
+            f.write(rows(first, last))
+        appended = read(spec, path)
+        assert main.INGESTION_WATERMARKS[path] == {'previousRows': first, 'rows': last}
+    assert os.stat(first_segment).st_mtime_ns == first_segment_stat.st_mtime_ns
+    assert os.path.exists(os.path.join(cacheDir, f"{spec['columns'][0]}.2.npy"))
+
+    # il cache aggiornato è valido per la lettura successiva
+    cached = read(spec, path)
+    assert main.INGESTION_WATERMARKS[path] == {'previousRows': 1250, 'rows': 1250}
+
+    monkeypatch.setattr(main, 'USE_COLUMNAR_CACHE', False)
+    full = read(spec, path)
+    for df in (appended, cached):
+        pd.testing.assert_frame_equal(df.astype({column: str for column in df.select_dtypes('category')}),
+                                      full.astype({column: str for column in full.select_dtypes(['category', 'object', 'string'])}),
+                                      check_dtype=False)
+
+def test_rewritten_file_is_read_again(cache):
+    path = str(cache / "data.csv")
+    with open(path, "w") as f:
+        f.write(transactions_rows(0, 100))
+    read(TRANSACTIONS_SPEC, path)
+    with open(path, "w") as f:
+        f.write(transactions_rows(10, 150))
+    df = read(TRANSACTIONS_SPEC, path)
+    assert main.INGESTION_WATERMARKS[path] == {'previousRows': 0, 'rows': 140}
+    assert df['txId'].tolist() == list(range(10, 150))
+
+def test_incremental_pipeline_without_metrics_cube(monkeypatch):
+    # il cubo sarebbe ricostruito per intero ad ogni aggiornamento (la sua firma cambia con l'append)
+    monkeypatch.setattr(main, 'STREAMING_MODE', False)
+    monkeypatch.setattr(main, 'INCREMENTAL_INGESTION', True)
+    names = [stage.name for stage in main.getPipelineStages()]
+    assert 'daily metrics' not in names and 'metrics cube' not in names
+    assert {'new rows', 'monthly analysis', 'pool statistics'} <= set(names)
+
+    monkeypatch.setattr(main, 'INCREMENTAL_INGESTION', False)
+    assert {'daily metrics', 'metrics cube'} <= {stage.name for stage in main.getPipelineStages()}
+
+def test_append_keeps_missing_values(cache, monkeypatch):
+    path = str(cache / "map.csv")
+    with open(path, "w") as f:
+        f.write(",0\nhash1,1\n")
+    read(MAP_SPEC, path)
+    with open(path, "a") as f:
+        f.write("hash2,2\n,3\nhash1,4\n")
+    appended = read(MAP_SPEC, path)
+    assert main.INGESTION_WATERMARKS[path] == {'previousRows': 2, 'rows': 5}
+    # i valori mancanti delle righe nuove restano mancanti (codice -1), non diventano la categoria 'nan'
+    assert appended['txHash'].isna().tolist() == [True, False, False, True, False]
+    assert 'nan' not in appended['txHash'].cat.categories
+    assert appended['txHash'].astype(object).tolist()[1:3] == ['hash1', 'hash2']
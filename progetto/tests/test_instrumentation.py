@@ -0,0 +1,16 @@
+import instrumentation
+from instrumentation import Tracer
+
+
+def test_memory_gauges_without_resource(monkeypatch):
+    # su Windows il modulo resource non esiste : il picco di RSS non è disponibile
+    monkeypatch.setattr(instrumentation, 'resource', None)
+    assert instrumentation.get_peak_rss_mb() is None
+    tracer = Tracer(traceDir=None, isEnabled=True, traceMemory=False)
+    tracer.update_memory_gauges()
+    assert 'peak rss mb' not in tracer.gauges
+
+def test_memory_gauges():
+    tracer = Tracer(traceDir=None, isEnabled=True, traceMemory=False)
+    tracer.update_memory_gauges()
+    assert tracer.gauges['peak rss mb'] > 0
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+import main
+from benchmark import synthetic_dataset
+from dataset_analysis import analizer
+from dataset_analysis.metrics_cube import MetricsCube
+
+
+def read(spec, path):
+    return pd.read_csv(path, usecols=spec['usecols'], dtype=spec['schema'], names=spec['columns'])
+
+@pytest.fixture(scope="module")
+def dataframes(tmp_path_factory):
+    # un blocco ogni 12 ore : ~ 2 anni di blocchi, per avere molti mesi e bimestri
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(synthetic_dataset, 'BLOCK_INTERVAL_SECONDS', 12 * 3600)
+        paths = synthetic_dataset.generate_dataset(str(tmp_path_factory.mktemp("dataset")), 80_000, seed=3)['paths']
+    inputs = read(main.INPUTS_CSV_SPEC, paths['inputs'])[['txId']].drop_duplicates(subset=['txId'])
+    outputs = read(main.OUTPUTS_CSV_SPEC, paths['outputs']).drop_duplicates(subset=['txId'])
+    transactions = read(main.TRANSACTIONS_CSV_SPEC, paths['transactions']).drop_duplicates(subset=['txId'])
+
+    coinbase = transactions.loc[transactions['isCoinbase'] == 1].merge(outputs, on='txId')
+    coinbase['pool'] = np.array(synthetic_dataset.POOL_NAMES)[coinbase['addressId'].to_numpy() % 5 % 4]
+    coinbase_associated = coinbase.loc[coinbase['addressId'] % 5 != 4]
+    notCoinbaseTX = transactions.loc[transactions['isCoinbase'] != 1]
+    return inputs, outputs, notCoinbaseTX, coinbase_associated
+
+
+def test_month_rollup_matches_process_transactions(dataframes):
+    inputs, outputs, notCoinbaseTX, _ = dataframes
+    expected = analizer.processTransactions(inputs, outputs.drop('addressId', axis=1), notCoinbaseTX.drop('blockId', axis=1))
+    month_data_DF = MetricsCube.build(inputs, outputs, notCoinbaseTX).rollup('month')
+    assert len(expected) > 12
+    assert sorted(month_data_DF.columns) == sorted(expected.columns)
+    pd.testing.assert_frame_equal(month_data_DF[expected.columns], expected, check_dtype=False)
+
+@pytest.mark.parametrize("bucket", [None, 'bi_month', 'year'])
+def test_pool_rollup_matches_pool_statistics(dataframes, bucket):
+    inputs, outputs, notCoinbaseTX, coinbase_associated = dataframes
+    cube = MetricsCube.build(inputs, outputs, notCoinbaseTX).with_pools(coinbase_associated)
+    for expected, result in zip(analizer.aggregate_pool_statistics(coinbase_associated, bucket), cube.pool_rollup(bucket)):
+        pd.testing.assert_frame_equal(result.astype({'pool': str}), expected.astype({'pool': str}), check_dtype=False)
+
+def test_cube_without_pools(dataframes):
+    inputs, outputs, notCoinbaseTX, _ = dataframes
+    blocks_mined, total_rewards = MetricsCube.build(inputs, outputs, notCoinbaseTX).pool_rollup('bi_month')
+    assert len(blocks_mined) == 0 and len(total_rewards) == 0
+
+def test_process_backend_matches_thread_backend(dataframes, monkeypatch):
+    # più range di txId : i worker sono processi avviati dal fork server
+    monkeypatch.setattr(analizer, 'MIN_ROWS_PER_RANGE', 10_000)
+    monkeypatch.setattr(analizer, 'MAX_PROCESS_QUANTITY', 2)
+    inputs, outputs, notCoinbaseTX, _ = dataframes
+    args = (inputs, outputs.drop('addressId', axis=1), notCoinbaseTX.drop('blockId', axis=1))
+    pd.testing.assert_frame_equal(analizer.processTransactions(*args, backend='process'), analizer.processTransactions(*args, backend='thread'))
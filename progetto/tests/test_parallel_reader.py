@@ -0,0 +1,50 @@
+import pandas as pd
+import pytest
+from dataset_analysis import parallel_reader
+
+SCHEMA = {'txId': 'int32', 'label': 'category', 'amount': 'int64'}
+COLUMNS = ['txId', 'label', 'amount']
+
+
+def write(path, text):
+    with open(path, "w", newline="") as f:
+        f.write(text)
+    return str(path)
+
+def expected(path, usecols = (0, 1, 2)):
+    return pd.read_csv(path, usecols=list(usecols), dtype=SCHEMA, names=COLUMNS)
+
+def assert_same(df, expectedDF):
+    pd.testing.assert_frame_equal(df.astype({'label': object}), expectedDF.astype({'label': object}))
+
+def test_ranges_end_exactly_on_newlines(tmp_path):
+    # 8 righe di 10 byte : i punti di taglio cadono esattamente dopo un newline
+    path = write(tmp_path / "data.csv", "".join(f"{i},h{i:02d},{i:03d}\n" for i in range(8)))
+    assert parallel_reader.split_byte_ranges(path, 4) == [(0, 20), (20, 40), (40, 60), (60, 80)]
+    assert parallel_reader.split_byte_ranges(path, 4, startByte=40) == [(40, 50), (50, 60), (60, 70), (70, 80)]
+    assert parallel_reader.split_byte_ranges(path, 4, startByte=80) == []
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_ranges_match_read_csv(tmp_path, processes):
+    # campi tra virgolette (con virgole), valori mancanti e ultima riga senza newline
+    lines = [f'{i},"h{i % 5}, quoted",{i * 7}' if i % 3 == 0 else f"{i},{'' if i % 4 == 1 else f'h{i % 5}'},{i * 7}" for i in range(200)]
+    path = write(tmp_path / "data.csv", "\n".join(lines))
+    ranges = parallel_reader.split_byte_ranges(path, 16)
+    assert len(ranges) == 16
+    assert ranges[0][0] == 0 and ranges[-1][1] == len("\n".join(lines))
+    assert all(end == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+
+    df = parallel_reader.read_csv_parallel(SCHEMA, COLUMNS, [0, 1, 2], path, processes)
+    assert_same(df, expected(path))
+
+def test_appended_rows_by_start_byte(tmp_path):
+    head = "".join(f"{i},h{i},{i}\n" for i in range(10))
+    path = write(tmp_path / "data.csv", head + "".join(f"{i},h{i},{i}\n" for i in range(10, 30)))
+    df = parallel_reader.read_csv_parallel(SCHEMA, COLUMNS, [0, 1, 2], path, 1, startByte=len(head))
+    assert df['txId'].tolist() == list(range(10, 30))
+
+def test_range_with_only_missing_values(tmp_path):
+    path = write(tmp_path / "data.csv", "".join(f"{i},,{i}\n" for i in range(50)) + "".join(f"{i},h1,{i}\n" for i in range(50, 100)))
+    df = parallel_reader.read_csv_parallel(SCHEMA, COLUMNS, [0, 1, 2], path, 1)
+    assert_same(df, expected(path))
+    assert list(df['label'].cat.categories) == ['h1']
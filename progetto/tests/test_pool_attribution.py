@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+from dataset_analysis.hash_index import AddressHashIndex
+from dataset_analysis.pool_attribution import PoolAttribution, NO_POOL
+
+
+def address_index():
+    # map csv : hash -> addressId
+    return AddressHashIndex.from_hashes(np.array(['a', 'b', 'c', 'd', 'e'], dtype=object), [1, 2, 3, 5, 8])
+
+def attribution():
+    pools = pd.DataFrame({
+        'txHash': ['a', 'b', 'd', 'b', 'zz'],
+        'pool': ['Eligius', 'DeepBit', 'Eligius', 'BTCGuild', 'Slush'],
+    })
+    return PoolAttribution.from_pool_addresses(pools, address_index())
+
+def test_label():
+    attr = attribution()
+    # gli hash non presenti nella map csv sono ignorati
+    assert attr.pools.tolist() == ['BTCGuild', 'DeepBit', 'Eligius']
+    labels = attr.label([1, 2, 3, 5, 8, 100, -1])
+    assert [attr.pools[code] if code != NO_POOL else None for code in labels] == ['Eligius', 'DeepBit', None, 'Eligius', None, None, None]
+
+def test_repeated_address_keeps_first_pool():
+    # 'b' è associato prima a DeepBit e poi a BTCGuild
+    attr = attribution()
+    assert attr.pools[attr.label([2])[0]] == 'DeepBit'
+
+def test_split_coinbase():
+    attr = attribution()
+    coinbaseOutputs = pd.DataFrame({'txId': [10, 11, 12, 13, 14], 'addressId': [1, 3, 5, 42, 2], 'amount': [50, 25, 25, 12, 6]})
+    associated, notAssociated = attr.split_coinbase(coinbaseOutputs, address_index())
+    assert associated[['txId', 'pool']].values.tolist() == [[10, 'Eligius'], [12, 'Eligius'], [14, 'DeepBit']]
+    # l'addressId 42 non è nella map csv -> né associato né non associato
+    assert notAssociated['txId'].tolist() == [11]
+
+def test_without_pools():
+    attr = PoolAttribution.from_pool_addresses(pd.DataFrame({'txHash': ['zz'], 'pool': ['Slush']}), address_index())
+    assert attr.label([1, 2]).tolist() == [NO_POOL, NO_POOL]
+    associated, notAssociated = attr.split_coinbase(pd.DataFrame({'txId': [1], 'addressId': [1], 'amount': [50]}), address_index())
+    assert len(associated) == 0 and notAssociated['txId'].tolist() == [1]
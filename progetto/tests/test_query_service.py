@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+from utilities import SECONDS_PER_DAY
+from dataset_analysis.metrics_cube import MetricsCube
+from query_service import QueryEngine, QueryService, QueryClient
+
+FIRST_DAY = int(np.datetime64('2010-01-01').astype('int64'))
+DAYS = 90 # 2010-01-01 .. 2010-03-31
+
+
+@pytest.fixture(scope="module")
+def client():
+    days = np.arange(DAYS, dtype='int64')
+    script_type_counts = np.stack((days % 3, np.ones(DAYS, dtype='int64')), axis=1)
+    pool_blocks = np.stack((days % 2, np.ones(DAYS, dtype='int64')), axis=1)
+    cube = MetricsCube(FIRST_DAY, days * 10, days + 1, days + 2, days * 100, np.array([1, 2]), script_type_counts,
+                       FIRST_DAY, np.array(['BTCGuild', 'Eligius']), pool_blocks, pool_blocks * 50)
+    coinbaseNotAssociated = pd.DataFrame({
+        'timestamp': (FIRST_DAY + days) * SECONDS_PER_DAY,
+        'addressId': np.where(days < 30, 7, days % 4),
+    })
+    # un blocco al giorno, alternato tra i due pool
+    coinbaseAssociated = pd.DataFrame({
+        'timestamp': (FIRST_DAY + days) * SECONDS_PER_DAY,
+        'blockId': days,
+        'pool': np.where(days % 2 == 0, 'BTCGuild', 'Eligius'),
+        'amount': np.full(DAYS, 50, dtype='int64'),
+    })
+    results = {'metrics_cube': cube, 'coinbaseNotAssociated': coinbaseNotAssociated, 'coinbase_associated': coinbaseAssociated}
+    service = QueryService(QueryEngine(results), host='127.0.0.1', port=0)
+    service.start()
+    yield QueryClient(*service.address, timeout=10)
+    service.stop()
+
+
+def test_health(client):
+    assert client.health() == {'status': 'ok'}
+
+def test_metrics(client):
+    months = client.metrics('month')
+    assert months['month'].tolist() == ['2010-01', '2010-02', '2010-03']
+    assert months['fees'].tolist() == [sum(range(0, 31)) * 10, sum(range(31, 59)) * 10, sum(range(59, 90)) * 10]
+
+    february = client.metrics('day', start='2010-02', end='2010-03')
+    assert len(february) == 28
+    assert february['fees'].sum() == sum(range(31, 59)) * 10
+
+def test_pools(client):
+    pools = client.pools(start='2010-01', end='2010-02')
+    assert pools.set_index('pool')['blocks_mined'].to_dict() == {'BTCGuild': 15, 'Eligius': 31}
+    assert pools.set_index('pool')['total_rewards'].to_dict() == {'BTCGuild': 750, 'Eligius': 1550}
+
+    quarters = client.pools(bucket='quarter')
+    assert quarters['blocks_mined'].sum() == 45 + 90
+
+def test_pools_by_blocks(client):
+    pools = client.pools(bucket='10', start='2010-02')
+    assert pools['blocks_mined'].sum() == DAYS - 31
+    assert pools['total_rewards'].sum() == (DAYS - 31) * 50
+    assert pools.groupby('pool')['blocks_mined'].sum().to_dict() == {'BTCGuild': 29, 'Eligius': 30}
+    assert pools.iloc[:, 1].nunique() == 6 # blocchi 31..89 in 6 bucket di 10 blocchi
+
+def test_top_miners(client):
+    top = client.top_miners(k=1)
+    assert top['addressId'].tolist() == [7]
+    assert top['blocks_mined'].tolist() == [30]
+
+    top = client.top_miners(k=2, start='2010-02')
+    assert sorted(top['blocks_mined'].tolist()) == [15, 15]
+
+@pytest.mark.parametrize("path", ['metrics', 'pools', 'top_miners'])
+def test_empty_range(client, path):
+    # intervalli senza dati : risposta vuota (non un errore del server)
+    assert len(getattr(client, path)(start='2009-03', end='2009-05')) == 0
+    assert len(getattr(client, path)(start='2010-02', end='2010-02')) == 0
+    assert len(getattr(client, path)(start='2012', end='2013')) == 0
+
+@pytest.mark.parametrize("path", ['metrics', 'pools', 'top_miners'])
+def test_invalid_range(client, path):
+    with pytest.raises(ValueError, match=r"\(400\)"):
+        getattr(client, path)(start='2012', end='2011')
+    with pytest.raises(ValueError, match=r"\(400\)"):
+        getattr(client, path)(start='2010-13')
+
+def test_invalid_bucket(client):
+    with pytest.raises(ValueError, match=r"\(400\)"):
+        client.metrics('fortnight')
+
+def test_unexpected_error(client, monkeypatch):
+    def broken(*args, **kwargs):
+        raise IndexError("broken")
+    monkeypatch.setattr(QueryEngine, 'metrics', broken)
+    with pytest.raises(ValueError, match=r"\(500\)"):
+        client.metrics()
+    assert client.health() == {'status': 'ok'}
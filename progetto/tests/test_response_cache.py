@@ -0,0 +1,69 @@
+import os
+import pytest
+from scraping import http_backend
+from scraping.http_backend import PageError
+from scraping.response_cache import ResponseCache, CacheMiss, normalize_url
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+URL = "https://www.walletexplorer.com/txid/6b86b273ff34fce19d6b804eff5a3f5747ada4eaa22f1d49c01e52ddb7875b4b"
+
+
+class FakeDownload:
+    """Download function of the cache recording the requests"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def __call__(self, url, headers):
+        self.requests.append((url, dict(headers)))
+        return self.responses.pop(0)
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_PATH, name), "r", encoding="utf8") as file:
+        return file.read()
+
+def test_fresh_hit_without_requests(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl=3600)
+    download = FakeDownload((200, "page", {}))
+    assert cache.fetch(URL, download) == "page"
+    assert cache.fetch(URL, download) == "page"
+    assert len(download.requests) == 1
+    assert cache.is_fresh(URL)
+
+def test_stale_entry_revalidated_by_304(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl=0)
+    download = FakeDownload((200, "page", {'ETag': '"v1"', 'Last-Modified': 'Tue, 03 Jan 2012 21:11:58 GMT'}), (304, "", {}))
+    assert cache.fetch(URL, download) == "page"
+    assert cache.fetch(URL, download) == "page"
+    assert download.requests[1][1] == {'If-None-Match': '"v1"', 'If-Modified-Since': 'Tue, 03 Jan 2012 21:11:58 GMT'}
+    assert cache.lookup(URL)['body'] == "page"
+
+def test_offline_miss(tmp_path):
+    ResponseCache(str(tmp_path), mode='online').fetch(URL, FakeDownload((200, "page", {})))
+    cache = ResponseCache(str(tmp_path), ttl=0, mode='offline')
+    download = FakeDownload()
+    # in offline anche una entry scaduta è servita, una pagina mancante è un CacheMiss
+    assert cache.fetch(URL, download) == "page"
+    with pytest.raises(CacheMiss):
+        cache.fetch(URL + "0", download)
+    assert download.requests == []
+
+def test_normalize_url():
+    assert normalize_url("HTTPS://WWW.WalletExplorer.com:443/wallet/Eligius/addresses?page=2&b=1#top") == \
+        "https://www.walletexplorer.com/wallet/Eligius/addresses?b=1&page=2"
+    assert normalize_url("http://walletexplorer.com:8080") == "http://walletexplorer.com:8080/"
+    cache = ResponseCache("unused")
+    assert cache._entry_path("https://www.walletexplorer.com/?q=abc#x") == cache._entry_path("https://WWW.walletexplorer.com:443/?q=abc")
+
+def test_unexpected_page_not_stored(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl=3600)
+    parse = lambda html: http_backend.parse_tx_node(html, URL.split('/')[-1])
+    download = FakeDownload((200, read_fixture("not_found_page.html"), {}), (200, read_fixture("tx_page.html"), {}))
+    with pytest.raises(PageError):
+        cache.fetch(URL, download, parse=parse)
+    assert cache.lookup(URL) is None
+    # la pagina valida è scaricata di nuovo e salvata
+    assert cache.fetch(URL, download, parse=parse)['txId'] == URL.split('/')[-1]
+    assert cache.fetch(URL, download, parse=parse)['outputs']
+    assert len(download.requests) == 2
@@ -0,0 +1,34 @@
+import threading
+import time
+from stage_scheduler import Stage, StageScheduler
+
+
+def test_exclusive_resources_are_not_shared():
+    lock = threading.Lock()
+    active = {'readers': 0, 'max readers': 0, 'others': 0}
+
+    def reader(value):
+        def read():
+            with lock:
+                active['readers'] += 1
+                active['max readers'] = max(active['max readers'], active['readers'])
+            time.sleep(0.05)
+            with lock:
+                active['readers'] -= 1
+            return value
+        return read
+
+    def other():
+        time.sleep(0.025)
+        with lock:
+            active['others'] = active['readers']
+        return 'other'
+
+    stages = [Stage(f'read {name}', reader(name), outputs=[name], resources=['csv reader']) for name in ('a', 'b', 'c')]
+    stages.append(Stage('other', other, outputs=['d']))
+    stages.append(Stage('join', lambda a, b, c, d: a + b + c + d, inputs=['a', 'b', 'c', 'd'], outputs=['abcd']))
+    values = StageScheduler(stages, maxWorkers=4).run()
+
+    assert values['abcd'] == 'abcother'
+    assert active['max readers'] == 1
+    assert active['others'] == 1 # the stages without resources still overlap the readers
@@ -0,0 +1,35 @@
+import pandas as pd
+import main
+from benchmark import synthetic_dataset
+from dataset_analysis import analizer, streaming_analizer
+
+
+def read(spec, path, chunksize = None):
+    return pd.read_csv(path, usecols=spec['usecols'], dtype=spec['schema'], names=spec['columns'], chunksize=chunksize)
+
+def test_streaming_matches_in_memory_analysis(tmp_path, monkeypatch):
+    # un blocco ogni 12 ore : molti mesi
+    monkeypatch.setattr(synthetic_dataset, 'BLOCK_INTERVAL_SECONDS', 12 * 3600)
+    paths = synthetic_dataset.generate_dataset(str(tmp_path), 30_000, seed=7)['paths']
+    # codici di script negativi (int8) : contati e dimensionati come nell'analisi in memoria (-3 -> 253)
+    monkeypatch.setitem(analizer.SCRIPT_TYPE_MAP, 253, 'P2TR')
+    monkeypatch.setitem(analizer.SCRIPT_SIZE_MAP, 253, 120)
+    outputs_csv = pd.read_csv(paths['outputs'], header=None)
+    scriptTypeColumn = main.OUTPUTS_CSV_SPEC['usecols'][main.OUTPUTS_CSV_SPEC['columns'].index('scriptType')]
+    outputs_csv.loc[outputs_csv.index % 7 == 0, scriptTypeColumn] = -3
+    outputs_csv.to_csv(paths['outputs'], header=False, index=False)
+
+    aggregator = streaming_analizer.streamMonthlyAnalysis(
+        read(main.TRANSACTIONS_CSV_SPEC, paths['transactions'], 5_000),
+        read(main.INPUTS_CSV_SPEC, paths['inputs'], 5_000),
+        read(main.OUTPUTS_CSV_SPEC, paths['outputs'], 5_000),
+    )
+    inputs = read(main.INPUTS_CSV_SPEC, paths['inputs'])[['txId']].drop_duplicates(subset=['txId'])
+    outputs = read(main.OUTPUTS_CSV_SPEC, paths['outputs']).drop_duplicates(subset=['txId'])
+    transactions = read(main.TRANSACTIONS_CSV_SPEC, paths['transactions']).drop_duplicates(subset=['txId'])
+    notCoinbaseTX = transactions.loc[transactions['isCoinbase'] != 1].drop('blockId', axis=1)
+    expected = analizer.processTransactions(inputs, outputs.drop('addressId', axis=1), notCoinbaseTX)
+
+    month_data_DF = aggregator.get_month_data()
+    assert len(expected) > 6 and expected['P2TR'].sum() > 0
+    pd.testing.assert_frame_equal(month_data_DF[expected.columns], expected, check_dtype=False)
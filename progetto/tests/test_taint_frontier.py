@@ -0,0 +1,79 @@
+import json
+from scraping.taint_frontier import TaintFrontier, is_tx_id
+
+
+def tx(number):
+    return f"{number:064x}"
+
+
+def test_is_tx_id():
+    assert is_tx_id(tx(1))
+    assert not is_tx_id("1BitcoinEaterAddressDontSendf59kuE")
+    assert not is_tx_id(None)
+
+def test_dedupe():
+    frontier = TaintFrontier(maxDepth=3)
+    assert frontier.push(tx(1), 1)
+    # stessa transazione dallo stesso livello -> un riferimento in più, nessun nuovo nodo
+    assert not frontier.push(tx(1), 1)
+    # raggiunta da un altro cammino più profondo -> resta alla prima profondità
+    assert not frontier.push(tx(1), 2)
+    # oltre la profondità massima
+    assert not frontier.push(tx(2), 3)
+    assert len(frontier) == 1
+
+    node = {'txId': tx(0), 'inputs': [], 'outputs': [tx(1), tx(3), "1Address", "wallet name"]}
+    assert frontier.push_outputs(node, 0) == 1
+    assert not frontier.push(tx(0), 1)
+    assert frontier.pop_level() == (1, [tx(1), tx(3)])
+    assert frontier.pop_level() == (None, [])
+
+def test_priority():
+    frontier = TaintFrontier(maxDepth=3)
+    for txId in (tx(1), tx(2), tx(3), tx(2), tx(3), tx(3), tx(4)):
+        frontier.push(txId, 1)
+    frontier.push(tx(5), 0)
+    # il livello più basso prima, poi per riferimenti e per ordine di scoperta
+    assert frontier.pop_level() == (0, [tx(5)])
+    assert frontier.pop_level() == (1, [tx(3), tx(2), tx(1), tx(4)])
+
+def test_budget():
+    frontier = TaintFrontier(maxDepth=5, maxNodes=3)
+    for number in range(2):
+        frontier.push(tx(number), 1)
+    assert frontier.pop_level() == (1, [tx(0), tx(1)])
+    assert frontier.remaining_budget() == 1
+    for number in range(2, 5):
+        frontier.push(tx(number), 2)
+    frontier.push(tx(9), 3)
+    frontier.push(tx(3), 2)
+    # oltre il budget : restano le transazioni con priorità più alta, i livelli successivi sono scartati
+    assert frontier.pop_level() == (2, [tx(3)])
+    assert frontier.remaining_budget() == 0
+    assert len(frontier) == 0
+    assert frontier.pop_level() == (None, [])
+
+def test_requeue():
+    frontier = TaintFrontier(maxDepth=3, maxNodes=2)
+    frontier.push(tx(1), 1)
+    frontier.push(tx(2), 1)
+    depth, batch = frontier.pop_level()
+    assert frontier.remaining_budget() == 0
+    # tx(2) non è stata scaricata -> di nuovo in attesa, senza consumare budget
+    assert frontier.requeue(tx(2), depth)
+    assert not frontier.requeue(tx(2), depth)
+    assert not frontier.requeue(tx(7), depth)
+    assert frontier.pop_level() == (1, [tx(2)])
+
+def test_state_round_trip():
+    frontier = TaintFrontier(maxDepth=4, maxNodes=10)
+    frontier.push(tx(1), 1)
+    frontier.pop_level()
+    for txId in (tx(2), tx(3), tx(3)):
+        frontier.push(txId, 2)
+
+    restored = TaintFrontier(maxDepth=4, maxNodes=10)
+    restored.set_state(json.loads(json.dumps(frontier.get_state())))
+    assert not restored.push(tx(1), 3)
+    assert restored.remaining_budget() == 9
+    assert restored.pop_level() == frontier.pop_level() == (2, [tx(3), tx(2)])
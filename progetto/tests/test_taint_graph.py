@@ -0,0 +1,56 @@
+import pandas as pd
+from dataset_analysis import taint_graph
+from dataset_analysis.taint_graph import SpentByIndex
+from dataset_analysis.tx_index import TxRowsIndex
+from graphic import plot_creator
+
+# input (txId, prevTxId, prevTxpos) : txId spende l'output prevTxpos di prevTxId
+#   0 -> 1, 2     1 -> 2, 3     2 -> 3, 5     3 -> 4
+INPUT_LINKS = pd.DataFrame(
+    [(3, 2, 0), (1, 0, 0), (2, 1, 0), (5, 2, 1), (2, 0, 1), (4, 3, 0), (3, 1, 1)],
+    columns=['txId', 'prevTxId', 'prevTxpos']
+).astype('int32')
+
+
+def get_nodes(steps, maxNodes = None):
+    return taint_graph.get_taint_nodes(INPUT_LINKS, TxRowsIndex.from_txIds(INPUT_LINKS['txId']), 
+                                       SpentByIndex.from_inputs(INPUT_LINKS), 0, steps, maxNodes)
+
+def test_spent_by_index():
+    spentByIndex = SpentByIndex.from_inputs(INPUT_LINKS)
+    assert spentByIndex.spender_of(2, 1) == 5
+    assert spentByIndex.spender_of(4, 0) is None
+    counts, spenders = spentByIndex.spenders_of([1, 4, 2])
+    assert counts.tolist() == [2, 0, 2]
+    assert spenders.tolist() == [2, 3, 3, 5]
+
+def test_k_step_traversal():
+    # ogni transazione è visitata una volta sola, al suo primo passo (2 è raggiunta da 0 e da 1)
+    assert get_nodes(3) == [
+        {'txId': 0, 'inputs': [], 'outputs': [1, 2]},
+        {'txId': 1, 'inputs': [0], 'outputs': [2, 3]},
+        {'txId': 2, 'inputs': [1, 0], 'outputs': [3, 5]},
+        {'txId': 3, 'inputs': [2, 1], 'outputs': [4]},
+        {'txId': 5, 'inputs': [2], 'outputs': []},
+    ]
+    assert [node['txId'] for node in get_nodes(1)] == [0]
+    assert [node['txId'] for node in get_nodes(10)] == [0, 1, 2, 3, 5, 4]
+
+def test_budget_keeps_most_referenced():
+    # al passo 2 entra solo 3 (spesa da due nodi visitati) e non 5
+    assert [node['txId'] for node in get_nodes(3, maxNodes=4)] == [0, 1, 2, 3]
+
+def test_save_and_load(tmp_path):
+    spentByIndex = SpentByIndex.from_inputs(INPUT_LINKS)
+    spentByIndex.save(str(tmp_path), {'rows': 7})
+    assert SpentByIndex.load(str(tmp_path), {'rows': 8}) is None
+    loaded = SpentByIndex.load(str(tmp_path), {'rows': 7})
+    assert loaded.keys.tolist() == spentByIndex.keys.tolist()
+    assert loaded.spendingTxIds.tolist() == spentByIndex.spendingTxIds.tolist()
+
+def test_nodes_plotted_as_eligius_graph(monkeypatch):
+    graphs = []
+    monkeypatch.setattr(plot_creator.nx, 'draw', lambda graph, *args, **kwargs: graphs.append(graph))
+    monkeypatch.setattr(plot_creator.plt, 'show', lambda: None)
+    plot_creator.plot_Eligius_path(pd.DataFrame(get_nodes(3)))
+    assert sorted(graphs[0].edges) == [(0, 1), (0, 2), (1, 2), (1, 3), (2, 3), (2, 5), (3, 4)]
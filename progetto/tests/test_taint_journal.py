@@ -0,0 +1,62 @@
+import hashlib
+import pytest
+from utilities import SETTINGS
+from scraping import scraper
+
+STEPS = 4
+
+
+def tx_hash(value):
+    return hashlib.sha256(value.encode()).hexdigest()
+
+class Crash(BaseException):
+    """Interruption of the crawl (not handled by the crawler, as a KeyboardInterrupt)"""
+
+class FakeTxPages:
+    """Fake transaction pages: every transaction has 2 outputs to new transactions and an address"""
+    def __init__(self, failures = (), crashAfter = None):
+        self.failures = set(failures)
+        self.crashAfter = crashAfter
+        self.fetched = []
+
+    def __call__(self, txId, raiseErrors = False):
+        if self.crashAfter is not None and len(self.fetched) >= self.crashAfter:
+            raise Crash()
+        self.fetched.append(txId)
+        if txId in self.failures:
+            raise RuntimeError(f"page of {txId} not loaded")
+        return {'txId': txId, 'inputs': [], 'outputs': [tx_hash(txId + "0"), tx_hash(txId + "1"), "1BitcoinAddress"]}
+
+@pytest.fixture
+def crawl(tmp_path, monkeypatch):
+    monkeypatch.setattr(scraper, 'TAINT_JOURNAL_PATH', str(tmp_path / "journal.jsonl"))
+    monkeypatch.setitem(SETTINGS, 'ELIGIUS_ANALYSIS_STEPS', STEPS)
+    def run(pages):
+        monkeypatch.setattr(scraper, 'getTxAsNode', pages)
+        return scraper.getEligius_taint_analysis(resume=True)
+    return run
+
+def by_txId(nodes):
+    return sorted(nodes, key=lambda node: node['txId'])
+
+
+def test_completed_crawl_is_not_resumed(crawl):
+    first = FakeTxPages()
+    nodes = crawl(first)
+    assert len(nodes) == len(first.fetched) == 2**STEPS - 1
+
+    second = FakeTxPages()
+    assert by_txId(crawl(second)) == by_txId(nodes)
+    assert len(second.fetched) == len(first.fetched)
+
+def test_resumed_crawl_matches_uninterrupted_crawl(crawl):
+    failing = tx_hash(scraper.ELIGIUS_COINBASE_TX + "1")
+    reference = crawl(FakeTxPages(failures={failing}))
+    assert {'txId': failing, 'inputs': [], 'outputs': []} in reference
+
+    with pytest.raises(Crash):
+        crawl(FakeTxPages(failures={failing}, crashAfter=5))
+    resumed = FakeTxPages(failures={failing})
+    nodes = crawl(resumed)
+    assert by_txId(nodes) == by_txId(reference)
+    assert len(resumed.fetched) < len(reference)
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import main
+from benchmark import synthetic_dataset
+from dataset_analysis import streaming_analizer, top_k
+
+
+def iter_csv(spec, path):
+    return pd.read_csv(path, usecols=spec['usecols'], dtype=spec['schema'], names=spec['columns'], chunksize=5_000)
+
+def test_streaming_sketches_match_exact_top_k(tmp_path):
+    paths = synthetic_dataset.generate_dataset(str(tmp_path), 30_000, seed=5)['paths']
+    # capacità maggiore dei miner distinti : il sketch è esatto
+    topMiners = top_k.MisraGriesSketch(100_000)
+    topMinersPerYear = top_k.PeriodTopK(4, 100_000, 'year')
+    aggregator = streaming_analizer.streamMonthlyAnalysis(
+        iter_csv(main.TRANSACTIONS_CSV_SPEC, paths['transactions']),
+        iter_csv(main.INPUTS_CSV_SPEC, paths['inputs']),
+        iter_csv(main.OUTPUTS_CSV_SPEC, paths['outputs']),
+        topMiners, topMinersPerYear
+    )
+    coinbase = aggregator.get_coinbase_outputs()
+    notAssociated = coinbase.loc[coinbase['addressId'] % 3 == 0]
+    candidates = np.unique(notAssociated['addressId'].to_numpy())
+
+    expected = top_k.top_k_exact(notAssociated['addressId'], 4)
+    top_miners = topMiners.top_k(4, candidates)
+    assert (top_miners['max_error'] == 0).all()
+    assert top_miners['blocks_mined'].tolist() == expected['blocks_mined'].tolist()
+    assert set(top_miners['addressId']) <= set(candidates)
+
+    expected = top_k.top_k_exact_per_period(notAssociated, 4, 'year')
+    top_miners_per_year = topMinersPerYear.top_k(candidates)
+    assert top_miners_per_year['year'].tolist() == expected['year'].tolist()
+    assert top_miners_per_year['blocks_mined'].tolist() == expected['blocks_mined'].tolist()
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from dataset_analysis.tx_index import TxRowsIndex, MISSING_ROW
+
+SORTED_TXIDS = np.array([0, 0, 1, 3, 3, 3, 5])
+UNSORTED_TXIDS = np.array([3, 0, 5, 3, 1, 0, 3])
+
+
+@pytest.mark.parametrize("txIds", [SORTED_TXIDS, UNSORTED_TXIDS])
+def test_rows_match_masks(txIds):
+    index = TxRowsIndex.from_txIds(txIds)
+    assert index.tx_quantity == 6
+    for txId in range(-1, 8):
+        # le righe di una transazione sono quelle della maschera txIds == txId (in ordine)
+        assert index.rows_of(txId).tolist() == np.flatnonzero(txIds == txId).tolist()
+
+    queried = np.array([5, 2, 3, 9, -1, 0])
+    assert index.counts(queried).tolist() == [int((txIds == txId).sum()) for txId in queried]
+    assert index.rows_of_many(queried).tolist() == [row for txId in queried for row in np.flatnonzero(txIds == txId)]
+    assert index.first_rows(queried).tolist() == [int(np.flatnonzero(txIds == txId)[0]) if (txIds == txId).any() else MISSING_ROW
+                                                  for txId in queried]
+
+def test_empty_index():
+    index = TxRowsIndex.from_txIds(np.array([], dtype='int64'))
+    assert index.tx_quantity == 0
+    assert len(index.rows_of(0)) == 0
+    assert index.counts([0, 1]).tolist() == [0, 0]
+    assert len(index.rows_of_many([0])) == 0
+    assert index.first_rows([0]).tolist() == [MISSING_ROW]
+
+def test_save_and_load(tmp_path):
+    index = TxRowsIndex.from_txIds(UNSORTED_TXIDS)
+    index.save(str(tmp_path), {'size': 7})
+    assert TxRowsIndex.load(str(tmp_path), {'size': 8}) is None
+    loaded = TxRowsIndex.load(str(tmp_path), {'size': 7})
+    assert loaded.offsets.tolist() == index.offsets.tolist()
+    assert loaded.rows_of_many([3, 0]).tolist() == [0, 3, 6, 1, 5]
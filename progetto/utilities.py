@@ -1,10 +1,44 @@
+import numpy as np
 import pandas as pd
 import datetime
 
 SETTINGS = {
     'MAX_THREAD_QUANTITY' : 13,
     'ELIGIUS_ANALYSIS_STEPS':7,
-    'SELENIUM_HEADLESS_MODE' : True
+    'TAINT_MAX_NODES' : 5000, # budget of the Eligius taint analysis: max transactions fetched (None = no budget)
+    'TAINT_JOURNAL_PATH' : 'scraping/taintJournal/eligius.jsonl', # checkpoints of the taint analysis crawl (relative to the progetto directory)
+    'TAINT_RESUME' : True, # True = resume an interrupted crawl of the journal (same steps and budget), False = start a new crawl (a completed crawl is never resumed)
+    'TAINT_ANALYSIS_BACKEND' : 'scraping', # 'scraping' (WalletExplorer pages, from ELIGIUS_COINBASE_TX, nodes = transaction hashes) or 'offline' (spent-by index of the inputs csv, see dataset_analysis/taint_graph.py, nodes = integer txIds of the dataset), streaming mode uses 'scraping'
+    'TAINT_ROOT_TX_ID' : None, # txId of the dataset of the first transaction of the offline taint analysis (None = smallest txId of the coinbase transactions attributed to Eligius, the pools are scraped: set it for a run without network)
+    'SELENIUM_HEADLESS_MODE' : True,
+    'SELENIUM_POOL_SIZE' : 7, # max Selenium drivers alive at the same time (shared pool, see scraping/driver_pool.py)
+    'SELENIUM_DRIVER_MAX_PAGES' : 50, # pages served by a driver before it is quit and replaced
+    'SCRAPING_BACKEND' : 'http', # 'http' (pooled HTTP session + HTML parsing) or 'selenium' (headless Chrome) for paging info, addresses pages and transaction pages
+    'HTTP_TIMEOUT_SECONDS' : 30,
+    'HTTP_MAX_ATTEMPTS' : 5, # attempts of a page request of the http backend (exponential backoff between them)
+    'CRAWLER_HOST_CONCURRENCY' : 4, # max concurrent requests to a host of the async crawler of the pools addresses
+    'CRAWLER_MIN_INTERVAL_SECONDS' : 0.25, # min interval between two requests to a host (politeness budget)
+    'CRAWLER_ALLOW_MISSING_PAGES' : False, # False = a pool page not fetched after the retries stops the crawl (CrawlError), True = it is skipped (partial pools)
+    'HTTP_CACHE_MODE' : 'online', # 'online' (cached pages + requests), 'offline' (replay: only cached pages, a missing page is an error) or 'disabled'
+    'HTTP_CACHE_DIR' : 'scraping/httpCache', # persistent cache of the scraped pages (relative to the progetto directory)
+    'HTTP_CACHE_TTL_SECONDS' : 30 * 24 * 3600, # cached pages older than this are revalidated (conditional request)
+    'PROXIES_CACHE_TTL_SECONDS' : 600, # the free proxies list changes often
+    'USE_COLUMNAR_CACHE' : True,
+    'PARALLEL_CSV_PARSING' : True,
+    'MAX_PROCESS_QUANTITY' : None, # None = use all the cores
+    'ANALYSIS_BACKEND' : 'thread', # 'thread' or 'process' (monthly analysis by a pool of processes on shared memory columns)
+    'STREAMING_MODE' : False, # True = out-of-core analysis (csv files consumed by chunks)
+    'CHUNK_MEMORY_BUDGET_MB' : 64, # memory budget of a single chunk read by a csv file
+    'ROW_COUNT_MODE' : 'exact', # 'exact' (newline scan) or 'estimate' (sampled byte offsets)
+    'INCREMENTAL_INGESTION' : False, # read only rows appended after the previous run and recalculate only the touched months
+    'TOP_MINERS_QUANTITY' : 4, # k of the top-k miners ranking
+    'TOP_MINERS_MODE' : 'exact', # 'exact' (partial selection) or 'sketch' (Misra-Gries summary updated by chunks, with error bounds), STREAMING_MODE always uses the sketch
+    'TOP_MINERS_SKETCH_CAPACITY' : 1000, # counters of the sketch (error <= rows / (capacity + 1))
+    'QUERY_SERVICE_HOST' : '127.0.0.1', # local query service (query_service.py)
+    'QUERY_SERVICE_PORT' : 8765,
+    'TRACE_ENABLED' : True, # spans, counters and gauges written as json lines (see instrumentation.py)
+    'TRACE_DIR' : 'traces', # directory of the trace files (relative to the progetto directory)
+    'TRACE_MEMORY' : False, # True = peak memory of the python allocations by tracemalloc (slower)
 }
 
 LOG_LEVELS = {
@@ -23,6 +57,118 @@ def preprocess_data(df):
         df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
     return df
 
+SECONDS_PER_DAY = 86400
+
+def day_id(timestamps):
+    """Vectorized conversion of Unix timestamps (UTC) to day bucket ids (number of days since 1970-01-01).
+    
+    @param timestamps : array / Series of Unix timestamps (seconds)
+    @return : numpy array (int32) of day ids
+    """
+    return (np.asarray(timestamps, dtype='int64') // SECONDS_PER_DAY).astype('int32')
+
+def week_id(timestamps):
+    """Vectorized conversion of Unix timestamps (UTC) to week bucket ids 
+    (weeks starting on monday, 1970-01-01 is a thursday).
+    
+    @param timestamps : array / Series of Unix timestamps (seconds)
+    @return : numpy array (int32) of week ids
+    """
+    return (day_id(timestamps) + 3) // 7
+
+def month_id(timestamps):
+    """Vectorized conversion of Unix timestamps (UTC) to month bucket ids 
+    (number of months since 1970-01, ex. 2011-03 -> 41*12+2).
+    
+    @param timestamps : array / Series of Unix timestamps (seconds)
+    @return : numpy array (int32) of month ids
+    """
+    seconds = np.asarray(timestamps, dtype='int64').astype('datetime64[s]')
+    return seconds.astype('datetime64[M]').astype('int64').astype('int32')
+
+def bi_month_id(timestamps):
+    """Vectorized conversion of Unix timestamps (UTC) to bi-month bucket ids
+    (periods of 2 months starting from january : jan-feb, mar-apr, ...).
+    
+    @param timestamps : array / Series of Unix timestamps (seconds)
+    @return : numpy array (int32) of bi-month ids
+    """
+    return month_id(timestamps) // 2
+
+def year_id(timestamps):
+    """Vectorized conversion of Unix timestamps (UTC) to years.
+    
+    @param timestamps : array / Series of Unix timestamps (seconds)
+    @return : numpy array (int32) of years
+    """
+    return month_id(timestamps) // 12 + 1970
+
+def quarter_id(timestamps):
+    """Vectorized conversion of Unix timestamps (UTC) to quarter bucket ids (periods of 3 months starting from january).
+    
+    @param timestamps : array / Series of Unix timestamps (seconds)
+    @return : numpy array (int32) of quarter ids
+    """
+    return month_id(timestamps) // 3
+
+def month_id_to_datetime(month_ids):
+    """Convert month bucket ids to datetimes (first day of the month), to use only for plots / labels.
+    
+    @param month_ids : array of month ids
+    @return : DatetimeIndex with the first day of every month
+    """
+    return pd.DatetimeIndex(np.asarray(month_ids, dtype='int64').astype('datetime64[M]').astype('datetime64[ns]'))
+
+def month_id_to_label(month_ids):
+    """Convert month bucket ids to 'aaaa-mm' labels.
+    
+    @param month_ids : array of month ids
+    @return : list of labels
+    """
+    month_ids = np.asarray(month_ids, dtype='int64')
+    return [f"{year}-{month:02d}" for year, month in zip(month_ids // 12 + 1970, month_ids % 12 + 1)]
+
+def bi_month_id_to_label(bi_month_ids):
+    """Convert bi-month bucket ids to 'aaaa-mm' labels (mm = first month of the period).
+    
+    @param bi_month_ids : array of bi-month ids
+    @return : list of labels
+    """
+    return month_id_to_label(np.asarray(bi_month_ids, dtype='int64') * 2)
+
+def day_id_to_label(day_ids):
+    """Convert day bucket ids to 'aaaa-mm-gg' labels.
+    
+    @param day_ids : array of day ids
+    @return : list of labels
+    """
+    return [str(day) for day in np.asarray(day_ids, dtype='int64').astype('datetime64[D]')]
+
+def week_id_to_label(week_ids):
+    """Convert week bucket ids to 'aaaa-mm-gg' labels (gg = monday of the week).
+    
+    @param week_ids : array of week ids
+    @return : list of labels
+    """
+    return day_id_to_label(np.asarray(week_ids, dtype='int64') * 7 - 3)
+
+def quarter_id_to_label(quarter_ids):
+    """Convert quarter bucket ids to 'aaaa-Qn' labels.
+    
+    @param quarter_ids : array of quarter ids
+    @return : list of labels
+    """
+    quarter_ids = np.asarray(quarter_ids, dtype='int64')
+    return [f"{year}-Q{quarter}" for year, quarter in zip(quarter_ids // 4 + 1970, quarter_ids % 4 + 1)]
+
+def year_id_to_label(years):
+    """Convert years to 'aaaa' labels.
+    
+    @param years : array of years
+    @return : list of labels
+    """
+    return [str(year) for year in np.asarray(years, dtype='int64')]
+
 def unix_to_date(timestamp, date_type = 'datetime'):
     """
     Converte un timestamp Unix in un oggetto datetime / 